@@ -0,0 +1,166 @@
+import threading
+import pandas as pd
+
+from almacen import backend, movimiento
+from catalogo import normalizar_texto, normalizar_codigo, indice_catalogo
+from datos import COLS_ACOPIOS, FORMATO_FECHA_PRECIOS, ahora_arg
+
+# ACOPIOS POR CLIENTE
+# Una venta "Dejar en Acopio" deja en acopios_del_carmen.csv un renglón por producto
+# (ID_Venta, Cliente, Codigo, Producto, Cantidad > 0), en la misma transacción que sube
+# el Reservado del stock. Cada retiro, parcial o total, es otro renglón con Cantidad < 0
+# que baja Reservado y Cantidad del stock en la misma escritura. Lo pendiente de un
+# renglón es la suma de sus movimientos y el Reservado de un producto, la suma de lo
+# pendiente: se mantiene con cada venta y cada retiro, no se edita a mano.
+#
+# `Acopios` guarda los saldos sumando solo las filas nuevas del ledger (como los
+# costos de compra) y los indexa por cliente, por venta y por producto, así "¿qué le
+# queda a este cliente?" no relee el historial de ventas.
+TOLERANCIA = 1e-9
+COLS_PENDIENTES = ["ID_Venta", "Fecha", "Cliente", "Codigo", "Producto", "Pendiente"]
+
+def cargar_acopios():
+    """Ledger de acopios tipado."""
+    df = backend().cargar("acopios").reindex(columns=COLS_ACOPIOS)
+    for col in ["Fecha", "ID_Venta", "Cliente", "Codigo", "Producto"]: df[col] = df[col].fillna("").astype(str)
+    df["Cantidad"] = pd.to_numeric(df["Cantidad"], errors="coerce").fillna(0.0)
+    return df
+
+def _firma(fila):
+    return tuple(str(v) for v in fila)
+
+class Acopios:
+    """Saldo pendiente de cada renglón de acopio (ID_Venta, Codigo, Producto), al día
+    sumando solo lo agregado al ledger, con índices por cliente, venta y producto."""
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._saldos = {}  # clave → [Fecha de la reserva, Cliente, pendiente]
+        self._por_cliente, self._por_venta, self._por_producto = {}, {}, {}  # → claves con algo pendiente
+        self._clientes = {}  # cliente normalizado → como se escribió
+        self._reservado = {}  # (código, nombre normalizados) → [Codigo, Producto, total pendiente]
+        self._marca = (0, None, None)  # (filas sumadas, firma de la última, columnas)
+
+    def actualizar(self, acopios):
+        with self._lock:
+            n, firma, columnas = self._marca
+            if n and (len(acopios) < n or list(acopios.columns) != columnas or _firma(acopios.iloc[n - 1]) != firma): self.reiniciar()
+            nuevos = acopios.iloc[self._marca[0]:]
+            if not nuevos.empty: self._sumar(nuevos)
+            self._marca = (len(acopios), _firma(acopios.iloc[-1]) if len(acopios) else None, list(acopios.columns))
+        return self
+
+    def _sumar(self, nuevos):
+        g = nuevos.groupby(["ID_Venta", "Codigo", "Producto"], sort=False)
+        suma, primeros = g["Cantidad"].sum(), g[["Fecha", "Cliente"]].first()
+        clientes = {c: normalizar_texto(c) for c in primeros["Cliente"].unique()}
+        for clave, cant, fecha, cliente in zip(suma.index, suma.to_numpy(), primeros["Fecha"], primeros["Cliente"]):
+            saldo = self._saldos.setdefault(clave, [fecha, cliente, 0.0])
+            saldo[2] += float(cant)
+            prod = (normalizar_codigo(clave[1]), normalizar_texto(clave[2]))
+            self._reservado.setdefault(prod, [clave[1], clave[2], 0.0])[2] += float(cant)
+            cli = clientes.get(saldo[1]) or normalizar_texto(saldo[1])
+            self._clientes.setdefault(cli, saldo[1])
+            for indice, k in [(self._por_cliente, cli), (self._por_venta, clave[0]), (self._por_producto, prod)]:
+                if saldo[2] > TOLERANCIA: indice.setdefault(k, set()).add(clave)
+                elif k in indice:
+                    indice[k].discard(clave)
+                    if not indice[k]: del indice[k]
+
+    def saldo(self, clave):
+        with self._lock: return self._saldos[clave][2] if clave in self._saldos else 0.0
+
+    def cliente(self, clave):
+        with self._lock: return self._saldos[clave][1] if clave in self._saldos else ""
+
+    def clientes(self):
+        """Clientes con algo en acopio, en orden alfabético."""
+        with self._lock: return sorted((self._clientes[c] for c in self._por_cliente), key=normalizar_texto)
+
+    def pendientes(self, cliente=None, id_venta=None, producto=None):
+        """Renglones con algo por retirar, filtrados por cliente, venta y/o producto
+        ((código, nombre)); sin filtros, todos. La reserva más vieja primero."""
+        with self._lock:
+            filtros = [(self._por_cliente, cliente and normalizar_texto(cliente)), (self._por_venta, id_venta),
+                       (self._por_producto, producto and (normalizar_codigo(producto[0]), normalizar_texto(producto[1])))]
+            grupos = [indice.get(k, set()) for indice, k in filtros if k]
+            claves = set.intersection(*grupos) if grupos else {c for c, s in self._saldos.items() if s[2] > TOLERANCIA}
+            filas = [(c[0], *self._saldos[c][:2], c[1], c[2], self._saldos[c][2]) for c in claves]
+        return pd.DataFrame(filas, columns=COLS_PENDIENTES).sort_values(["Fecha", "ID_Venta"], ignore_index=True)
+
+    def reservado_por_fila(self, indice):
+        """Total en acopio por fila del stock (las que tienen algo pendiente)."""
+        with self._lock: totales = [tuple(v) for v in self._reservado.values() if abs(v[2]) > TOLERANCIA]
+        filas = {}
+        for cod, prod, total in totales:
+            f = indice.buscar_item(cod, prod)
+            if f is not None: filas[f] = filas.get(f, 0.0) + total
+        return pd.Series(filas, dtype=float)
+
+_ACOPIOS = {"version": None, "acopios": Acopios()}
+
+def acopios():
+    """Saldos de acopio al día; solo suma algo si cambió el ledger."""
+    version = backend().version("acopios")
+    if version is None or _ACOPIOS["version"] != version:
+        _ACOPIOS["acopios"].actualizar(cargar_acopios())
+        _ACOPIOS["version"] = version
+    return _ACOPIOS["acopios"]
+
+def entregar(entregas, fecha=None):
+    """Registra retiros ({"ID_Venta", "Codigo", "Producto", "Cantidad"}) de lo que está en acopio.
+
+    Cada retiro se recorta a lo pendiente de su renglón. El ledger y el stock (baja
+    Reservado y Cantidad) van en una transacción, el ledger primero. Devuelve (los
+    retiros sin nada pendiente, los productos que ya no están en el stock).
+    """
+    fecha = fecha or ahora_arg().strftime(FORMATO_FECHA_PRECIOS)
+    b = backend()
+    with b.transaccion():
+        ac = acopios()
+        filas, rechazadas, usado = [], [], {}
+        for e in entregas:
+            clave = (str(e["ID_Venta"]), str(e["Codigo"]), str(e["Producto"]))
+            cant = min(float(e["Cantidad"]), ac.saldo(clave) - usado.get(clave, 0.0))
+            if cant <= TOLERANCIA:
+                rechazadas.append(e)
+                continue
+            usado[clave] = usado.get(clave, 0.0) + cant
+            filas.append({"Fecha": fecha, "ID_Venta": clave[0], "Cliente": ac.cliente(clave),
+                          "Codigo": clave[1], "Producto": clave[2], "Cantidad": -cant})
+        b.anexar("acopios", filas)
+        movs = [movimiento(f["Codigo"], f["Producto"], delta={"Cantidad": f["Cantidad"], "Reservado": f["Cantidad"]}) for f in filas]
+        faltantes = b.mover_stock(movs) if movs else []
+    return rechazadas, faltantes
+
+def entregar_todo(cliente=None, id_venta=None, producto=None, fecha=None):
+    """Retiro total de lo pendiente con esos filtros (los de `Acopios.pendientes`; sin
+    filtros, todo). Lo pendiente se lee dentro de la transacción, así no se entrega de
+    nuevo lo que otra sesión retiró recién. Devuelve (los retiros hechos, los productos
+    que ya no están en el stock)."""
+    with backend().transaccion():
+        pendientes = acopios().pendientes(cliente=cliente, id_venta=id_venta and str(id_venta), producto=producto)
+        entregas = pendientes.rename(columns={"Pendiente": "Cantidad"}).to_dict("records")
+        _, faltantes = entregar(entregas, fecha)
+    return entregas, faltantes
+
+def diferencias_reservado(stock, indice):
+    """Productos cuyo Reservado no coincide con lo pendiente en el ledger (reservas de
+    antes del registro, ediciones a mano, stock reiniciado)."""
+    en_acopio = acopios().reservado_por_fila(indice).reindex(stock.index, fill_value=0.0)
+    dif = stock["Reservado"] - en_acopio
+    df = pd.DataFrame({"Codigo": stock["Codigo"], "Producto": stock["Producto"], "Reservado": stock["Reservado"],
+                       "En Acopios": en_acopio, "Diferencia": dif})
+    return df[dif.abs() > TOLERANCIA]
+
+def conciliar_reservado():
+    """Deja el Reservado de cada producto igual a lo pendiente en el ledger. Devuelve cuántos cambió."""
+    b = backend()
+    with b.transaccion():
+        stock = b.cargar_stock()
+        dif = diferencias_reservado(stock, indice_catalogo(stock, b.version("stock")))
+        if not dif.empty:
+            b.mover_stock([movimiento(c, p, fijar={"Reservado": float(r)}) for c, p, r in dif[["Codigo", "Producto", "En Acopios"]].itertuples(index=False)])
+    return len(dif)
@@ -0,0 +1,700 @@
+import os
+import json
+import sqlite3
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+import pandas as pd
+
+from catalogo import indice_catalogo, normalizar_codigo, normalizar_texto
+from metricas import seccion
+from datos import (
+    STOCK_FILE, PRECIOS_FILE, SINCRO_FILE, COLS_STOCK, COLS_OPERACIONES, PRODUCTOS_INICIALES, TABLAS,
+    FORMATO_FECHA_PRECIOS, ahora_arg, bloqueo, cargar_stock, cargar_ledger, cargar_ledger_desde, anexar_filas, compactar,
+    guardar_csv, invalidar, normalizar_stock, nuevo_id, version_archivo,
+)
+
+# BACKENDS DE ALMACENAMIENTO
+# La app habla con `backend()` y no sabe si abajo hay CSV o SQLite. Se elige con la
+# variable de entorno ALAMBRADOS_BACKEND ("csv" por defecto, o "sqlite").
+#
+# Un movimiento de stock es un dict:
+#   {"Codigo": ..., "Producto": ..., "delta": {"Cantidad": -2.0}, "fijar": {"Precio Costo": 100.0}}
+# "delta" suma sobre el valor vigente en la base (no sobre una copia vieja de la sesión),
+# por eso dos ventas simultáneas no se pisan.
+BACKEND = os.environ.get("ALAMBRADOS_BACKEND", "csv").lower()
+DB_FILE = os.environ.get("ALAMBRADOS_DB", "alambrados.db")
+NUMERICAS_STOCK = {"Cantidad", "Reservado", "Precio Costo", "Precio Venta", "Stock Minimo"}
+
+def movimiento(codigo, producto, delta=None, fijar=None):
+    return {"Codigo": codigo, "Producto": producto, "delta": delta or {}, "fijar": fijar or {}}
+
+def agrupar_movimientos(movimientos):
+    """Un movimiento por producto: suma los deltas y, en "fijar", gana el último valor."""
+    agrupados = {}
+    for mov in movimientos:
+        clave = (str(mov["Codigo"]), str(mov["Producto"]))
+        acum = agrupados.setdefault(clave, movimiento(*clave))
+        for col, d in mov.get("delta", {}).items(): acum["delta"][col] = acum["delta"].get(col, 0.0) + float(d)
+        acum["fijar"].update(mov.get("fijar", {}))
+    return list(agrupados.values())
+
+def _aplicar_movimientos(df, indice, movimientos):
+    """Aplica los movimientos sobre `df` en el lugar, con una sola suma vectorizada
+    por columna. Devuelve (los que no encontraron fila, las filas tocadas)."""
+    filas = [indice.buscar_item(m["Codigo"], m["Producto"]) for m in movimientos]
+    faltantes = [m for m, f in zip(movimientos, filas) if f is None]
+    ok = [(f, m) for f, m in zip(filas, movimientos) if f is not None]
+    if not ok: return faltantes, []
+
+    deltas = pd.DataFrame([m.get("delta", {}) for _, m in ok], index=[f for f, _ in ok], dtype=float)
+    tocadas = set(deltas.columns).union(*(m.get("fijar", {}) for _, m in ok))
+    for col in tocadas & NUMERICAS_STOCK:  # un CSV con enteros se lee como int64
+        if df[col].dtype != float: df[col] = df[col].astype(float)
+    if len(deltas.columns):
+        deltas = deltas.fillna(0.0).groupby(level=0).sum()
+        df.loc[deltas.index, deltas.columns] = df.loc[deltas.index, deltas.columns] + deltas
+    for f, m in ok:
+        for col, v in m.get("fijar", {}).items(): df.at[f, col] = v
+    return faltantes, [f for f, _ in ok]
+
+# FILAS TOCADAS
+# Cada escritura del stock de este proceso anota qué filas cambió, como un eslabón
+# versión anterior → versión nueva. Lo que se deriva del stock (alertas de reposición)
+# se pone al día mirando solo esas filas; si falta un eslabón (escribió otro proceso,
+# o una escritura renumeró las filas) no hay más remedio que mirar todo.
+MAX_ESLABONES = 1000
+_ESLABONES = OrderedDict()  # versión nueva → (versión anterior, etiquetas tocadas)
+_ESLABONES_LOCK = threading.Lock()
+
+def _anotar_tocadas(antes, despues, filas):
+    if antes is None or despues is None or antes == despues: return
+    with _ESLABONES_LOCK:
+        _ESLABONES[despues] = (antes, frozenset(filas))
+        while len(_ESLABONES) > MAX_ESLABONES: _ESLABONES.popitem(last=False)
+
+def filas_tocadas(desde, hasta):
+    """Etiquetas de fila que cambiaron entre dos versiones del stock (incluye las borradas
+    y las nuevas), o None si no se sabe y hay que mirar todo el stock."""
+    tocadas, version = set(), hasta
+    with _ESLABONES_LOCK:
+        for _ in range(len(_ESLABONES) + 1):
+            if version == desde: return tocadas
+            eslabon = _ESLABONES.get(version)
+            if eslabon is None: return None
+            version, filas = eslabon
+            tocadas |= filas
+    return None
+
+# EDICIÓN MASIVA DEL STOCK
+# La grilla se guarda como diferencia contra la copia desde la que se cargó: solo se
+# escriben las celdas tocadas, en una sola escritura. Una celda que otra sesión cambió
+# mientras la grilla estaba abierta (ej. una venta que descontó Cantidad) es un
+# conflicto: no se pisa y se devuelve para mostrarla. Cada cambio aplicado queda en
+# la tabla "auditoria".
+
+def _texto(v):
+    return "" if v is None or (isinstance(v, float) and pd.isna(v)) else str(v).strip()
+
+def _igual(col, a, b):
+    if col in NUMERICAS_STOCK:
+        a, b = pd.to_numeric(a, errors="coerce"), pd.to_numeric(b, errors="coerce")
+        return abs((0.0 if pd.isna(a) else a) - (0.0 if pd.isna(b) else b)) < 1e-9
+    return _texto(a) == _texto(b)
+
+def _normalizar_grilla(df):
+    df = df.reindex(columns=COLS_STOCK)
+    for col in COLS_STOCK:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0) if col in NUMERICAS_STOCK else df[col].map(_texto)
+    return df
+
+def diferencias_stock(base, editado):
+    """(ediciones, altas, bajas) de la grilla `editado` respecto de `base`.
+
+    Compara columnas enteras de una vez y solo recorre las filas que cambiaron.
+    Cada edición lleva la fila, su Codigo/Producto originales y los valores antes/después.
+    """
+    base, editado = _normalizar_grilla(base), _normalizar_grilla(editado)
+    comunes = base.index.intersection(editado.index)
+    b, e = base.loc[comunes], editado.loc[comunes]
+    distinto = pd.DataFrame({c: (b[c] - e[c]).abs() > 1e-9 if c in NUMERICAS_STOCK else b[c] != e[c] for c in COLS_STOCK})
+    ediciones = []
+    for fila in distinto.index[distinto.any(axis=1)]:
+        cols = distinto.columns[distinto.loc[fila].to_numpy()]
+        ediciones.append({"fila": fila, "Codigo": b.at[fila, "Codigo"], "Producto": b.at[fila, "Producto"],
+                          "antes": {c: b.at[fila, c] for c in cols}, "despues": {c: e.at[fila, c] for c in cols}})
+    nuevas = editado[~editado.index.isin(base.index)]  # el editor puede dar etiquetas vacías a las filas nuevas
+    nuevas = nuevas[(nuevas["Codigo"] != "") | (nuevas["Producto"] != "")]
+    altas = nuevas.assign(Unidad=nuevas["Unidad"].replace("", "un.")).to_dict("records")
+    bajas = [{"fila": f, **base.loc[f].to_dict()} for f in base.index.difference(editado.index)]
+    return ediciones, altas, bajas
+
+def _resolver_edicion(actual, indice, ediciones, bajas):
+    """Cruza la edición con el stock vigente: (cambios, filas a borrar, conflictos)."""
+    def ubicar(r):
+        f = r["fila"]
+        if f in actual.index and _texto(actual.at[f, "Codigo"]) == r["Codigo"] and _texto(actual.at[f, "Producto"]) == r["Producto"]:
+            return f
+        return indice.buscar_item(r["Codigo"], r["Producto"])  # la fila se movió (CSV reescrito por otro)
+
+    cambios, borrar, conflictos = [], [], []
+    for ed in ediciones:
+        f = ubicar(ed)
+        for col, despues in ed["despues"].items():
+            antes = ed["antes"][col]
+            vigente = "(borrado)" if f is None else actual.at[f, col]
+            fila = {"Codigo": ed["Codigo"], "Producto": ed["Producto"], "Columna": col, "Antes": antes}
+            if f is not None and _igual(col, vigente, despues): continue  # ya estaba así
+            if f is not None and _igual(col, vigente, antes): cambios.append({**fila, "fila": f, "Despues": despues})
+            else: conflictos.append({**fila, "Tuyo": despues, "Actual": vigente})
+    for baja in bajas:
+        f = ubicar(baja)
+        if f is None: continue  # ya la borró otro
+        distintas = [c for c in COLS_STOCK if not _igual(c, actual.at[f, c], baja[c])]
+        if distintas:
+            conflictos.append({"Codigo": baja["Codigo"], "Producto": baja["Producto"], "Columna": "(baja)",
+                               "Antes": "", "Tuyo": "borrar", "Actual": f"cambió {', '.join(distintas)}"})
+        else: borrar.append({**baja, "fila": f})
+    return cambios, borrar, conflictos
+
+def _registros_auditoria(cambios, altas, borradas, origen, fecha):
+    fecha = fecha or ahora_arg().strftime("%d/%m/%Y %H:%M")
+    filas = [(c["Codigo"], c["Producto"], c["Columna"], _texto(c["Antes"]), _texto(c["Despues"])) for c in cambios]
+    filas += [(_texto(a.get("Codigo")), _texto(a.get("Producto")), "(alta)", "", "") for a in altas]
+    filas += [(b["Codigo"], b["Producto"], "(baja)", "", "") for b in borradas]
+    return [{"ID": nuevo_id(), "Fecha": fecha, "Origen": origen, "Codigo": cod, "Producto": prod,
+             "Columna": col, "Antes": antes, "Despues": despues} for cod, prod, col, antes, despues in filas]
+
+# HISTORIAL DE PRECIOS
+# Toda escritura que puede cambiar un costo o un precio de venta (ingreso con costo
+# nuevo, grilla, aumentos, productos nuevos, reinicio) agrega al ledger "precios" los
+# dos precios vigentes de cada producto que cambió, en la misma escritura. Las
+# consultas a una fecha están en precios.py.
+COLUMNAS_PRECIO = ["Precio Costo", "Precio Venta"]
+COLS_FILA_PRECIO = ["Codigo", "Producto"] + COLUMNAS_PRECIO
+
+def _filas_con_precio(indice, movimientos):
+    """Etiquetas de las filas a las que algún movimiento les fija un precio."""
+    filas = [indice.buscar_item(m["Codigo"], m["Producto"]) for m in movimientos if set(m.get("fijar", {})) & set(COLUMNAS_PRECIO)]
+    return list(dict.fromkeys(f for f in filas if f is not None))
+
+def _precios_cambiados(antes, despues):
+    """Las filas de `despues` cuyo costo o precio de venta no es el de `antes` (mismas etiquetas)."""
+    distinto = (antes[COLUMNAS_PRECIO].astype(float) - despues[COLUMNAS_PRECIO].astype(float)).abs() > 1e-9
+    return despues[distinto.any(axis=1)]
+
+def _registros_precio(df, fecha=None):
+    fecha = fecha or ahora_arg().strftime(FORMATO_FECHA_PRECIOS)
+    df = df.reindex(columns=COLS_FILA_PRECIO)
+    return df.assign(**{c: pd.to_numeric(df[c], errors="coerce").fillna(0.0) for c in COLUMNAS_PRECIO}, Fecha=fecha).to_dict("records")
+
+# REGISTRO DE OPERACIONES (SINCRONIZACIÓN)
+# Toda escritura que otra instancia tiene que repetir (movimientos de stock, altas,
+# ediciones de la grilla y filas de ventas, renglones, producción, compras y acopios) se anota
+# en la tabla "operaciones", en la misma escritura, como (Origen, Seq): Origen es el
+# id de esta carpeta de datos y Seq crece de a uno, así "lo que ya tengo" de cada
+# origen es un solo número (un vector de versiones). El intercambio está en sincro.py.
+# Lo que llega de otra instancia se anota con su Origen y Seq originales, no como
+# propio (ver `sin_operaciones`). Reiniciar o reemplazar el stock entero no se anota.
+SINCRONIZADAS = {"ventas", "ventas_items", "produccion", "gastos", "acopios"}
+DELTA_EDICION = {"Cantidad", "Reservado"}  # en la grilla son un "fijar", pero se mandan como diferencia
+_SINCRO = threading.local()
+_INSTANCIA = {"version": None, "id": None}
+
+@contextmanager
+def sin_operaciones():
+    """Las escrituras del bloque no se anotan como operaciones propias."""
+    previo = getattr(_SINCRO, "apagado", False)
+    _SINCRO.apagado = True
+    try: yield
+    finally: _SINCRO.apagado = previo
+
+def leer_sincro():
+    try:
+        with open(SINCRO_FILE, encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+def guardar_sincro(estado):
+    tmp = f"{SINCRO_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(estado, f, indent=1)
+    os.replace(tmp, SINCRO_FILE)
+
+def instancia():
+    """Id de esta carpeta de datos; se crea la primera vez que se lo pide."""
+    version = version_archivo(SINCRO_FILE)
+    if version is not None and _INSTANCIA["version"] == version: return _INSTANCIA["id"]
+    estado = leer_sincro()
+    if "instancia" not in estado:
+        with bloqueo(SINCRO_FILE):
+            estado = leer_sincro()
+            if "instancia" not in estado:
+                estado["instancia"] = nuevo_id()
+                guardar_sincro(estado)
+    _INSTANCIA.update(version=version_archivo(SINCRO_FILE), id=estado["instancia"])
+    return estado["instancia"]
+
+def _json(v):
+    v = _valor(v)
+    return v if isinstance(v, (str, int, float, bool)) or v is None else str(v)
+
+def celdas_fijadas(tipo, datos):
+    """(código, nombre normalizado, columna) de cada valor que la operación fija."""
+    if tipo == "stock": pares = [(m, c) for m in datos for c in m.get("fijar", {})]
+    elif tipo == "edicion": pares = [(c, c["Columna"]) for c in datos["cambios"] if c["Columna"] not in DELTA_EDICION]
+    else: return []
+    return [(normalizar_codigo(m["Codigo"]), normalizar_texto(m["Producto"]), col) for m, col in pares]
+
+def _firma_op(fila):
+    return tuple(str(fila[c]) for c in COLS_OPERACIONES)
+
+class RegistroOperaciones:
+    """Índice de la tabla "operaciones" que se pone al día leyendo solo las filas nuevas:
+    el vector (origen → último Seq), las operaciones de cada origen en orden y, por
+    celda del stock, la marca (Fecha, Origen, Seq) de la última operación que la fijó."""
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.version = None
+            self.vector = {}
+            self.por_origen = {}  # origen → ([Seq], [filas]) en orden de Seq
+            self.ultimo = {}      # celda → marca
+            self._marca = (0, None)  # (filas sumadas, firma de la última)
+
+    def _sumar(self, filas):
+        for fila in filas:
+            origen, seq = str(fila["Origen"]), int(fila["Seq"])
+            fila = {"Origen": origen, "Seq": seq, "Fecha": str(fila["Fecha"]), "Tipo": str(fila["Tipo"]), "Datos": str(fila["Datos"])}
+            seqs, ops = self.por_origen.setdefault(origen, ([], []))
+            if seqs and seq <= seqs[-1]: continue  # ya estaba
+            seqs.append(seq)
+            ops.append(fila)
+            self.vector[origen] = seq
+            marca = (str(fila["Fecha"]), origen, seq)
+            for celda in celdas_fijadas(fila["Tipo"], json.loads(fila["Datos"])):
+                if marca > self.ultimo.get(celda, ("",)): self.ultimo[celda] = marca
+
+    def al_dia(self, b):
+        """Lee de `b` solo si la tabla cambió, y suma solo las filas nuevas."""
+        with self._lock:
+            version = b.version("operaciones")
+            if version is not None and version == self.version: return self
+            df = b.cargar("operaciones")
+            n, firma = self._marca
+            if n and (len(df) < n or _firma_op(df.iloc[n - 1]) != firma): self.reiniciar()  # se reescribió
+            self._sumar(df.iloc[self._marca[0]:].to_dict("records"))
+            self._marca = (len(df), _firma_op(df.iloc[-1]) if len(df) else None)
+            self.version = version
+        return self
+
+    def desde(self, vector):
+        """Operaciones que no cubre `vector` (origen → último Seq visto), cada origen en orden."""
+        with self._lock:
+            return [op for origen, (seqs, ops) in self.por_origen.items() for op in ops[bisect_right(seqs, vector.get(origen, 0)):]]
+
+    def anexar(self, b, filas):
+        """Agrega operaciones (propias o ajenas, en orden) a la tabla y al índice."""
+        if not filas: return
+        with self._lock:
+            b.anexar("operaciones", filas)
+            self._sumar(filas)
+            self._marca = (self._marca[0] + len(filas), _firma_op(filas[-1]))
+            self.version = b.version("operaciones")
+
+    def registrar(self, b, tipo, datos):
+        """Anota una operación propia con el Seq siguiente (no hace nada dentro de `sin_operaciones`)."""
+        if getattr(_SINCRO, "apagado", False): return
+        with b.transaccion(), self._lock:
+            self.al_dia(b)
+            origen = instancia()
+            self.anexar(b, [{"Origen": origen, "Seq": self.vector.get(origen, 0) + 1,
+                             "Fecha": datetime.now(timezone.utc).isoformat(timespec="microseconds"),
+                             "Tipo": tipo, "Datos": json.dumps(datos, ensure_ascii=False, default=_json)}])
+
+REGISTRO = RegistroOperaciones()
+
+def _aplicados(movimientos, faltantes):
+    sin_fila = {id(m) for m in faltantes}
+    return [m for m in movimientos if id(m) not in sin_fila]
+
+def _operacion_edicion(cambios, altas, borradas):
+    return {"cambios": [{k: c[k] for k in ["Codigo", "Producto", "Columna", "Antes", "Despues"]} for c in cambios],
+            "altas": [{c: a.get(c) for c in COLS_STOCK} for a in altas],
+            "bajas": [{"Codigo": b["Codigo"], "Producto": b["Producto"]} for b in borradas]}
+
+class BackendCSV:
+    """Los CSV de siempre. Toda escritura del stock toma el lock del archivo, relee el
+    stock vigente y aplica sobre él, así una sesión no revierte lo que grabó otra."""
+    nombre = "csv"
+
+    def version(self, tabla):
+        return version_archivo(STOCK_FILE if tabla == "stock" else TABLAS[tabla]["archivo"])
+
+    def cargar_stock(self):
+        return cargar_stock()
+
+    def cargar(self, tabla):
+        t = TABLAS[tabla]
+        return cargar_ledger(t["archivo"], t["cols"], clave=t["clave"])
+
+    def cargar_desde(self, tabla, marca):
+        """(filas agregadas después de `marca`, marca nueva, completo): ver `cargar_ledger_desde`."""
+        t = TABLAS[tabla]
+        return cargar_ledger_desde(t["archivo"], t["cols"], marca, clave=t["clave"])
+
+    def anexar(self, tabla, filas):
+        t = TABLAS[tabla]
+        if tabla in SINCRONIZADAS and filas: REGISTRO.registrar(self, "anexar", {"tabla": tabla, "filas": filas})
+        anexar_filas(t["archivo"], filas, t["cols"], clave=t["clave"])
+
+    @contextmanager
+    def transaccion(self):
+        # No hay rollback entre archivos, pero sí exclusión: nadie más escribe stock mientras tanto
+        with bloqueo(STOCK_FILE): yield
+
+    def mover_stock(self, movimientos):
+        with bloqueo(STOCK_FILE):
+            version = version_archivo(STOCK_FILE)
+            df = cargar_stock()
+            indice = indice_catalogo(df, version)
+            filas = _filas_con_precio(indice, movimientos)
+            antes = df.loc[filas, COLUMNAS_PRECIO].copy()
+            faltantes, tocadas = _aplicar_movimientos(df, indice, movimientos)
+            if tocadas: REGISTRO.registrar(self, "stock", _aplicados(movimientos, faltantes))
+            if filas: self.anexar("precios", _registros_precio(_precios_cambiados(antes, df.loc[filas])))
+            guardar_csv(df, STOCK_FILE)
+            _anotar_tocadas(version, version_archivo(STOCK_FILE), tocadas)
+        return faltantes
+
+    def agregar_productos(self, filas):
+        with bloqueo(STOCK_FILE):
+            REGISTRO.registrar(self, "alta", filas)
+            self.anexar("precios", _registros_precio(pd.DataFrame(filas)))
+            version = version_archivo(STOCK_FILE)
+            previo = cargar_stock()
+            guardar_csv(pd.concat([previo, pd.DataFrame(filas)], ignore_index=True), STOCK_FILE)
+            _anotar_tocadas(version, version_archivo(STOCK_FILE), range(len(previo), len(previo) + len(filas)))
+
+    def guardar_stock(self, df):
+        with bloqueo(STOCK_FILE): guardar_csv(df, STOCK_FILE)
+
+    def editar_stock(self, ediciones, altas=(), bajas=(), origen="grilla", fecha=None):
+        """Aplica una edición de `diferencias_stock`. Devuelve los conflictos (no aplicados)."""
+        with bloqueo(STOCK_FILE):
+            version = version_archivo(STOCK_FILE)
+            df = cargar_stock()
+            cambios, borrar, conflictos = _resolver_edicion(df, indice_catalogo(df, version), ediciones, bajas)
+            if cambios or borrar or altas:
+                # Primero la auditoría: un corte deja un registro de más, nunca un cambio sin registrar
+                self.anexar("auditoria", _registros_auditoria(cambios, altas, borrar, origen, fecha))
+                REGISTRO.registrar(self, "edicion", _operacion_edicion(cambios, altas, borrar))
+                filas = list(dict.fromkeys(c["fila"] for c in cambios if c["Columna"] in COLUMNAS_PRECIO))
+                antes = df.loc[filas, COLUMNAS_PRECIO].copy()
+                for col, grupo in pd.DataFrame(cambios, columns=["fila", "Columna", "Despues"]).groupby("Columna"):
+                    valores = grupo["Despues"]
+                    if col in NUMERICAS_STOCK:
+                        valores = valores.astype(float)
+                        if df[col].dtype != float: df[col] = df[col].astype(float)
+                    df.loc[grupo["fila"].to_numpy(), col] = valores.to_numpy()
+                cambiados = _precios_cambiados(antes, df.loc[filas])
+                self.anexar("precios", _registros_precio(pd.concat([cambiados, pd.DataFrame(altas)])))
+                df = df.drop(index=[b["fila"] for b in borrar])
+                guardar_csv(pd.concat([df, pd.DataFrame(altas)], ignore_index=True), STOCK_FILE)
+                if not borrar:  # con bajas las filas se renumeran: sin eslabón, se mira todo
+                    tocadas = [c["fila"] for c in cambios] + list(range(len(df), len(df) + len(altas)))
+                    _anotar_tocadas(version, version_archivo(STOCK_FILE), tocadas)
+        return conflictos
+
+    def reiniciar_stock(self):
+        with bloqueo(STOCK_FILE):
+            if os.path.exists(STOCK_FILE): os.remove(STOCK_FILE)
+            invalidar(STOCK_FILE)
+            self.anexar("precios", _registros_precio(cargar_stock()))
+
+    def sembrar_precios(self):
+        """Si todavía no hay historial, lo empieza con los precios de hoy."""
+        if os.path.exists(PRECIOS_FILE): return
+        with bloqueo(STOCK_FILE):
+            if not os.path.exists(PRECIOS_FILE): self.anexar("precios", _registros_precio(cargar_stock()))
+
+    def compactar(self):
+        for t in TABLAS.values(): compactar(t["archivo"], t["cols"], clave=t["clave"])
+
+def _q(col):
+    return '"' + col.replace('"', '""') + '"'
+
+def _valor(v):
+    """Valor apto para sqlite3: tipos nativos, fechas como texto ISO y NaN como NULL."""
+    if v is None: return None
+    if isinstance(v, (datetime, date)): return v.isoformat()
+    if hasattr(v, "item"): v = v.item()  # escalares de numpy
+    if isinstance(v, float) and v != v: return None
+    return v
+
+def _firma_fila(fila):
+    return None if fila is None else tuple(str(v) for v in fila)
+
+class BackendSQLite:
+    """SQLite embebido en modo WAL. Cada escritura es una transacción (BEGIN IMMEDIATE)
+    que actualiza filas en el lugar; `transaccion()` agrupa varias en una sola."""
+    nombre = "sqlite"
+
+    def __init__(self, ruta=DB_FILE):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._cache = {}
+        nueva = not os.path.exists(ruta)
+        self._crear_esquema()
+        if nueva: self.importar_csv()
+
+    def _con(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            # Una conexión por hilo (Streamlit corre cada sesión en su propio hilo)
+            con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.nivel = 0
+        return con
+
+    @contextmanager
+    def transaccion(self):
+        con = self._con()
+        if self._local.nivel:
+            self._local.nivel += 1
+            try: yield con
+            finally: self._local.nivel -= 1
+            return
+        con.execute("BEGIN IMMEDIATE")
+        self._local.nivel = 1
+        self._local.eslabones = []
+        self._local.escritas = set()
+        try:
+            yield con
+            con.execute("COMMIT")
+            for eslabon in self._local.eslabones: _anotar_tocadas(*eslabon)  # solo si se confirmó
+        except BaseException:
+            con.execute("ROLLBACK")
+            REGISTRO.reiniciar()  # pudo haber anotado operaciones que no quedaron
+            raise
+        finally:
+            self._local.nivel = 0
+
+    def _crear_esquema(self):
+        with self.transaccion() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS versiones (tabla TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            cols = ", ".join(f"{_q(c)} {'REAL' if c in NUMERICAS_STOCK else 'TEXT'}" for c in COLS_STOCK)
+            con.execute(f"CREATE TABLE IF NOT EXISTS stock (fila INTEGER PRIMARY KEY, {cols})")
+            con.execute('CREATE INDEX IF NOT EXISTS stock_codigo ON stock ("Codigo")')
+            for nombre, t in TABLAS.items():
+                cols = ", ".join(f"{_q(c)} TEXT PRIMARY KEY" if c == t["clave"] else _q(c) for c in t["cols"])
+                con.execute(f"CREATE TABLE IF NOT EXISTS {_q(nombre)} ({cols})")
+                existentes = {r[1] for r in con.execute(f"PRAGMA table_info({_q(nombre)})")}
+                for c in t["cols"]:
+                    if c not in existentes: con.execute(f"ALTER TABLE {_q(nombre)} ADD COLUMN {_q(c)}")
+
+    def _tocar(self, con, tabla):
+        self._local.escritas.add(tabla)
+        con.execute("INSERT INTO versiones VALUES (?, 1) ON CONFLICT(tabla) DO UPDATE SET version = version + 1", (tabla,))
+
+    def _anotar(self, antes, filas):
+        """Eslabón de filas tocadas desde la versión `antes` del stock (dentro de la transacción)."""
+        self._local.eslabones.append((antes, self.version("stock"), [int(f) for f in filas]))
+
+    def _ultima_fila(self, con):
+        return con.execute("SELECT COALESCE(MAX(fila), 0) FROM stock").fetchone()[0]
+
+    def _filas_desde(self, con, ultima):
+        return [f for (f,) in con.execute("SELECT fila FROM stock WHERE fila > ?", (ultima,))]
+
+    def version(self, tabla):
+        fila = self._con().execute("SELECT version FROM versiones WHERE tabla = ?", (tabla,)).fetchone()
+        return fila[0] if fila else 0
+
+    def _leer(self, tabla, consulta, preparar=None):
+        """Lee `tabla` solo si cambió su versión desde la última lectura.
+
+        Lo que esta transacción escribió y todavía no confirmó no pasa por el caché (es de
+        todos los hilos): si después hay ROLLBACK, otra escritura llega a la misma versión.
+        """
+        if getattr(self._local, "nivel", 0) and tabla in self._local.escritas:
+            with seccion(f"sqlite:leer:{tabla}"): df = pd.read_sql_query(consulta, self._con())
+            return preparar(df) if preparar else df
+        version = self.version(tabla)
+        en_cache = self._cache.get(tabla)
+        if en_cache is None or en_cache[0] != version:
+            with seccion(f"sqlite:leer:{tabla}"): df = pd.read_sql_query(consulta, self._con())
+            en_cache = (version, preparar(df) if preparar else df)
+            self._cache[tabla] = en_cache
+        return en_cache[1].copy()
+
+    def cargar_stock(self):
+        def preparar(df):
+            df = normalizar_stock(df.set_index("fila").rename_axis(None))
+            df.attrs.clear()
+            return df
+        return self._leer("stock", "SELECT * FROM stock ORDER BY fila", preparar)
+
+    def cargar(self, tabla):
+        cols = ", ".join(_q(c) for c in TABLAS[tabla]["cols"])
+        return self._leer(tabla, f"SELECT {cols} FROM {_q(tabla)} ORDER BY rowid")
+
+    def cargar_desde(self, tabla, marca):
+        """(filas con rowid mayor que `marca`, marca nueva, completo). La marca es el último
+        rowid leído y su contenido: si esa fila ya no es la misma (la tabla se reimportó)
+        devuelve la tabla entera y completo = True."""
+        cols = TABLAS[tabla]["cols"]
+        consulta = f"SELECT rowid, {', '.join(_q(c) for c in cols)} FROM {_q(tabla)}"
+        firma = lambda con, fila: _firma_fila(con.execute(f"{consulta} WHERE rowid = ?", (fila,)).fetchone())
+        with self.transaccion() as con:  # la marca y lo nuevo, de la misma foto
+            vigente = bool(marca) and marca[1] == firma(con, marca[0])
+            with seccion(f"sqlite:leer:{tabla}"):
+                df = pd.read_sql_query(f"{consulta} WHERE rowid > ? ORDER BY rowid", con, params=(marca[0] if vigente else 0,))
+            nueva = (int(df["rowid"].iat[-1]), firma(con, int(df["rowid"].iat[-1]))) if len(df) else (marca if vigente else None)
+        return df.drop(columns=["rowid"]), nueva, not vigente
+
+    def _insertar(self, con, tabla, cols, filas, clave=None):
+        marcas = ", ".join("?" * len(cols))
+        sql = f"INSERT INTO {_q(tabla)} ({', '.join(_q(c) for c in cols)}) VALUES ({marcas})"
+        if clave:
+            cambios = ", ".join(f"{_q(c)} = excluded.{_q(c)}" for c in cols if c != clave)
+            sql += f" ON CONFLICT({_q(clave)}) DO UPDATE SET {cambios}"
+        con.executemany(sql, [tuple(_valor(f.get(c)) for c in cols) for f in filas])
+        self._tocar(con, tabla)
+
+    def anexar(self, tabla, filas):
+        if not filas: return
+        t = TABLAS[tabla]
+        with self.transaccion() as con:
+            if tabla in SINCRONIZADAS: REGISTRO.registrar(self, "anexar", {"tabla": tabla, "filas": filas})
+            self._insertar(con, tabla, t["cols"], filas, t["clave"])
+
+    def _filas_stock(self, con, filas, cols=COLS_FILA_PRECIO):
+        """`cols` de las filas pedidas del stock, indexado por fila."""
+        partes = []
+        for i in range(0, len(filas), 500):
+            tanda = [int(f) for f in filas[i:i + 500]]
+            consulta = f"SELECT fila, {', '.join(_q(c) for c in cols)} FROM stock WHERE fila IN ({', '.join('?' * len(tanda))})"
+            partes.append(pd.DataFrame(con.execute(consulta, tanda).fetchall(), columns=["fila"] + cols))
+        return pd.concat(partes).set_index("fila") if partes else pd.DataFrame(columns=cols)
+
+    def mover_stock(self, movimientos):
+        """Resuelve todas las filas con un SELECT ... IN y aplica un executemany por
+        forma de UPDATE, todo en una transacción."""
+        movimientos = agrupar_movimientos(movimientos)
+        faltantes, tocadas = [], []
+        with self.transaccion() as con:
+            version = self.version("stock")
+            por_par, por_codigo = {}, {}
+            codigos = sorted({m["Codigo"] for m in movimientos})
+            for i in range(0, len(codigos), 500):  # límite de parámetros de SQLite
+                tanda = codigos[i:i + 500]
+                consulta = f'SELECT fila, "Codigo", "Producto" FROM stock WHERE "Codigo" IN ({", ".join("?" * len(tanda))})'
+                for fila, cod, prod in con.execute(consulta, tanda):
+                    por_par.setdefault((cod, prod), fila)
+                    por_codigo.setdefault(cod, []).append(fila)
+
+            updates, con_precio = {}, []
+            for mov in movimientos:
+                fila = por_par.get((mov["Codigo"], mov["Producto"]))
+                if fila is None and len(por_codigo.get(mov["Codigo"], [])) == 1: fila = por_codigo[mov["Codigo"]][0]
+                if fila is None:
+                    faltantes.append(mov)
+                    continue
+                tocadas.append(fila)
+                if set(mov["fijar"]) & set(COLUMNAS_PRECIO): con_precio.append(fila)
+                forma = (tuple(mov["delta"]), tuple(mov["fijar"]))
+                valores = [_valor(v) for v in mov["delta"].values()] + [_valor(v) for v in mov["fijar"].values()]
+                updates.setdefault(forma, []).append((*valores, fila))
+
+            antes = self._filas_stock(con, con_precio)
+            for (delta, fijar), valores in updates.items():
+                sets = [f"{_q(c)} = {_q(c)} + ?" for c in delta] + [f"{_q(c)} = ?" for c in fijar]
+                if sets: con.executemany(f"UPDATE stock SET {', '.join(sets)} WHERE fila = ?", valores)
+            self._tocar(con, "stock")
+            self._anotar(version, tocadas)
+            if tocadas: REGISTRO.registrar(self, "stock", _aplicados(movimientos, faltantes))
+            if con_precio: self.anexar("precios", _registros_precio(_precios_cambiados(antes, self._filas_stock(con, con_precio))))
+        return faltantes
+
+    def agregar_productos(self, filas):
+        with self.transaccion() as con:
+            version, ultima = self.version("stock"), self._ultima_fila(con)
+            self._insertar(con, "stock", COLS_STOCK, filas)
+            self._anotar(version, self._filas_desde(con, ultima))
+            REGISTRO.registrar(self, "alta", filas)
+            self.anexar("precios", _registros_precio(pd.DataFrame(filas)))
+
+    def guardar_stock(self, df):
+        with self.transaccion() as con:
+            con.execute("DELETE FROM stock")
+            self._insertar(con, "stock", COLS_STOCK, df.reindex(columns=COLS_STOCK).to_dict("records"))
+
+    def editar_stock(self, ediciones, altas=(), bajas=(), origen="grilla", fecha=None):
+        with self.transaccion() as con:
+            df = self.cargar_stock()
+            version, ultima = self.version("stock"), self._ultima_fila(con)
+            cambios, borrar, conflictos = _resolver_edicion(df, indice_catalogo(df, version), ediciones, bajas)
+            if cambios or borrar or altas:
+                filas = list(dict.fromkeys(c["fila"] for c in cambios if c["Columna"] in COLUMNAS_PRECIO))
+                antes = self._filas_stock(con, filas)
+                for col, grupo in pd.DataFrame(cambios, columns=["fila", "Columna", "Despues"]).groupby("Columna"):
+                    con.executemany(f"UPDATE stock SET {_q(col)} = ? WHERE fila = ?",
+                                    [(_valor(v), int(f)) for f, v in zip(grupo["fila"], grupo["Despues"])])
+                cambiados = _precios_cambiados(antes, self._filas_stock(con, filas))
+                con.executemany("DELETE FROM stock WHERE fila = ?", [(int(b["fila"]),) for b in borrar])
+                if altas: self._insertar(con, "stock", COLS_STOCK, [{c: a.get(c) for c in COLS_STOCK} for a in altas])
+                self._tocar(con, "stock")
+                self._anotar(version, [c["fila"] for c in cambios] + [b["fila"] for b in borrar] + self._filas_desde(con, ultima))
+                self.anexar("auditoria", _registros_auditoria(cambios, altas, borrar, origen, fecha))
+                REGISTRO.registrar(self, "edicion", _operacion_edicion(cambios, altas, borrar))
+                self.anexar("precios", _registros_precio(pd.concat([cambiados, pd.DataFrame(altas)])))
+        return conflictos
+
+    def reiniciar_stock(self):
+        with self.transaccion():
+            self.guardar_stock(pd.DataFrame(PRODUCTOS_INICIALES))
+            self.anexar("precios", _registros_precio(pd.DataFrame(PRODUCTOS_INICIALES)))
+
+    def sembrar_precios(self):
+        """Si todavía no hay historial, lo empieza con los precios de hoy."""
+        with self.transaccion() as con:
+            if con.execute('SELECT 1 FROM "precios" LIMIT 1').fetchone() is None:
+                self.anexar("precios", _registros_precio(self.cargar_stock()))
+
+    def compactar(self):
+        self._con().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def importar_csv(self):
+        """Reemplaza el contenido de la base por el de los CSV (stock y ledgers)."""
+        stock = cargar_stock() if os.path.exists(STOCK_FILE) else pd.DataFrame(PRODUCTOS_INICIALES)
+        with self.transaccion() as con:
+            con.execute("DELETE FROM stock")
+            self._insertar(con, "stock", COLS_STOCK, stock.reindex(columns=COLS_STOCK).to_dict("records"))
+            for nombre, t in TABLAS.items():
+                df = cargar_ledger(t["archivo"], t["cols"], clave=t["clave"]).reindex(columns=t["cols"])
+                con.execute(f"DELETE FROM {_q(nombre)}")
+                self._insertar(con, nombre, t["cols"], df.to_dict("records"), t["clave"])
+
+    def exportar_csv(self, carpeta):
+        """Escribe stock y ledgers como CSV (mismos nombres de archivo) dentro de `carpeta`."""
+        os.makedirs(carpeta, exist_ok=True)
+        self.cargar_stock()[COLS_STOCK].to_csv(os.path.join(carpeta, STOCK_FILE), index=False)
+        for nombre, t in TABLAS.items():
+            self.cargar(nombre).to_csv(os.path.join(carpeta, t["archivo"]), index=False)
+
+_BACKEND = {}
+_BACKEND_LOCK = threading.Lock()
+
+def backend():
+    """Backend configurado (uno por proceso, compartido por todas las sesiones)."""
+    with _BACKEND_LOCK:
+        if "activo" not in _BACKEND:
+            _BACKEND["activo"] = BackendSQLite() if BACKEND == "sqlite" else BackendCSV()
+            _BACKEND["activo"].sembrar_precios()
+        return _BACKEND["activo"]
@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import ventas as modulo_ventas
+from acopios import Acopios, acopios, cargar_acopios, entregar
+from almacen import BACKEND, backend, instancia
+from catalogo import IndiceBusqueda, indice_catalogo, indice_busqueda
+from compras import CostosCompra, cargar_gastos, promedio_de_compras, registrar_compras
+from datos import (STOCK_FILE, VENTAS_FILE, VENTAS_ITEMS_FILE, PRODUCCION_FILE, RECETAS_FILE, GASTOS_FILE,
+                   PRECIOS_FILE, COLS_ITEMS, LOGO_FILE, invalidar)
+from precios import HistorialPrecios, margen_por_venta, plan_aumento
+from produccion import recetas, requerimientos, calendario
+from reportes import generar_pdf, generar_excel, exportar_excel
+from reposicion import AlertasStock
+from resumenes import resumenes, Resumenes
+from sincro import exportar, aplicar, vector
+from ventas import agregar_lote, confirmar_venta, migrar_detalles, indice_ventas, items_de_venta, renglones_de_ventas
+
+# BENCHMARK
+# Genera un negocio sintético (stock, ventas de varios años con parte en el formato
+# viejo de "Detalle" con np.float64, renglones, producción, recetas, historial de
+# precios y compras) en una carpeta temporal y cronometra los caminos reales de la app sin
+# Streamlit. El resultado es un JSON para comparar entre versiones:
+#   python benchmark.py --escala mediana --salida bench.json
+#   ALAMBRADOS_BACKEND=sqlite python benchmark.py --productos 50000 --ventas 500000
+# Con la misma semilla y escala los datos son idénticos.
+
+ESCALAS = {
+    "chica": {"productos": 500, "ventas": 5_000, "lotes": 200, "anios": 1},
+    "mediana": {"productos": 5_000, "ventas": 50_000, "lotes": 2_000, "anios": 3},
+    "grande": {"productos": 50_000, "ventas": 500_000, "lotes": 20_000, "anios": 5},
+}
+PALABRAS = ["POSTE", "PORTON", "TEJIDO", "ALAMBRE", "PLANCHUELA", "PUERTITA", "ESQUINERO",
+            "GALVA", "PUA", "CONCERTINA", "REFUERZO", "LISO", "OVALADO", "TORNIQUETE", "PINCHES"]
+TIPOS_VENTA = ["Entrega Inmediata", "Dejar en Acopio"]
+PARTE_LEGACY = 0.3  # ventas guardadas con str(carrito) en "Detalle"
+HOY = datetime(2026, 1, 1)  # fecha fija: los datos no dependen de cuándo se corre
+
+# DATOS SINTÉTICOS
+def _stock(rng, n):
+    nombres = [f"{PALABRAS[i % len(PALABRAS)]} {rng.choice(PALABRAS)} {i // len(PALABRAS)}.{i % 100:02d}" for i in range(n)]
+    costo = rng.integers(100, 100_000, n).astype(float)
+    return pd.DataFrame({
+        "Codigo": [str(i) for i in range(n)], "Producto": nombres,
+        "Cantidad": rng.integers(0, 500, n).astype(float), "Reservado": rng.integers(0, 20, n).astype(float),
+        "Unidad": rng.choice(["un.", "m", "kg"], n), "Precio Costo": costo,
+        "Precio Venta": np.round(costo * rng.uniform(1.2, 2.5, n)), "Stock Minimo": rng.integers(0, 50, n).astype(float),
+    })
+
+def _detalle_legacy(renglones):
+    partes = [f"{{'Codigo': '{r['Codigo']}', 'Producto': '{r['Producto']}', 'Cantidad': np.float64({r['Cantidad']}), "
+              f"'Precio': np.float64({r['Precio']}), 'Subtotal': np.float64({r['Subtotal']})}}" for r in renglones]
+    return "[" + ", ".join(partes) + "]"
+
+def _ventas(rng, stock, n, anios):
+    por_venta = rng.integers(1, 6, n)
+    filas = rng.integers(0, len(stock), por_venta.sum())
+    items = pd.DataFrame({
+        "ID_Venta": np.repeat([f"{i:012x}" for i in range(n)], por_venta),
+        "Codigo": stock["Codigo"].to_numpy()[filas], "Producto": stock["Producto"].to_numpy()[filas],
+        "Cantidad": rng.integers(1, 30, len(filas)).astype(float), "Precio": stock["Precio Venta"].to_numpy()[filas],
+        "Costo": stock["Precio Costo"].to_numpy()[filas],
+    })
+    items["Subtotal"] = items["Cantidad"] * items["Precio"]
+    inicio = HOY - timedelta(days=365 * anios)
+    minutos = np.sort(rng.integers(0, 365 * anios * 24 * 60, n))
+    ventas = pd.DataFrame({
+        "ID": [f"{i:012x}" for i in range(n)],
+        "Fecha": [(inicio + timedelta(minutes=int(m))).strftime("%d/%m/%Y %H:%M") for m in minutos],
+        "Cliente": [f"CLIENTE {c}" for c in rng.integers(0, max(n // 20, 1), n)],
+        "Total": items.groupby("ID_Venta", sort=False)["Subtotal"].sum().to_numpy(),
+        "Tipo": rng.choice(TIPOS_VENTA, n), "Detalle": "",
+    })
+    # Las ventas viejas no tienen renglones: su detalle es el texto de antes
+    legacy = rng.random(n) < PARTE_LEGACY
+    ids_legacy = set(ventas.loc[legacy, "ID"])
+    por_id = items[items["ID_Venta"].isin(ids_legacy)].groupby("ID_Venta", sort=False)
+    ventas.loc[legacy, "Detalle"] = ventas.loc[legacy, "ID"].map({i: _detalle_legacy(g.to_dict("records")) for i, g in por_id})
+    return ventas, items[~items["ID_Venta"].isin(ids_legacy)]
+
+def _produccion(rng, stock, n):
+    filas = rng.integers(0, len(stock), n)
+    inicio = pd.Timestamp(HOY) - pd.to_timedelta(rng.integers(0, 120, n), unit="D")
+    return pd.DataFrame({
+        "ID": [f"p{i:011x}" for i in range(n)], "Fecha_Inicio": inicio.date,
+        "Producto": stock["Producto"].to_numpy()[filas], "Cantidad": rng.integers(10, 200, n),
+        "Fecha_Lista": (inicio + pd.Timedelta(days=28)).date,
+        "Estado": np.where(rng.random(n) < 0.7, "Finalizado", "En Proceso"), "Codigo": stock["Codigo"].to_numpy()[filas],
+    })
+
+def _recetas(rng, stock):
+    n = max(len(stock) // 10, 1)
+    productos = stock["Producto"].to_numpy()[:n]
+    insumos = stock["Producto"].to_numpy()[-20:]
+    filas = [(p, i, round(float(rng.uniform(0.05, 2)), 2)) for p in productos for i in rng.choice(insumos, 2, replace=False)]
+    filas += [("", "", "0.8"), ("", "", "")]  # filas rotas, como en el archivo real
+    return pd.DataFrame(filas, columns=["Producto Final", "Insumo", "Cantidad"])
+
+def _precios(rng, stock, anios, cambios=6):
+    """Historial con `cambios` aumentos por producto y por año, hasta los precios de hoy."""
+    n = len(stock) * cambios * anios
+    filas = np.repeat(np.arange(len(stock)), cambios * anios)
+    segundos = rng.integers(0, 365 * anios * 86400, n)
+    inflacion = np.exp(-rng.uniform(0, 0.05, n))  # cada registro, un poco más barato que hoy
+    fechas = pd.Timestamp(HOY) - pd.to_timedelta(segundos, unit="s")
+    return pd.DataFrame({
+        "Fecha": fechas.strftime("%Y-%m-%d %H:%M:%S"), "Codigo": stock["Codigo"].to_numpy()[filas],
+        "Producto": stock["Producto"].to_numpy()[filas],
+        "Precio Costo": np.round(stock["Precio Costo"].to_numpy()[filas] * inflacion),
+        "Precio Venta": np.round(stock["Precio Venta"].to_numpy()[filas] * inflacion),
+    })
+
+def _gastos(rng, stock, anios, compras=4):
+    """`compras` compras por producto y por año, en orden de fecha como el ledger real."""
+    n = len(stock) * compras * anios
+    filas = np.repeat(np.arange(len(stock)), compras * anios)
+    fechas = pd.Timestamp(HOY) - pd.to_timedelta(rng.integers(0, 365 * anios * 86400, n), unit="s")
+    cantidad = rng.integers(1, 200, n).astype(float)
+    costo = stock["Precio Costo"].to_numpy()[filas] * np.exp(-rng.uniform(0, 0.3, n))
+    df = pd.DataFrame({
+        "Fecha": fechas.strftime("%Y-%m-%d %H:%M:%S"), "Insumo": stock["Producto"].to_numpy()[filas],
+        "Cantidad": cantidad, "Monto": np.round(cantidad * costo), "Codigo": stock["Codigo"].to_numpy()[filas],
+    })
+    return df.sort_values("Fecha", ignore_index=True)
+
+def generar(carpeta, productos, ventas, lotes, anios, semilla=0):
+    rng = np.random.default_rng(semilla)
+    stock = _stock(rng, productos)
+    df_ventas, items = _ventas(rng, stock, ventas, anios)
+    stock.to_csv(os.path.join(carpeta, STOCK_FILE), index=False)
+    df_ventas.to_csv(os.path.join(carpeta, VENTAS_FILE), index=False)
+    items[COLS_ITEMS].to_csv(os.path.join(carpeta, VENTAS_ITEMS_FILE), index=False)
+    _produccion(rng, stock, lotes).to_csv(os.path.join(carpeta, PRODUCCION_FILE), index=False)
+    _recetas(rng, stock).to_csv(os.path.join(carpeta, RECETAS_FILE), index=False)
+    _gastos(rng, stock, anios).to_csv(os.path.join(carpeta, GASTOS_FILE), index=False)
+    _precios(rng, stock, anios).to_csv(os.path.join(carpeta, PRECIOS_FILE), index=False)
+    return stock
+
+# MEDICIÓN
+def medir(fn, repeticiones, preparar=None):
+    """Segundos de cada corrida de `fn()`; `preparar()` corre antes de cada una sin contar."""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar: preparar()
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return {"min": min(tiempos), "mediana": statistics.median(tiempos), "max": max(tiempos), "n": repeticiones}
+
+def correr(repeticiones, semilla=0):
+    """Cronometra los caminos de la app sobre los datos de la carpeta actual."""
+    rng = np.random.default_rng(semilla + 1)
+    b = backend()
+    r = {}
+    frio = lambda: (invalidar(), getattr(b, "_cache", {}).clear())  # sin cachés de lectura
+
+    r["cargar_stock_frio"] = medir(b.cargar_stock, repeticiones, frio)
+    r["cargar_stock_caliente"] = medir(b.cargar_stock, repeticiones)
+    stock = b.cargar_stock()
+    r["indice_catalogo"] = medir(lambda: indice_catalogo(stock, None), repeticiones)
+    indice = indice_catalogo(stock, b.version("stock"))
+
+    grilla = pd.DataFrame({"Codigo": stock["Codigo"].sample(100, replace=True, random_state=semilla).to_numpy(),
+                           "Cantidad": rng.integers(1, 10, 100).astype(float)})
+    r["carga_rapida_100"] = medir(lambda: agregar_lote([], grilla, stock, indice), repeticiones)
+    carrito, *_ = agregar_lote([], grilla.head(10), stock, indice)
+
+    def vender():
+        venta = {"ID": os.urandom(6).hex(), "Fecha": datetime.now().strftime("%d/%m/%Y %H:%M"), "Cliente": "BENCH",
+                 "Total": float(sum(i["Subtotal"] for i in carrito)), "Tipo": TIPOS_VENTA[0], "Detalle": ""}
+        confirmar_venta(venta, carrito)
+    r["confirmar_venta_10"] = medir(vender, repeticiones)
+
+    def olvidar_migracion(): modulo_ventas._MIGRACION["version"] = None
+    r["migrar_detalles_legacy"] = medir(migrar_detalles, 1, olvidar_migracion)
+    r["migrar_detalles_sin_pendientes"] = medir(migrar_detalles, repeticiones, olvidar_migracion)
+    r["cargar_items"] = medir(modulo_ventas.cargar_items, repeticiones)
+
+    def indice_historial(): modulo_ventas._INDICE_VENTAS["version"] = None; indice_ventas()
+    r["indice_historial"] = medir(indice_historial, repeticiones)
+    iv = indice_ventas()
+    r["historial_filtrar_pagina"] = medir(lambda: iv.pagina(iv.filtrar(cliente=iv.clientes[0]), 0, 50), repeticiones)
+    id_venta = iv.df["ID"].iloc[-1]
+    r["detalle_de_venta"] = medir(lambda: items_de_venta(id_venta), repeticiones)
+    pagina = iv.pagina(iv.filtrar(), 0, 50)
+    r["margen_pagina_50"] = medir(lambda: margen_por_venta(pagina, renglones_de_ventas(pagina["ID"])), repeticiones)
+
+    r["indice_busqueda"] = medir(lambda: IndiceBusqueda().sincronizar(stock), 1)
+    buscador = indice_busqueda(stock, b.version("stock"))
+    r["buscar"] = medir(lambda: buscador.buscar("poste 3", 20), repeticiones)
+
+    items_pdf = items_de_venta(id_venta)
+    r["generar_pdf"] = medir(lambda: generar_pdf("BENCH", items_pdf, 1000.0, TIPOS_VENTA[0], "01/01/2026 10:00"), repeticiones)
+    r["generar_excel_stock"] = medir(lambda: generar_excel(stock), 1)
+    r["excel_ventas"] = medir(lambda: exportar_excel({"Ventas": b.cargar("ventas"), "Renglones": modulo_ventas.cargar_items()}).close(), 1)
+
+    r["resumenes_completos"] = medir(lambda: Resumenes().rearmar(b.cargar("ventas"), b.cargar("ventas_items")), 1)
+    resumenes()
+    vender()
+    r["resumenes_incremental"] = medir(resumenes, 1)
+
+    rec = recetas()
+    pedido = {p: 10 for p in rec.tabla["Producto"].unique()}
+    r["explotar_recetas"] = medir(lambda: requerimientos(pedido, stock, indice, rec), repeticiones)
+    prod = b.cargar("produccion")
+    r["calendario_produccion"] = medir(lambda: calendario(prod, HOY.date()), repeticiones)
+
+    r["plan_aumento"] = medir(lambda: plan_aumento(stock, 10, {"POSTE": 15}, redondeo=100), repeticiones)
+    r["historial_precios"] = medir(lambda: HistorialPrecios(b.cargar("precios")), 1)
+    hist = HistorialPrecios(b.cargar("precios"))
+    r["precio_a_una_fecha"] = medir(lambda: hist.precio(stock["Codigo"].iat[0], stock["Producto"].iat[0], HOY - timedelta(days=200)), repeticiones)
+    ventas_todas, items_todos = b.cargar("ventas"), modulo_ventas.cargar_items().assign(Costo=np.nan)  # todo por historial
+    r["margen_por_venta_todas"] = medir(lambda: margen_por_venta(ventas_todas, items_todos, hist), 1)
+
+    r["alertas_completas"] = medir(lambda: AlertasStock().sincronizar(stock, None), repeticiones)
+    vigente = {}
+    def vender_y_leer():
+        vender()
+        vigente["version"] = b.version("stock")
+        vigente["stock"] = b.cargar_stock()
+    seguidor = AlertasStock().sincronizar(b.cargar_stock(), b.version("stock"))
+    r["alertas_tras_venta"] = medir(lambda: seguidor.sincronizar(vigente["stock"], vigente["version"]), repeticiones, vender_y_leer)
+
+    gastos = cargar_gastos()
+    r["promedio_de_compras"] = medir(lambda: promedio_de_compras(gastos), 1)
+    r["costos_compra_completos"] = medir(lambda: CostosCompra().actualizar(gastos), 1)
+    muestra = stock.sample(repeticiones, replace=True, random_state=semilla)
+    pendientes = iter(muestra[["Codigo", "Producto"]].to_dict("records"))
+    r["registrar_compra"] = medir(lambda: registrar_compras([{**next(pendientes), "Cantidad": 10.0, "Monto": 1000.0}]), repeticiones)
+    def comprar_y_leer():
+        registrar_compras([{**next(pendientes), "Cantidad": 1.0, "Monto": 100.0}])
+        vigente["gastos"] = cargar_gastos()
+    pendientes = iter(muestra[["Codigo", "Producto"]].to_dict("records"))
+    costos = CostosCompra().actualizar(cargar_gastos())
+    r["costos_compra_tras_compra"] = medir(lambda: costos.actualizar(vigente["gastos"]), repeticiones, comprar_y_leer)
+
+    # Sincronización: lo que cuesta depende de las operaciones nuevas, no del tamaño de la base
+    propio = instancia()
+    r["sincro_exportar_10"] = medir(lambda: exportar({propio: vector().get(propio, 0) - 10}), repeticiones)
+    ajenas = iter(range(1, 10 * repeticiones + 1))
+    def paquete_ajeno():
+        vigente["ops"] = [{"Origen": "benchmark", "Seq": next(ajenas), "Fecha": HOY.isoformat(), "Tipo": "stock",
+                           "Datos": json.dumps([{"Codigo": c, "Producto": p, "delta": {"Cantidad": -1.0}, "fijar": {}}])}
+                          for c, p in muestra[["Codigo", "Producto"]].head(10).itertuples(index=False)]
+    r["sincro_aplicar_10"] = medir(lambda: aplicar(vigente["ops"]), repeticiones, paquete_ajeno)
+
+    # Acopios: el ledger sale una vez del historial; después cada retiro suma solo lo nuevo
+    r["migrar_acopios"] = medir(modulo_ventas.migrar_acopios, 1)
+    ledger = cargar_acopios()
+    r["acopios_indice_completo"] = medir(lambda: Acopios().actualizar(ledger), 1)
+    clientes = acopios().clientes()
+    r["acopios_por_cliente"] = medir(lambda: acopios().pendientes(cliente=clientes[len(clientes) // 2]), repeticiones)
+    renglones = iter(acopios().pendientes().head(2 * repeticiones).to_dict("records"))
+    r["entregar_acopio"] = medir(lambda: entregar([{**next(renglones), "Cantidad": 1.0}]), repeticiones)
+    def entregar_y_leer():
+        entregar([{**next(renglones), "Cantidad": 1.0}])
+        vigente["acopios"] = cargar_acopios()
+    seguidor = Acopios().actualizar(cargar_acopios())
+    r["acopios_tras_entrega"] = medir(lambda: seguidor.actualizar(vigente["acopios"]), repeticiones, entregar_y_leer)
+    return r
+
+def _version_git():
+    try: return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError: return None
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark de Alambrados con datos sintéticos.")
+    p.add_argument("--escala", choices=ESCALAS, default="chica")
+    p.add_argument("--productos", type=int)
+    p.add_argument("--ventas", type=int)
+    p.add_argument("--lotes", type=int)
+    p.add_argument("--anios", type=int)
+    p.add_argument("--repeticiones", type=int, default=5)
+    p.add_argument("--semilla", type=int, default=0)
+    p.add_argument("--salida", help="archivo JSON (por defecto, a la salida estándar)")
+    p.add_argument("--carpeta", help="dónde generar los datos (por defecto, una temporal que se borra)")
+    args = p.parse_args(argv)
+    escala = {k: getattr(args, k) or v for k, v in ESCALAS[args.escala].items()}
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    carpeta = args.carpeta or tempfile.mkdtemp(prefix="alambrados_bench_")
+    os.makedirs(carpeta, exist_ok=True)
+    anterior = os.getcwd()
+    try:
+        if os.path.exists(os.path.join(repo, LOGO_FILE)): shutil.copy(os.path.join(repo, LOGO_FILE), carpeta)
+        t0 = time.perf_counter()
+        generar(carpeta, semilla=args.semilla, **escala)
+        generacion = time.perf_counter() - t0
+        os.chdir(carpeta)  # las rutas de datos.py son relativas
+        t0 = time.perf_counter()
+        backend().version("stock")  # con SQLite, la primera vez importa los CSV
+        apertura = time.perf_counter() - t0
+        resultados = correr(args.repeticiones, args.semilla)
+    finally:
+        os.chdir(anterior)
+        if not args.carpeta: shutil.rmtree(carpeta, ignore_errors=True)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"), "version": _version_git(),
+        "backend": BACKEND, "escala": escala, "semilla": args.semilla,
+        "python": platform.python_version(), "pandas": pd.__version__, "plataforma": platform.platform(),
+        "generacion_s": generacion, "apertura_s": apertura, "resultados_s": resultados,
+    }
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f: f.write(texto + "\n")
+    else: print(texto)
+
+if __name__ == "__main__":
+    main()
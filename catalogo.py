@@ -0,0 +1,191 @@
+import bisect
+import threading
+import unicodedata
+import pandas as pd
+
+# ÍNDICE DEL CATÁLOGO
+# Se arma una sola vez por versión del archivo de stock y resuelve
+# código → filas y nombre normalizado → filas en O(1), sin filtrar el DataFrame.
+
+def normalizar_texto(texto):
+    """Mayúsculas, sin acentos y con espacios simples: 'Portón  ' → 'PORTON'."""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.upper().split())
+
+def normalizar_codigo(codigo):
+    return str(codigo).strip()
+
+class IndiceCatalogo:
+    """Índices sobre las etiquetas de fila del stock.
+
+    Guarda solo etiquetas (no datos), así que sirve para cualquier copia del
+    DataFrame leída de la misma versión del archivo. Los códigos repetidos no se
+    resuelven en silencio: `buscar_codigo` devuelve todas las filas y el que llama
+    decide (ver `codigos_duplicados`).
+    """
+    def __init__(self, df):
+        codigos = df["Codigo"].map(normalizar_codigo) if not df.empty else []
+        nombres = df["Producto"].map(normalizar_texto) if not df.empty else []
+        self._por_codigo = {}
+        self._por_nombre = {}
+        self._por_par = {}
+        self.version = None
+        self._mapas = {}
+        for etiqueta, cod, nom in zip(df.index, codigos, nombres):
+            self._por_codigo.setdefault(cod, []).append(etiqueta)
+            self._por_nombre.setdefault(nom, []).append(etiqueta)
+            self._por_par.setdefault((cod, nom), etiqueta)
+
+    def buscar_codigo(self, codigo):
+        """Todas las filas con ese código (lista vacía si no existe)."""
+        return self._por_codigo.get(normalizar_codigo(codigo), [])
+
+    def buscar_nombre(self, nombre):
+        return self._por_nombre.get(normalizar_texto(nombre), [])
+
+    def buscar_item(self, codigo, producto):
+        """Fila de un ítem del carrito: primero por (código, nombre), después por código único."""
+        etiqueta = self._por_par.get((normalizar_codigo(codigo), normalizar_texto(producto)))
+        if etiqueta is not None: return etiqueta
+        filas = self.buscar_codigo(codigo)
+        return filas[0] if len(filas) == 1 else None
+
+    @staticmethod
+    def _mapa(por_clave):
+        unicos = {clave: filas[0] for clave, filas in por_clave.items() if len(filas) == 1}
+        return pd.Series(unicos, dtype=object), set(por_clave) - set(unicos)
+
+    def mapa_codigos(self):
+        """(Series código → fila para los códigos únicos, set de códigos repetidos),
+        para cruzar una columna entera de códigos con un solo `.map`."""
+        if "codigo" not in self._mapas: self._mapas["codigo"] = self._mapa(self._por_codigo)
+        return self._mapas["codigo"]
+
+    def mapa_nombres(self):
+        """Como `mapa_codigos`, por nombre normalizado."""
+        if "nombre" not in self._mapas: self._mapas["nombre"] = self._mapa(self._por_nombre)
+        return self._mapas["nombre"]
+
+    def codigos_duplicados(self):
+        return {cod: filas for cod, filas in self._por_codigo.items() if len(filas) > 1}
+
+_INDICE_CACHE = {"version": None, "indice": None}
+
+def indice_catalogo(df, version):
+    """Devuelve el índice de `df`, reconstruyéndolo solo si cambió la versión del stock."""
+    if version is None or _INDICE_CACHE["version"] != version:
+        _INDICE_CACHE["indice"] = IndiceCatalogo(df)
+        _INDICE_CACHE["indice"].version = version
+        _INDICE_CACHE["version"] = version
+    return _INDICE_CACHE["indice"]
+
+# BUSCADOR POR NOMBRE
+# Índice invertido sobre código y nombre normalizados: prefijo de código, prefijo de
+# palabra y, si nada coincide, trigramas (tolera errores de tipeo). Devuelve
+# etiquetas de fila rankeadas. Entre versiones del stock se actualiza solo lo que
+# cambió (productos nuevos, renombrados o borrados), sin reindexar todo.
+
+def _trigramas(palabra):
+    p = f"  {palabra} "
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+def _rango_prefijo(ordenados, prefijo):
+    i = bisect.bisect_left(ordenados, prefijo)
+    while i < len(ordenados) and ordenados[i].startswith(prefijo):
+        yield ordenados[i]
+        i += 1
+
+class IndiceBusqueda:
+    def __init__(self):
+        self._crudos = {}    # etiqueta → (Codigo, Producto) tal como están en el stock
+        self._docs = {}      # etiqueta → (código normalizado, nombre normalizado)
+        self._codigos = {}   # código → etiquetas
+        self._tokens = {}    # palabra → etiquetas
+        self._trigramas = {} # trigrama → etiquetas
+        self._orden_codigos = []
+        self._orden_tokens = []
+        self._lock = threading.Lock()  # compartido entre sesiones
+
+    @staticmethod
+    def _sumar(dic, orden, clave, etiqueta):
+        if clave not in dic:
+            dic[clave] = set()
+            if orden is not None: bisect.insort(orden, clave)
+        dic[clave].add(etiqueta)
+
+    @staticmethod
+    def _restar(dic, orden, clave, etiqueta):
+        grupo = dic.get(clave)
+        if grupo is None: return
+        grupo.discard(etiqueta)
+        if not grupo:
+            del dic[clave]
+            if orden is not None: del orden[bisect.bisect_left(orden, clave)]
+
+    def agregar(self, etiqueta, codigo, producto):
+        if etiqueta in self._docs: self.quitar(etiqueta)
+        cod, nom = normalizar_codigo(codigo).upper(), normalizar_texto(producto)
+        self._crudos[etiqueta] = (codigo, producto)
+        self._docs[etiqueta] = (cod, nom)
+        self._sumar(self._codigos, self._orden_codigos, cod, etiqueta)
+        for tok in set(nom.split()):
+            self._sumar(self._tokens, self._orden_tokens, tok, etiqueta)
+            for tri in _trigramas(tok): self._sumar(self._trigramas, None, tri, etiqueta)
+
+    def quitar(self, etiqueta):
+        cod, nom = self._docs.pop(etiqueta)
+        del self._crudos[etiqueta]
+        self._restar(self._codigos, self._orden_codigos, cod, etiqueta)
+        for tok in set(nom.split()):
+            self._restar(self._tokens, self._orden_tokens, tok, etiqueta)
+            for tri in _trigramas(tok): self._restar(self._trigramas, None, tri, etiqueta)
+
+    def sincronizar(self, df):
+        """Deja el índice igual a `df` tocando solo las filas nuevas, cambiadas o borradas."""
+        vigentes = dict(zip(df.index, zip(df["Codigo"], df["Producto"]))) if not df.empty else {}
+        with self._lock:
+            for etiqueta in [e for e in self._crudos if e not in vigentes]: self.quitar(etiqueta)
+            for etiqueta, crudo in vigentes.items():
+                if self._crudos.get(etiqueta) != crudo: self.agregar(etiqueta, *crudo)
+        return self
+
+    def _puntajes_termino(self, termino):
+        puntajes = {}
+        for cod in _rango_prefijo(self._orden_codigos, termino):
+            for e in self._codigos[cod]: puntajes[e] = max(puntajes.get(e, 0), 100 if cod == termino else 50)
+        for tok in _rango_prefijo(self._orden_tokens, termino):
+            for e in self._tokens[tok]: puntajes[e] = max(puntajes.get(e, 0), 10 if tok == termino else 5)
+        if not puntajes and len(termino) >= 3:
+            consulta = _trigramas(termino)
+            comunes = {}
+            for tri in consulta:
+                for e in self._trigramas.get(tri, ()): comunes[e] = comunes.get(e, 0) + 1
+            for e, n in comunes.items():
+                if n / len(consulta) >= 0.5: puntajes[e] = 3 * n / len(consulta)
+        return puntajes
+
+    def buscar(self, consulta, limite=20):
+        """Hasta `limite` etiquetas de fila, las más relevantes primero.
+
+        Todas las palabras de la consulta tienen que coincidir ("porton 3" → PORTÓN 3.00 ...).
+        """
+        terminos = normalizar_texto(consulta).split()
+        if not terminos: return []
+        with self._lock:
+            total = None
+            for termino in terminos:
+                puntajes = self._puntajes_termino(termino)
+                total = puntajes if total is None else {e: total[e] + p for e, p in puntajes.items() if e in total}
+                if not total: return []
+            ranking = sorted(total.items(), key=lambda x: (-x[1], self._docs[x[0]][1]))
+        return [e for e, _ in ranking[:limite]]
+
+_BUSQUEDA_CACHE = {"version": None, "indice": IndiceBusqueda()}
+
+def indice_busqueda(df, version):
+    """Buscador sincronizado con `df`; solo mira el stock cuando cambió su versión."""
+    if version is None or _BUSQUEDA_CACHE["version"] != version:
+        _BUSQUEDA_CACHE["indice"].sincronizar(df)
+        _BUSQUEDA_CACHE["version"] = version
+    return _BUSQUEDA_CACHE["indice"]
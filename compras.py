@@ -0,0 +1,155 @@
+import threading
+import pandas as pd
+
+from almacen import backend, movimiento
+from catalogo import normalizar_texto, normalizar_codigo, indice_catalogo
+from datos import COLS_GASTOS, FORMATO_FECHA_PRECIOS, ahora_arg
+
+# COMPRAS Y COSTO PROMEDIO
+# Cada ingreso de mercadería queda como una fila de gastos_del_carmen.csv (Fecha,
+# Insumo, Cantidad, Monto total, Codigo), escrita en la misma transacción que suma la
+# Cantidad al stock. El Precio Costo del stock pasa a ser el promedio ponderado móvil:
+#   nuevo = (físico antes × costo vigente + Monto) / (físico antes + Cantidad)
+# calculado sobre el stock vigente al grabar, así dos compras simultáneas no se pisan.
+# Un ingreso sin Monto (devolución, regalo) suma unidades sin mover el costo.
+#
+# El ledger solo sabe de compras, no de lo que había en existencia en cada una (las
+# ventas no están ahí), así que lo que sale de él es otra cifra: el "Promedio Compras",
+# total pagado / unidades compradas. `promedio_de_compras` lo da después de cada compra
+# con un groupby + cumsum, y `CostosCompra` guarda los totales por producto sumando
+# solo las filas nuevas (como los resúmenes de ventas). Las filas viejas sin Codigo se
+# cruzan con el stock por nombre normalizado, como las recetas.
+COLS_COSTOS = ["Codigo", "Insumo", "Compras", "Unidades", "Monto", "Promedio Compras", "Ultimo Costo", "Ultima Compra"]
+
+def costo_promedio(cantidad, costo, compradas, monto):
+    """Costo unitario después de comprar `compradas` por `monto` teniendo `cantidad` a `costo`.
+
+    Con el físico en cero o sin costo conocido manda la compra; sin monto no cambia.
+    """
+    cantidad = max(float(cantidad), 0.0)
+    if monto <= 0 or compradas <= 0: return float(costo)
+    if cantidad <= 0 or costo <= 0: return monto / compradas
+    return (cantidad * costo + monto) / (cantidad + compradas)
+
+def registrar_compras(compras, fecha=None):
+    """Ingresa compras ({"Codigo", "Producto", "Cantidad", "Monto"}) al stock y al ledger.
+
+    Todo en una transacción; el ledger se escribe antes que el stock (en CSV un corte
+    deja una compra de más, nunca mercadería sin registrar). Devuelve (las compras
+    que no se encontraron en el stock, dict fila → costo promedio nuevo).
+    """
+    fecha = fecha or ahora_arg().strftime(FORMATO_FECHA_PRECIOS)
+    b = backend()
+    with b.transaccion():
+        stock = b.cargar_stock()
+        indice = indice_catalogo(stock, b.version("stock"))
+        vigente, faltantes, filas, movs = {}, [], [], []
+        for compra in compras:
+            f = indice.buscar_item(compra["Codigo"], compra["Producto"])
+            if f is None:
+                faltantes.append(compra)
+                continue
+            cant, monto = float(compra["Cantidad"]), float(compra.get("Monto") or 0.0)
+            previo = vigente.get(f, (stock.at[f, "Cantidad"], stock.at[f, "Precio Costo"]))
+            vigente[f] = (previo[0] + cant, costo_promedio(*previo, cant, monto))
+            filas.append({"Fecha": fecha, "Insumo": stock.at[f, "Producto"], "Cantidad": cant,
+                          "Monto": monto, "Codigo": stock.at[f, "Codigo"]})
+            movs.append(movimiento(stock.at[f, "Codigo"], stock.at[f, "Producto"], delta={"Cantidad": cant}))
+        costos = {f: c for f, (_, c) in vigente.items() if abs(c - stock.at[f, "Precio Costo"]) > 1e-9}
+        movs += [movimiento(stock.at[f, "Codigo"], stock.at[f, "Producto"], fijar={"Precio Costo": c}) for f, c in costos.items()]
+        b.anexar("gastos", filas)
+        if movs: b.mover_stock(movs)
+    return faltantes, costos
+
+def cargar_gastos():
+    """Ledger de compras tipado; Monto vacío = sin costo."""
+    gastos = backend().cargar("gastos").reindex(columns=COLS_GASTOS)  # las filas viejas no traen Codigo
+    for col in ["Fecha", "Insumo", "Codigo"]: gastos[col] = gastos[col].fillna("").astype(str)
+    gastos["Cantidad"] = pd.to_numeric(gastos["Cantidad"], errors="coerce").fillna(0.0)
+    gastos["Monto"] = pd.to_numeric(gastos["Monto"], errors="coerce").fillna(0.0)
+    return gastos
+
+def _claves(gastos):
+    """Clave de producto por fila: el código si está, si no el nombre normalizado."""
+    codigos = gastos["Codigo"].map(normalizar_codigo)
+    return codigos.where(codigos != "", "#" + gastos["Insumo"].map(normalizar_texto))
+
+def promedio_de_compras(gastos):
+    """El ledger con "Costo Unitario" y "Promedio Compras" (de todo lo comprado hasta esa
+    compra inclusive) por producto, en una pasada. Las compras sin Monto no pesan."""
+    df = gastos.assign(clave=_claves(gastos).to_numpy(), Fecha_=pd.to_datetime(gastos["Fecha"], errors="coerce", format="ISO8601"))
+    df = df.sort_values("Fecha_", kind="stable")
+    costeadas = df["Cantidad"].where(df["Monto"] > 0, 0.0)
+    g = pd.DataFrame({"clave": df["clave"], "u": costeadas, "m": df["Monto"]}).groupby("clave", sort=False)
+    acum_u, acum_m = g["u"].cumsum(), g["m"].cumsum()
+    df["Costo Unitario"] = (df["Monto"] / df["Cantidad"]).where((df["Monto"] > 0) & (df["Cantidad"] > 0))
+    df["Promedio Compras"] = (acum_m / acum_u).where(acum_u > 0)
+    return df.drop(columns=["clave", "Fecha_"]).sort_index()
+
+def _firma(fila):
+    return tuple(str(v) for v in fila)
+
+class CostosCompra:
+    """Totales de compra por producto, al día sumando solo lo agregado al ledger."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._tabla = pd.DataFrame(columns=COLS_COSTOS[:-3] + ["Costeadas", "Ultimo Costo", "Ultima Compra"]).set_index("Codigo")
+        self._marca = (0, None, None)  # (filas sumadas, firma de la última, columnas)
+
+    def actualizar(self, gastos):
+        with self._lock:
+            n, firma, columnas = self._marca
+            if n and (len(gastos) < n or list(gastos.columns) != columnas or _firma(gastos.iloc[n - 1]) != firma): self.reiniciar()
+            nuevos = gastos.iloc[self._marca[0]:]
+            if not nuevos.empty: self._sumar(nuevos)
+            self._marca = (len(gastos), _firma(gastos.iloc[-1]) if len(gastos) else None, list(gastos.columns))
+        return self
+
+    def _sumar(self, nuevos):
+        con_monto = (nuevos["Monto"] > 0) & (nuevos["Cantidad"] > 0)
+        df = pd.DataFrame({
+            "Codigo": _claves(nuevos).to_numpy(), "Insumo": nuevos["Insumo"].to_numpy(), "Compras": 1,
+            "Unidades": nuevos["Cantidad"].to_numpy(), "Monto": nuevos["Monto"].to_numpy(),
+            "Costeadas": nuevos["Cantidad"].where(con_monto, 0.0).to_numpy(),
+            "Ultimo Costo": (nuevos["Monto"] / nuevos["Cantidad"]).where(con_monto).to_numpy(),
+            "Ultima Compra": nuevos["Fecha"].to_numpy(),
+        })
+        g = df.groupby("Codigo", sort=False)
+        suma = g[["Compras", "Unidades", "Monto", "Costeadas"]].sum()
+        suma = suma.join(g[["Insumo", "Ultima Compra"]].last()).join(g["Ultimo Costo"].last())  # last() salta los NaN
+        previo = self._tabla
+        total = suma[["Compras", "Unidades", "Monto", "Costeadas"]].add(previo[["Compras", "Unidades", "Monto", "Costeadas"]], fill_value=0)
+        ultimos = suma[["Insumo", "Ultima Compra", "Ultimo Costo"]].combine_first(previo[["Insumo", "Ultima Compra", "Ultimo Costo"]])
+        self._tabla = total.join(ultimos)
+
+    def tabla(self):
+        """Un renglón por producto comprado: Compras, Unidades, Monto, Promedio Compras, Ultimo Costo."""
+        with self._lock: df = self._tabla.copy()
+        df["Promedio Compras"] = (df["Monto"] / df["Costeadas"]).where(df["Costeadas"] > 0)
+        df = df.reset_index()
+        df["Codigo"] = df["Codigo"].where(~df["Codigo"].str.startswith("#"), "")
+        return df.reindex(columns=COLS_COSTOS)
+
+    def por_fila(self, indice):
+        """"Promedio Compras" y "Ultimo Costo" indexados por fila del stock
+        (código único primero, nombre después); las filas sin compras no aparecen."""
+        df = self.tabla()
+        unicos, _ = indice.mapa_codigos()
+        nombres, _ = indice.mapa_nombres()
+        filas = df["Codigo"].map(unicos).combine_first(df["Insumo"].map(normalizar_texto).map(nombres))
+        ok = filas.notna().to_numpy()
+        out = df.loc[ok, ["Promedio Compras", "Ultimo Costo"]].set_axis(filas[ok].to_numpy())
+        return out[~out.index.duplicated(keep="last")]
+
+_COSTOS = {"version": None, "costos": CostosCompra()}
+
+def costos_compra():
+    """Totales de compra al día; solo suma algo si cambió el ledger de gastos."""
+    version = backend().version("gastos")
+    if version is None or _COSTOS["version"] != version:
+        _COSTOS["costos"].actualizar(cargar_gastos())
+        _COSTOS["version"] = version
+    return _COSTOS["costos"]
@@ -1,12 +1,29 @@
 import streamlit as st
 import pandas as pd
 import os
-import io
-import ast 
-import re 
-from datetime import date, timedelta, datetime
-import pytz
-from fpdf import FPDF
+from datetime import date, timedelta
+from functools import partial
+from catalogo import indice_catalogo, indice_busqueda
+from almacen import backend, diferencias_stock
+from ventas import (
+    agregar_lote, confirmar_venta, migrar_detalles, migrar_acopios, cargar_items, items_de_venta, renglones_de_ventas,
+    comprobantes_de_ventas, indice_ventas,
+)
+from resumenes import resumenes
+from metricas import iniciar_corrida, cerrar_corrida, seccion, totales, corridas, resumen, mas_lentas, exportar
+from precios import (
+    COLUMNAS_PRECIO, categorias, plan_aumento, leer_lista, plan_lista, aplicar, historial_precios, margen_por_venta,
+)
+from reposicion import alertas, velocidad_de_venta, en_riesgo, HORIZONTE
+from compras import registrar_compras, cargar_gastos, promedio_de_compras, costos_compra
+from acopios import acopios, entregar, entregar_todo, diferencias_reservado, conciliar_reservado
+from sincro import exportar as exportar_paquete, importar as importar_paquete, pares, instancia
+from produccion import recetas, requerimientos, consumo_de_lote, pedido_abierto, calendario, liberar_lotes
+from datos import LOGO_FILE, COLS_STOCK, nuevo_id
+from reportes import ahora_arg, leer_excel, pdf_cacheado, exportar_comprobantes
+
+# Métricas de esta corrida (cierra la anterior si un st.rerun() la cortó)
+st.session_state.corrida = iniciar_corrida(previa=st.session_state.get("corrida"))
 
 # OCULTAR MENU Y HEADER DE STREAMLIT
 st.markdown("""
@@ -64,192 +81,48 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# RUTAS Y ARCHIVOS
-STOCK_FILE = "stock_del_carmen.csv"
-GASTOS_FILE = "gastos_del_carmen.csv"
-VENTAS_FILE = "ventas_del_carmen.csv"
-PRODUCCION_FILE = "produccion_del_carmen.csv"
-LOGO_FILE = "alambrados.jpeg"
-
-# LISTA COMPLETA
-PRODUCTOS_INICIALES = [
-    {'Codigo': '97', 'Producto': 'ADICIONAL PINCHES 20.000', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '6', 'Producto': 'BOYERITO IMPORTADO X 1000', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '3', 'Producto': 'CONCERTINA DOBLE CRUZADA X 45', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '2', 'Producto': 'CONCERTINA SIMPLE', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '11', 'Producto': 'DECO 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '0', 'Producto': 'DECO 1.80', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '33', 'Producto': 'ESPARRAGOS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '25', 'Producto': 'ESQUINERO OLIMPICO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 18000, 'Precio Venta': 39000, 'Stock Minimo': 0},
-    {'Codigo': '2', 'Producto': 'ESQUINERO RECTO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 32000, 'Stock Minimo': 0},
-    {'Codigo': '15', 'Producto': 'GALVA 14 X KILO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'kg', 'Precio Costo': 0, 'Precio Venta': 6800, 'Stock Minimo': 0},
-    {'Codigo': '5', 'Producto': 'GALVA 18', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'kg', 'Precio Costo': 0, 'Precio Venta': 11900, 'Stock Minimo': 0},
-    {'Codigo': '31', 'Producto': 'GANCHOS ESTIRATEJIDOS 5/16', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 2100, 'Stock Minimo': 0},
-    {'Codigo': '15', 'Producto': 'OVALADO X MAYOR X 1000', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 290000, 'Stock Minimo': 0},
-    {'Codigo': '32', 'Producto': 'PALOMITAS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 2100, 'Stock Minimo': 0},
-    {'Codigo': '24', 'Producto': 'PINCHES X METRO PINCHOSOS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '41', 'Producto': 'PLANCHUELA 1.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 4800, 'Stock Minimo': 0},
-    {'Codigo': '40', 'Producto': 'PLANCHUELA 1.20', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 5100, 'Stock Minimo': 0},
-    {'Codigo': '35', 'Producto': 'PLANCHUELA 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 5800, 'Stock Minimo': 0},
-    {'Codigo': '34', 'Producto': 'PLANCHUELA 2.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 7999, 'Stock Minimo': 0},
-    {'Codigo': '47', 'Producto': 'PORTON 3.00 X 1.80 BLACK', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 360000, 'Stock Minimo': 0},
-    {'Codigo': '9', 'Producto': 'PORTON DE CANO X 4.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 3600000, 'Stock Minimo': 0},
-    {'Codigo': '10', 'Producto': 'PORTON INDUSTRIAL X 4.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 499999, 'Stock Minimo': 0},
-    {'Codigo': '51', 'Producto': 'PORTON LIVIANO 1.80 X 3.00 CANO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 260000, 'Stock Minimo': 0},
-    {'Codigo': '53', 'Producto': 'PORTON LIVIANO 1.80X 3.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '11', 'Producto': 'PORTON SIMPLE X 3.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '54', 'Producto': 'POSTE DE MADERA', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 15000, 'Stock Minimo': 0},
-    {'Codigo': '27', 'Producto': 'POSTE OLIMPICO', 'Cantidad': 10, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 17999, 'Stock Minimo': 0},
-    {'Codigo': '28', 'Producto': 'POSTE RECTO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 16999, 'Stock Minimo': 0},
-    {'Codigo': '57', 'Producto': 'POSTE REDONDE ECO OBRA', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 15000, 'Stock Minimo': 0},
-    {'Codigo': '14', 'Producto': 'PUA X MAYOR X500', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '43', 'Producto': 'PUA X METRO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 550, 'Stock Minimo': 0},
-    {'Codigo': '16', 'Producto': 'PUERTITA CLASICA 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 1589000, 'Stock Minimo': 0},
-    {'Codigo': '12', 'Producto': 'PUERTITA CORAZON 1.5 X 1.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 162800, 'Stock Minimo': 0},
-    {'Codigo': '13', 'Producto': 'PUERTITA CRUZ REFORZADA 2.00 X 1.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 199800, 'Stock Minimo': 0},
-    {'Codigo': '7', 'Producto': 'PUERTITA LIVINA 1.00 X 1.80', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 125300, 'Stock Minimo': 0},
-    {'Codigo': '26', 'Producto': 'PUNTAL', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 13900, 'Stock Minimo': 0},
-    {'Codigo': 'R16', 'Producto': 'RECOCIDO 16', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'kg', 'Precio Costo': 0, 'Precio Venta': 4900, 'Stock Minimo': 0},
-    {'Codigo': 'REF', 'Producto': 'REFUERZO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 39000, 'Stock Minimo': 0},
-    {'Codigo': '55', 'Producto': 'TEJIDO 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 59000, 'Stock Minimo': 0},
-    {'Codigo': '19', 'Producto': 'TEJIDO 2.00 X METRO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 74999, 'Stock Minimo': 0},
-    {'Codigo': '59', 'Producto': 'TEJIDO DE OBRA 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '63', 'Producto': 'TEJIDO DE OBRA 1.80', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '50', 'Producto': 'TEJIDO DEL 12 - 2 PULGADAS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '18', 'Producto': 'TEJIDO RECU 1.8', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
-    {'Codigo': '39', 'Producto': 'TEJIDO ROMBITO 2 PULGADAS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 69999, 'Stock Minimo': 0},
-    {'Codigo': '29', 'Producto': 'Torniquete', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 1999, 'Precio Venta': 3500, 'Stock Minimo': 0},
-    {'Codigo': '1', 'Producto': 'liso', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 360, 'Stock Minimo': 0}
-]
-
 # FUNCIONES
-def ahora_arg():
-    try: return datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
-    except: return datetime.now()
-
-def generar_excel(df):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Stock')
-    return output.getvalue()
-
 def cargar_datos_stock():
-    if not os.path.exists(STOCK_FILE):
-        df_init = pd.DataFrame(PRODUCTOS_INICIALES)
-        df_init.to_csv(STOCK_FILE, index=False)
-        return df_init
-    
     try:
-        df = pd.read_csv(STOCK_FILE)
+        with seccion("cargar_datos_stock"): return backend().cargar_stock()
     except Exception as e:
         st.error(f"Error base de datos: {e}")
-        return pd.DataFrame() 
-
-    cols_necesarias = ["Codigo", "Producto", "Cantidad", "Reservado", "Unidad", "Precio Costo", "Precio Venta", "Stock Minimo"]
-    cambio = False
-    for col in cols_necesarias:
-        if col not in df.columns:
-            df[col] = 0.0
-            cambio = True
-    
-    df["Codigo"] = df["Codigo"].fillna("").astype(str)
-    df["Producto"] = df["Producto"].fillna("").astype(str)
-    df["Unidad"] = df["Unidad"].fillna("un.").astype(str)
-    for col in ["Cantidad", "Reservado", "Precio Costo", "Precio Venta", "Stock Minimo"]:
-        if col in df.columns: df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-    
-    if cambio: df.to_csv(STOCK_FILE, index=False)
-    return df
-
-def cargar_datos_general(archivo, cols):
-    if not os.path.exists(archivo): return pd.DataFrame(columns=cols)
-    return pd.read_csv(archivo)
-
-# PDF GENERATOR 
-class PDF(FPDF):
-    def header(self):
-        if os.path.exists(LOGO_FILE):
-            try: self.image(LOGO_FILE, 170, 8, 30) 
-            except: pass
-        self.set_font('Arial', 'B', 15)
-        self.set_text_color(183, 28, 28)
-        self.cell(80)
-        self.cell(30, 10, 'PRESUPUESTO', 0, 0, 'C')
-        self.ln(20)
-        self.set_text_color(0, 0, 0)
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, 'Alambrados del Carmen S.A.', 0, 0, 'C')
-
-def generar_pdf(cliente, items, total, tipo_venta=""):
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=11)
-    fecha_hora = ahora_arg().strftime("%d/%m/%Y %H:%M")
-    
-    pdf.cell(200, 10, txt=f"Cliente: {cliente}", ln=True)
-    pdf.cell(200, 10, txt=f"Fecha Emision: {fecha_hora}", ln=True)
-    pdf.ln(10)
-    
-    # Encabezados
-    pdf.set_fill_color(211, 47, 47) 
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", 'B', 9) 
-    pdf.cell(15, 10, "Cod", 1, 0, 'C', True)
-    pdf.cell(100, 10, "Producto", 1, 0, 'C', True)
-    pdf.cell(15, 10, "Cant", 1, 0, 'C', True)
-    pdf.cell(25, 10, "Unit", 1, 0, 'C', True)
-    pdf.cell(25, 10, "Total", 1, 1, 'C', True)
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", size=9)
-    
-    for item in items:
-        # Lógica Robusta de Impresión
-        if isinstance(item, dict):
-            cod = str(item.get('Codigo', '-'))[:6]
-            prod = str(item.get('Producto', ''))
-            # Recorte de texto largo para que no se encime
-            if len(prod) > 55: prod = prod[:52] + "..."
-            
-            cant = item.get('Cantidad', 0)
-            prec = item.get('Precio', 0)
-            sub = item.get('Subtotal', 0)
-        else:
-            # Fallback para ventas muy viejas (string simple)
-            cod = "-"
-            prod = str(item)[:55]
-            cant = 0
-            prec = 0
-            sub = 0
-        
-        try: prod_clean = prod.encode('latin-1', 'replace').decode('latin-1')
-        except: prod_clean = prod
-
-        pdf.cell(15, 8, cod, 1)
-        pdf.cell(100, 8, prod_clean, 1)
-        pdf.cell(15, 8, f"{cant:.1f}", 1)
-        pdf.cell(25, 8, f"${prec:.0f}", 1)
-        pdf.cell(25, 8, f"${sub:.0f}", 1)
-        pdf.ln()
-        
-    pdf.ln(5)
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(155, 10, "TOTAL FINAL", 0)
-    pdf.set_text_color(183, 28, 28)
-    pdf.cell(25, 10, f"${total:,.0f}", 0, 1)
-    
-    pdf.ln(20)
-    pdf.set_font("Arial", 'I', 8)
-    pdf.set_text_color(80, 80, 80)
-    texto_legal = "Presupuesto sujeto a disponibilidad de stock al momento de la compra. Los precios pueden sufrir modificaciones sin previo aviso hasta la confirmación del pago."
-    pdf.multi_cell(0, 5, texto_legal)
-    
-    return pdf.output(dest='S').encode('latin-1')
+        return pd.DataFrame()
+
+def cargar_catalogo():
+    """Stock + índice de búsqueda (el índice se reutiliza mientras el stock no cambie)."""
+    version = backend().version("stock")
+    df = cargar_datos_stock()
+    with seccion("indice_catalogo"): return df, indice_catalogo(df, version)
+
+def cargar_datos_general(tabla):
+    """Ventas, renglones o producción, desde el backend configurado."""
+    with seccion(f"cargar_datos_general:{tabla}"): return backend().cargar(tabla)
+
+def excel_stock():
+    """Lo llama st.download_button al hacer clic."""
+    return leer_excel("stock", backend().version("stock"), lambda: {"Stock": cargar_datos_stock()[COLS_STOCK]})
+
+def excel_completo():
+    """Stock, ventas con sus renglones, producción, gastos y acopios pendientes en un solo libro
+    (lo llama st.download_button al hacer clic)."""
+    b = backend()
+    version = tuple(b.version(t) for t in ["stock", "ventas", "ventas_items", "produccion", "gastos", "acopios"])
+    def hojas():
+        ventas = b.cargar("ventas").drop(columns=["Detalle"], errors="ignore")
+        renglones = ventas.merge(cargar_items().drop(columns=["Costo"]), how="left", left_on="ID", right_on="ID_Venta")
+        return {
+            "Stock": cargar_datos_stock()[COLS_STOCK],
+            "Ventas": renglones.drop(columns=["ID_Venta"]).rename(columns={"Total": "Total Venta"}),
+            "Produccion": b.cargar("produccion"),
+            "Gastos": cargar_gastos(),
+            "Acopios": acopios().pendientes(),
+        }
+    return leer_excel("completo", version, hojas)
 
 if 'carrito' not in st.session_state: st.session_state.carrito = []
 if 'input_key' not in st.session_state: st.session_state.input_key = 0
+if 'editor_key' not in st.session_state: st.session_state.editor_key = 0
 
 # BARRA LATERAL
 with st.sidebar:
@@ -257,20 +130,67 @@ with st.sidebar:
     else: st.title("AC")
     st.write("---")
     st.caption(f"📅 {ahora_arg().strftime('%d/%m/%Y %H:%M')}")
+    df_alerta, indice_alerta = cargar_catalogo()
+    n_alertas = len(alertas(df_alerta, indice_alerta.version)) if not df_alerta.empty else 0
+    if n_alertas: st.badge(f"{n_alertas} bajo mínimo", icon="⚠️", color="red")
+    else: st.badge("Stock sobre mínimo", icon="✅", color="green")
     st.write("---")
     with st.expander("⚙️ Admin"):
+        st.caption(f"Base de datos: {backend().nombre.upper()}")
         if st.button("♻️ Reiniciar Base de Datos"):
-             if os.path.exists(STOCK_FILE): os.remove(STOCK_FILE)
+             backend().reiniciar_stock()
              st.success("Reiniciando...")
              st.rerun()
+        st.download_button("📊 Excel Completo", excel_completo, f"Alambrados_{date.today()}.xlsx",
+                           help="Stock, ventas con renglones, producción, gastos y acopios pendientes.")
+        if st.button("🧹 Compactar Historiales"):
+            backend().compactar()
+            st.success("Historiales compactados.")
+        if backend().nombre == "sqlite":
+            if st.button("📤 Exportar a CSV"):
+                backend().exportar_csv("exportacion")
+                st.success("CSV exportados en la carpeta 'exportacion'.")
+            if st.button("📥 Importar desde CSV"):
+                backend().importar_csv()
+                st.success("Base reemplazada con los CSV.")
+                st.rerun()
+        st.write("---")
+        st.caption(f"🔄 Sincronización · instancia {instancia()}")
+        conocidos = pares()
+        par = st.selectbox("Paquete para", [None] + list(conocidos), format_func=lambda p: "Todo (par nuevo)" if p is None else p)
+        st.download_button("📤 Paquete de sincronización", lambda: exportar_paquete(conocidos.get(par)),
+                           f"sincro_{instancia()}_{date.today()}.jsonl.gz", help="Solo lo que ese par todavía no tiene.")
+        paquete = st.file_uploader("Paquete recibido", type=["gz"], key=f"paquete_{st.session_state.editor_key}")
+        if paquete is not None and st.button("📥 Aplicar paquete"):
+            try:
+                r = importar_paquete(paquete.getvalue())
+                st.session_state.aviso_sincro = f"{r['aplicadas']} operación(es) aplicadas, {r['repetidas']} ya estaban."
+                if r["sin_producto"]: st.session_state.aviso_sincro += f" Sin producto: {', '.join(r['sin_producto'])}."
+                if r["huecos"]: st.session_state.aviso_sincro += " Faltan operaciones anteriores: pedir un paquete completo."
+            except ValueError as e: st.session_state.aviso_sincro = f"No se pudo aplicar: {e}"
+            st.session_state.editor_key += 1
+            st.session_state.pop("stock_base", None)
+            st.rerun()
+        if "aviso_sincro" in st.session_state: st.info(st.session_state.pop("aviso_sincro"))
+        st.write("---")
+        st.caption("⏱️ Rendimiento")
+        tiempos = totales()
+        if tiempos:
+            st.caption(f"{len(corridas())} corridas · p50 {tiempos[0]:.0f} ms · p95 {tiempos[1]:.0f} ms")
+            st.dataframe(resumen().round(1), hide_index=True)
+            st.caption("Corridas más lentas:")
+            st.dataframe(mas_lentas().round(1), hide_index=True)
+            if st.button("📝 Guardar en log"):
+                st.success(f"{exportar('metricas.log')} corridas agregadas a metricas.log")
+        else: st.caption("Todavía no hay corridas medidas.")
 
 # INTERFAZ PRINCIPAL
 st.title("Gestión Comercial")
-tab_cot, tab_stock, tab_prod, tab_hist = st.tabs(["📝 Cotizador", "💰 Stock y Costos", "🏭 Producción", "📊 Historial"])
+tab_cot, tab_stock, tab_prod, tab_hist, tab_tablero = st.tabs(["📝 Cotizador", "💰 Stock y Costos", "🏭 Producción", "📊 Historial", "📈 Tablero"])
 
 # 1. COTIZADOR
-with tab_cot:
-    df_s = cargar_datos_stock()
+with tab_cot, seccion("pestaña:Cotizador"):
+    df_s, indice = cargar_catalogo()
     if df_s.empty: st.error("⚠️ Base vacía.")
     else:
         if "Reservado" not in df_s.columns: df_s["Reservado"] = 0.0
@@ -301,37 +221,33 @@ with tab_cot:
                 )
                 
                 if st.button("🔄 Procesar Lista", type="primary"):
-                    items_agregados = 0
-                    items_no_encontrados = []
-                    for index, row in edited_input.iterrows():
-                        cod_ingresado = str(row["Codigo"]).strip()
-                        cant_ingresada = float(row["Cantidad"])
-                        if cod_ingresado:
-                            filtro = df_s[df_s["Codigo"] == cod_ingresado]
-                            if not filtro.empty:
-                                fila = filtro.iloc[0]
-                                st.session_state.carrito.append({
-                                    "Codigo": fila["Codigo"], "Producto": fila["Producto"],
-                                    "Cantidad": cant_ingresada, "Precio": fila["Precio Venta"],
-                                    "Subtotal": cant_ingresada * fila["Precio Venta"]
-                                })
-                                items_agregados += 1
-                            else: items_no_encontrados.append(cod_ingresado)
-                    
+                    carrito, items_no_encontrados, items_ambiguos, items_agregados = agregar_lote(
+                        st.session_state.carrito, edited_input, df_s, indice)
+                    avisos = []
+                    if items_no_encontrados: avisos.append(("error", f"No encontrado: {', '.join(items_no_encontrados)}"))
+                    if items_ambiguos: avisos.append(("warning", f"Código repetido en el catálogo (usá el Buscador): {', '.join(items_ambiguos)}"))
                     if items_agregados > 0:
-                        st.success(f"Agregados: {items_agregados}")
-                        st.session_state.input_key += 1 
+                        st.session_state.carrito = carrito
+                        # Los avisos sobreviven al rerun que limpia la grilla
+                        st.session_state.avisos_lote = [("success", f"Agregados: {items_agregados}")] + avisos
+                        st.session_state.input_key += 1
                         st.rerun()
-                    if items_no_encontrados: st.error(f"No encontrado: {', '.join(items_no_encontrados)}")
+                    for nivel, texto in avisos: getattr(st, nivel)(texto)
+                for nivel, texto in st.session_state.pop("avisos_lote", []): getattr(st, nivel)(texto)
 
             else:
-                opciones = df_s.apply(lambda x: f"[{x['Codigo']}] {x['Producto']} (Disp: {x['DISPONIBLE']:.0f})", axis=1)
-                sel_prod = st.selectbox("Buscar:", ["Seleccionar..."] + list(opciones))
+                busqueda = st.text_input("Buscar:", placeholder="Código o nombre (ej: porton 3)")
+                resultados = indice_busqueda(df_s, indice.version).buscar(busqueda, 20) if busqueda else []
+                if busqueda and not resultados: st.caption("Sin resultados.")
+                # La opción es la fila, no el texto: con códigos repetidos el texto no alcanza
+                sel_prod = st.selectbox(
+                    "Resultado:", [None] + resultados,
+                    format_func=lambda i: "Seleccionar..." if i is None else f"[{df_s.at[i, 'Codigo']}] {df_s.at[i, 'Producto']} (Disp: {df_s.at[i, 'DISPONIBLE']:.0f})",
+                )
                 c_cant, c_add = st.columns([1, 2])
                 cant = c_cant.number_input("Cantidad", min_value=1.0)
-                if c_add.button("➕ AGREGAR", use_container_width=True) and sel_prod != "Seleccionar...":
-                    cod = sel_prod.split("]")[0].replace("[", "")
-                    fila = df_s[df_s["Codigo"] == cod].iloc[0]
+                if c_add.button("➕ AGREGAR", use_container_width=True) and sel_prod is not None:
+                    fila = df_s.loc[sel_prod]
                     st.session_state.carrito.append({
                         "Codigo": fila["Codigo"], "Producto": fila["Producto"],
                         "Cantidad": cant, "Precio": fila["Precio Venta"],
@@ -341,6 +257,7 @@ with tab_cot:
 
         with col_der:
             st.subheader("2. Detalle del Pedido")
+            for nivel, texto in st.session_state.pop("avisos_venta", []): getattr(st, nivel)(texto)
             if st.session_state.carrito:
                 st.markdown("---")
                 k1, k2, k3, k4 = st.columns([4, 2, 2, 1])
@@ -369,65 +286,130 @@ with tab_cot:
                 tipo = st.radio("Destino:", ["Entrega Inmediata", "Dejar en Acopio"], horizontal=True, label_visibility="collapsed")
                 
                 c_pdf, c_ok = st.columns(2)
-                pdf_bytes = generar_pdf(cliente, st.session_state.carrito, total, tipo)
+                # El PDF se arma recién al hacer clic (y queda en caché por contenido)
+                pdf_bytes = partial(pdf_cacheado, cliente, [dict(item) for item in st.session_state.carrito], total, tipo)
                 c_pdf.download_button("📄 Descargar PDF (Para Imprimir)", pdf_bytes, f"P_{cliente}.pdf", "application/pdf", use_container_width=True)
                 
                 if c_ok.button("✅ CONFIRMAR VENTA", type="primary", use_container_width=True):
-                    for item in st.session_state.carrito:
-                        idx = df_s.index[df_s["Codigo"] == item["Codigo"]].tolist()
-                        if idx:
-                            i = idx[0]
-                            if "Acopio" in tipo: df_s.at[i, "Reservado"] += item["Cantidad"]
-                            else: df_s.at[i, "Cantidad"] -= item["Cantidad"]
-                    df_s.to_csv(STOCK_FILE, index=False)
-                    
-                    # GUARDADO LIMPIO (SIN NUMPY) PARA EVITAR ERROR EN HISTORIAL
-                    carrito_limpio = []
-                    for item in st.session_state.carrito:
-                        item_clean = item.copy()
-                        # Convierte a float nativo de Python (JSON compatible)
-                        item_clean['Cantidad'] = float(item['Cantidad'])
-                        item_clean['Precio'] = float(item['Precio'])
-                        item_clean['Subtotal'] = float(item['Subtotal'])
-                        carrito_limpio.append(item_clean)
-                        
-                    detalle_completo = str(carrito_limpio)
-                    
-                    nuevo = pd.DataFrame([{
+                    # El detalle va a la tabla de renglones (ventas_items), no como texto
+                    nuevo = {
+                        "ID": nuevo_id(),
                         "Fecha": ahora_arg().strftime("%d/%m/%Y %H:%M"), 
-                        "Cliente": cliente, "Total": total, "Tipo": tipo,
-                        "Detalle": detalle_completo
-                    }])
-                    hist = cargar_datos_general(VENTAS_FILE, ["Fecha","Cliente","Total","Tipo","Detalle"])
-                    pd.concat([hist, nuevo]).to_csv(VENTAS_FILE, index=False)
+                        "Cliente": cliente, "Total": float(total), "Tipo": tipo,
+                        "Detalle": ""
+                    }
+                    faltantes = confirmar_venta(nuevo, st.session_state.carrito)
                     st.session_state.carrito = []
-                    st.success("¡Venta Exitosa!")
+                    # Lo que ya no está en el stock queda en la venta pero no mueve (ni reserva) nada
+                    st.session_state.avisos_venta = [("success", "¡Venta Exitosa!")] + ([(
+                        "warning", "Sin movimiento de stock (ya no están en el catálogo): "
+                        + ", ".join(f"[{m['Codigo']}] {m['Producto']}" for m in faltantes))] if faltantes else [])
                     st.rerun()
             else: st.info("Carrito vacío.")
 
 # 2. STOCK
-with tab_stock:
-    df_s = cargar_datos_stock()
+with tab_stock, seccion("pestaña:Stock"):
+    df_s, indice = cargar_catalogo()
     if not df_s.empty:
         df_s["DISPONIBLE"] = df_s["Cantidad"] - df_s["Reservado"]
-        df_s["Ganancia Unitaria"] = df_s["Precio Venta"] - df_s["Precio Costo"]
+        # Precio Costo es el promedio ponderado de las compras; si nunca se cargó, el de compra del ledger
+        compra = costos_compra().por_fila(indice).reindex(df_s.index)
+        df_s["Costo Compras"] = compra["Promedio Compras"]
+        costo = df_s["Precio Costo"].where(df_s["Precio Costo"] > 0, df_s["Costo Compras"]).fillna(0.0)
+        df_s["Ganancia Unitaria"] = df_s["Precio Venta"] - costo
+        df_s["Margen %"] = (df_s["Ganancia Unitaria"] / df_s["Precio Venta"].where(df_s["Precio Venta"] > 0) * 100).round(1)
+        duplicados = indice.codigos_duplicados()
+        if duplicados:
+            detalle_dup = "; ".join(f"{cod}: {' / '.join(df_s.loc[filas, 'Producto'])}" for cod, filas in duplicados.items())
+            st.warning(f"⚠️ Códigos repetidos (la Carga Rápida no los acepta hasta corregirlos): {detalle_dup}")
 
     st.subheader("Tablero Financiero y Stock")
+    if not df_s.empty:
+        with st.expander(f"⚠️ Reposición ({len(alertas(df_s, indice.version))} bajo mínimo)", expanded=False):
+            velocidad = velocidad_de_venta(indice, ahora_arg().date())
+            st.caption("Stock Minimo en 0 = sin control. Venta diaria de los últimos 30 días; Reponer cubre el mínimo + 30 días de venta.")
+            st.dataframe(alertas(df_s, indice.version).tabla(df_s, velocidad).round(1), hide_index=True, use_container_width=True)
+            riesgo = en_riesgo(df_s, velocidad)
+            if not riesgo.empty:
+                st.caption(f"📉 Llegan al mínimo en los próximos {HORIZONTE} días:")
+                st.dataframe(riesgo.round(1), hide_index=True, use_container_width=True)
     with st.expander("🛒 Registrar COMPRA o INGRESO", expanded=False):
         c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
-        opc = df_s.apply(lambda x: f"[{x['Codigo']}] {x['Producto']}", axis=1)
-        sel = c1.selectbox("Producto:", opc)
+        opc = lambda i: f"[{df_s.at[i, 'Codigo']}] {df_s.at[i, 'Producto']}"  # etiqueta al mostrarla, no una por fila
+        sel = c1.selectbox("Producto:", list(df_s.index), format_func=opc)
         num = c2.number_input("Cant:", min_value=1.0)
-        nuevo_costo = c3.number_input("Nuevo Costo?", min_value=0.0)
+        costo_unit = c3.number_input("Costo unit. ($)", min_value=0.0, help="Vacío/0 = ingreso sin costo (no mueve el promedio).")
         if c4.button("📥 Ingresar"):
-            cod = sel.split("]")[0].replace("[", "")
-            idx = df_s.index[df_s["Codigo"] == cod].tolist()
-            if idx:
-                i = idx[0]
-                df_s.at[i, "Cantidad"] += num
-                if nuevo_costo > 0: df_s.at[i, "Precio Costo"] = nuevo_costo
-                df_s.to_csv(STOCK_FILE, index=False)
-                st.success("¡Actualizado!")
+            if sel is not None:
+                fila = df_s.loc[sel]
+                faltantes, nuevos = registrar_compras([{"Codigo": fila["Codigo"], "Producto": fila["Producto"],
+                                                        "Cantidad": num, "Monto": num * costo_unit}])
+                st.session_state.aviso_compra = (f"No se encontró {fila['Producto']} en el stock." if faltantes else
+                                                 f"¡Actualizado! Costo promedio: $ {nuevos[sel]:,.2f}" if sel in nuevos else "¡Actualizado!")
+                st.rerun()
+        if "aviso_compra" in st.session_state: st.info(st.session_state.pop("aviso_compra"))
+        st.caption("El costo del stock queda como promedio ponderado: lo que había a su costo más lo comprado a este precio.")
+
+    with st.expander("📒 Compras y Promedio de Compras"):
+        st.caption("Promedio Compras = total pagado / unidades compradas. No es el Costo del stock, que promedia "
+                   "cada compra con lo que había en existencia a su costo.")
+        st.dataframe(costos_compra().tabla().sort_values("Ultima Compra", ascending=False), hide_index=True, use_container_width=True,
+                     column_config={c: st.column_config.NumberColumn(format="$ %.2f") for c in ["Monto", "Promedio Compras", "Ultimo Costo"]})
+        movil = promedio_de_compras(cargar_gastos())
+        if not movil.empty:
+            st.caption("Últimas compras (Promedio Compras = todo lo comprado de ese producto hasta esa compra):")
+            st.dataframe(movil.iloc[::-1].head(50), hide_index=True, use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="$ %.2f") for c in ["Monto", "Costo Unitario", "Promedio Compras"]})
+
+    with st.expander("🏗️ Acopios por Cliente"):
+        ac = acopios()
+        c_cli, c_venta, c_prod = st.columns(3)
+        cli_acopio = c_cli.selectbox("Cliente:", ["Todos"] + ac.clientes(), key="acopio_cliente")
+        prod_acopio = c_prod.selectbox("Producto:", [None] + list(df_s.index), format_func=lambda i: "Todos" if i is None else opc(i), key="acopio_producto")
+        filtros = {"cliente": None if cli_acopio == "Todos" else cli_acopio,
+                   "producto": None if prod_acopio is None else (df_s.at[prod_acopio, "Codigo"], df_s.at[prod_acopio, "Producto"])}
+        pend = ac.pendientes(**filtros)
+        venta_acopio = c_venta.selectbox("Venta:", ["Todas"] + list(dict.fromkeys(pend["ID_Venta"])), key="acopio_venta")
+        if venta_acopio != "Todas":
+            filtros["id_venta"] = venta_acopio
+            pend = pend[pend["ID_Venta"] == venta_acopio].reset_index(drop=True)
+        if pend.empty: st.info("Nada en acopio.")
+        else:
+            if "acopio_key" not in st.session_state: st.session_state.acopio_key = 0
+            retiro = st.data_editor(
+                pend.assign(Entregar=0.0), key=f"acopio_editor_{st.session_state.acopio_key}", hide_index=True, use_container_width=True,
+                disabled=list(pend.columns), column_config={"Entregar": st.column_config.NumberColumn("Entregar", min_value=0.0, format="%.0f")},
+            )
+            c_ent, c_todo = st.columns(2)
+            resultado = None
+            if c_ent.button("🚚 Registrar Retiro", disabled=not (retiro["Entregar"] > 0).any()):
+                elegidos = retiro[retiro["Entregar"] > 0].drop(columns=["Pendiente"]).rename(columns={"Entregar": "Cantidad"})
+                rechazados, faltantes = entregar(elegidos.to_dict("records"))
+                resultado = (len(elegidos) - len(rechazados), rechazados, faltantes)
+            if c_todo.button(f"📦 Entregar todo lo listado ({len(pend)})"):
+                entregados, faltantes = entregar_todo(**filtros)
+                resultado = (len(entregados), [], faltantes)
+            if resultado is not None:
+                hechos, rechazados, faltantes = resultado
+                avisos = [f"Retiro registrado: {hechos} renglón(es)."]
+                if rechazados: avisos.append(f"{len(rechazados)} sin nada pendiente (otra sesión ya los entregó).")
+                if faltantes: avisos.append("Ya no están en el stock: " + ", ".join(f"[{m['Codigo']}] {m['Producto']}" for m in faltantes))
+                st.session_state.aviso_acopio = " ".join(avisos)
+                st.session_state.acopio_key += 1
+                st.rerun()
+        if "aviso_acopio" in st.session_state: st.info(st.session_state.pop("aviso_acopio"))
+
+        dif = diferencias_reservado(df_s, indice)
+        if not dif.empty:
+            st.warning(f"⚠️ {len(dif)} producto(s) con Reservado distinto de lo pendiente en acopios "
+                       "(reservas de antes de este registro, ediciones a mano o stock reiniciado).")
+            st.dataframe(dif.round(2), hide_index=True, use_container_width=True)
+            c_mig, c_conc = st.columns(2)
+            if c_mig.button("📜 Cargar acopios del historial", help="Registra las ventas en acopio que todavía no están; no mueve el stock."):
+                st.session_state.aviso_acopio = f"{migrar_acopios()} venta(s) en acopio cargadas del historial."
+                st.rerun()
+            if c_conc.button("⚖️ Igualar Reservado a los acopios", help="El Reservado de cada producto pasa a ser lo pendiente en acopios."):
+                st.session_state.aviso_acopio = f"Reservado corregido en {conciliar_reservado()} producto(s)."
                 st.rerun()
     
     with st.expander("✨ Crear Nuevo Producto"):
@@ -440,43 +422,116 @@ with tab_stock:
         n_venta = c_price.number_input("Venta", min_value=0.0)
         if st.button("Crear"):
             if n_cod and n_nom:
-                nuevo = pd.DataFrame([{
+                backend().agregar_productos([{
                     "Codigo": n_cod, "Producto": n_nom, "Unidad": n_uni,
                     "Cantidad": 0.0, "Reservado": 0.0, 
                     "Precio Costo": n_costo, "Precio Venta": n_venta, "Stock Minimo": 0.0
                 }])
-                df_s = pd.concat([df_s, nuevo], ignore_index=True)
-                df_s.to_csv(STOCK_FILE, index=False)
                 st.rerun()
 
+    with st.expander("💲 Actualizar Precios"):
+        # Las mismas funciones que `python precios.py`: se ve la diferencia y recién después se graba
+        modo = st.radio("Origen", ["Aumento %", "Lista de proveedor"], horizontal=True)
+        plan, origen = None, ""
+        if modo == "Aumento %":
+            c1, c2, c3 = st.columns(3)
+            col_precio = c1.selectbox("Columna", COLUMNAS_PRECIO, index=1)
+            pct = c2.number_input("Aumento general (%)", value=0.0, step=1.0)
+            redondeo = c3.number_input("Redondear a", min_value=0, value=0, step=10, key="redondeo_aumento")
+            cats = categorias(df_s)
+            por_cat = st.data_editor(
+                pd.DataFrame({"Categoria": sorted(set(cats) - {""}), "%": None}).astype({"%": float}),
+                key=f"aumento_cat_{st.session_state.editor_key}", hide_index=True, use_container_width=True,
+                column_config={"Categoria": st.column_config.TextColumn(disabled=True),
+                               "%": st.column_config.NumberColumn("% (vacío = general)")},
+            ).dropna(subset=["%"])
+            plan = plan_aumento(df_s, pct, dict(zip(por_cat["Categoria"], por_cat["%"])), columna=col_precio, redondeo=redondeo)
+            origen = "aumento"
+        else:
+            c1, c2, c3 = st.columns(3)
+            subido = c1.file_uploader("Lista (CSV o XLSX)", type=["csv", "xlsx"], key=f"lista_{st.session_state.editor_key}")
+            col_precio = c2.selectbox("Columna \"Precio\" va a", COLUMNAS_PRECIO)
+            redondeo = c3.number_input("Redondear a", min_value=0, value=0, step=10, key="redondeo_lista")
+            if subido is not None:
+                try:
+                    plan, no_enc, repetidos, sin_precio = plan_lista(df_s, indice, leer_lista(subido), col_precio, redondeo)
+                    origen = f"lista:{subido.name}"
+                    if no_enc: st.warning(f"No están en el stock: {', '.join(no_enc)}")
+                    if repetidos: st.warning(f"Código repetido en el stock (no se tocan): {', '.join(repetidos)}")
+                    if sin_precio: st.warning(f"Sin precio válido: {', '.join(sin_precio)}")
+                except (ValueError, ImportError) as e: st.error(f"No se pudo leer la lista: {e}")
+        if plan is not None:
+            if plan.empty: st.info("Sin cambios.")
+            else:
+                st.dataframe(plan.drop(columns=["fila"]), hide_index=True, use_container_width=True,
+                             column_config={"Antes": st.column_config.NumberColumn(format="$ %.2f"),
+                                            "Despues": st.column_config.NumberColumn(format="$ %.2f"),
+                                            "Var %": st.column_config.NumberColumn(format="%.1f %%")})
+                if st.button(f"✅ Aplicar {len(plan)} cambio(s)", type="primary"):
+                    st.session_state.conflictos_stock = aplicar(plan, origen, fecha=ahora_arg().strftime("%d/%m/%Y %H:%M"))
+                    st.session_state.editor_key += 1
+                    st.session_state.pop("stock_base", None)
+                    st.rerun()
+
+    with st.expander("🕒 Historial de Precios"):
+        h1, h2 = st.columns([3, 1])
+        h_sel = h1.selectbox("Producto:", list(df_s.index), format_func=opc, key="hist_precio_sel")
+        h_fecha = h2.date_input("Al día:", value=ahora_arg().date(), key="hist_precio_fecha")
+        if h_sel is not None:
+            hist = historial_precios()
+            codigo, producto = df_s.at[h_sel, "Codigo"], df_s.at[h_sel, "Producto"]
+            precio = hist.precio(codigo, producto, pd.Timestamp(h_fecha) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1))
+            if precio is None: st.info("Sin precios registrados hasta esa fecha.")
+            else: st.caption(f"Al {h_fecha:%d/%m/%Y}: costo $ {precio[0]:,.0f} · venta $ {precio[1]:,.0f}")
+            st.dataframe(hist.serie(codigo, producto), hide_index=True, use_container_width=True)
+
     st.write("---")
     c_dl, c_save = st.columns([1, 4])
-    c_dl.download_button("📥 Excel", generar_excel(df_s), f"Stock_{date.today()}.xlsx")
+    # El libro se arma recién al hacer clic (data como función) y queda en caché por versión
+    c_dl.download_button("📥 Excel", excel_stock, f"Stock_{date.today()}.xlsx")
     
+    # La grilla trabaja sobre una copia fija del stock; se refresca solo si no hay ediciones pendientes
+    pendiente = st.session_state.get(f"editor_stock_{st.session_state.editor_key}", {})
+    hay_pendientes = any(pendiente.get(k) for k in ["edited_rows", "added_rows", "deleted_rows"])
+    if "stock_base" not in st.session_state or not hay_pendientes:
+        st.session_state.stock_base = (indice.version, df_s)
+    version_base, df_base = st.session_state.stock_base
+    if hay_pendientes and version_base != indice.version:
+        st.caption("⚠️ El stock cambió desde que empezaste a editar; al guardar se avisa si algo choca.")
+
     df_edit = st.data_editor(
-        df_s, key="editor_stock", num_rows="dynamic", use_container_width=True, hide_index=True,
-        column_order=["Codigo", "Producto", "DISPONIBLE", "Cantidad", "Reservado", "Precio Costo", "Precio Venta", "Ganancia Unitaria"],
+        df_base, key=f"editor_stock_{st.session_state.editor_key}", num_rows="dynamic", use_container_width=True, hide_index=True,
+        column_order=["Codigo", "Producto", "DISPONIBLE", "Cantidad", "Reservado", "Stock Minimo", "Precio Costo", "Costo Compras", "Precio Venta", "Ganancia Unitaria", "Margen %"],
         column_config={
             "Codigo": st.column_config.TextColumn("Cód"),
             "DISPONIBLE": st.column_config.NumberColumn("✅ Disp.", disabled=True, format="%.0f"),
             "Cantidad": st.column_config.NumberColumn("Físico", format="%.0f"),
-            "Reservado": st.column_config.NumberColumn("Reservado", format="%.0f"),
+            "Reservado": st.column_config.NumberColumn("Reservado", disabled=True, format="%.0f",
+                                                       help="Lo pendiente en acopios: se mueve con las ventas y los retiros."),
+            "Stock Minimo": st.column_config.NumberColumn("Mínimo", format="%.0f", min_value=0),
             "Precio Costo": st.column_config.NumberColumn("Costo ($)", format="$ %d"),
             "Precio Venta": st.column_config.NumberColumn("Venta ($)", format="$ %d"),
+            "Costo Compras": st.column_config.NumberColumn("Prom. Compras ($)", disabled=True, format="$ %d"),
             "Ganancia Unitaria": st.column_config.NumberColumn("Ganancia ($)", disabled=True, format="$ %d"),
+            "Margen %": st.column_config.NumberColumn("Margen", disabled=True, format="%.1f %%"),
         }
     )
     if c_save.button("💾 GUARDAR CAMBIOS MASIVOS", type="primary"):
-        cols_to_save = ["Codigo", "Producto", "Cantidad", "Reservado", "Unidad", "Precio Costo", "Precio Venta", "Stock Minimo"]
-        for col in cols_to_save:
-            if col not in df_edit.columns: df_edit[col] = 0
-        df_final = df_edit[cols_to_save] 
-        df_final.to_csv(STOCK_FILE, index=False)
-        st.success("Guardado.")
+        ediciones, altas, bajas = diferencias_stock(df_base, df_edit)
+        conflictos = backend().editar_stock(ediciones, altas, bajas, origen="grilla", fecha=ahora_arg().strftime("%d/%m/%Y %H:%M"))
+        st.session_state.conflictos_stock = conflictos
+        st.session_state.editor_key += 1
+        del st.session_state.stock_base
         st.rerun()
+    if "conflictos_stock" in st.session_state:
+        conflictos = st.session_state.pop("conflictos_stock")
+        if conflictos:
+            st.warning(f"Guardado, salvo {len(conflictos)} cambio(s) que otra sesión modificó mientras editabas (quedó el valor actual):")
+            st.dataframe(pd.DataFrame(conflictos).astype(str), hide_index=True, use_container_width=True)
+        else: st.success("Guardado.")
 
 # 3. PRODUCCION
-with tab_prod:
+with tab_prod, seccion("pestaña:Producción"):
     st.subheader("🏭 Producción")
     
     with st.expander("✨ Crear Nuevo Producto (Si no existe)", expanded=False):
@@ -487,24 +542,22 @@ with tab_prod:
         
         if st.button("Crear y Usar", key="btn_crear_prod"):
             if np_cod and np_nom:
-                df_current = cargar_datos_stock()
-                nuevo_p = pd.DataFrame([{
+                backend().agregar_productos([{
                     "Codigo": np_cod, "Producto": np_nom, "Unidad": np_uni,
                     "Cantidad": 0.0, "Reservado": 0.0, 
                     "Precio Costo": 0.0, "Precio Venta": 0.0, "Stock Minimo": 0.0
                 }])
-                df_current = pd.concat([df_current, nuevo_p], ignore_index=True)
-                df_current.to_csv(STOCK_FILE, index=False)
                 st.success(f"Creado: {np_nom}")
                 st.rerun()
 
-    df_prod = cargar_datos_general(PRODUCCION_FILE, ["Fecha_Inicio","Producto","Cantidad","Fecha_Lista","Estado"])
+    df_prod = cargar_datos_general("produccion")
     df_stk = cargar_datos_stock()
     
     st.write("---")
     with st.form("new_prod"):
         c1, c2 = st.columns(2)
-        prod = c1.selectbox("Producto:", df_stk["Producto"].unique() if not df_stk.empty else [])
+        # Se elige la fila: el lote guarda el código, no solo el nombre
+        fila_prod = c1.selectbox("Producto:", list(df_stk.index), format_func=lambda i: f"[{df_stk.at[i, 'Codigo']}] {df_stk.at[i, 'Producto']}")
         cant = c2.number_input("Cant:", 1)
         c3, c4 = st.columns(2)
         fecha = c3.date_input("Fecha:", value=ahora_arg().date())
@@ -512,67 +565,153 @@ with tab_prod:
         if st.form_submit_button("Registrar"):
             fin = fecha + timedelta(days=dias)
             estado = "En Proceso" if dias > 0 and (fin - ahora_arg().date()).days > 0 else "Listo"
-            nuevo = pd.DataFrame([{"Fecha_Inicio": fecha, "Producto": prod, "Cantidad": cant, "Fecha_Lista": fin, "Estado": estado}])
-            pd.concat([df_prod, nuevo]).to_csv(PRODUCCION_FILE, index=False)
+            prod = df_stk.at[fila_prod, "Producto"]
+            nuevo = {"ID": nuevo_id(), "Fecha_Inicio": fecha, "Producto": prod, "Cantidad": cant, "Fecha_Lista": fin, "Estado": estado, "Codigo": df_stk.at[fila_prod, "Codigo"]}
+            df_s, indice = cargar_catalogo()
+            consumo, sin_insumo = consumo_de_lote(prod, cant, df_s, indice)
+            # El lote y el descuento de sus insumos van juntos
+            with backend().transaccion():
+                backend().mover_stock(consumo)
+                backend().anexar("produccion", [nuevo])
+            if sin_insumo: st.session_state.avisos_prod = [f"Insumos que no están en el stock (no se descontaron): {', '.join(sin_insumo)}"]
             st.rerun()
+    for texto in st.session_state.pop("avisos_prod", []): st.warning(texto)
+
+    rec = recetas()
+    if not rec.invalidas.empty:
+        st.caption("⚠️ Filas de recetas ignoradas: " + ", ".join(f"línea {l} ({m})" for l, m in rec.invalidas.itertuples(index=False)))
+    with st.expander("🧮 Insumos Necesarios", expanded=False):
+        df_s, indice = cargar_catalogo()
+        c_r1, c_r2 = st.columns(2)
+        prod_calc = c_r1.selectbox("Producto:", sorted(rec.tabla["Producto"].unique()), key="bom_prod")
+        cant_calc = c_r2.number_input("Cantidad:", min_value=1, value=1, key="bom_cant")
+        if prod_calc: st.dataframe(requerimientos({prod_calc: cant_calc}, df_s, indice, rec), hide_index=True, use_container_width=True)
+        st.caption("Pedidos abiertos (acopios reservados + presupuesto en curso):")
+        st.dataframe(requerimientos(pedido_abierto(df_s, st.session_state.carrito), df_s, indice, rec), hide_index=True, use_container_width=True)
             
-    if not df_prod.empty:
-        df_prod["Fecha_Lista"] = pd.to_datetime(df_prod["Fecha_Lista"]).dt.date
-        activos = df_prod[df_prod["Estado"] != "Finalizado"]
-        for index, row in activos.iterrows():
-            hoy = ahora_arg().date()
-            falta = (row["Fecha_Lista"] - hoy).days
-            with st.container(border=True):
-                c_txt, c_btn = st.columns([4, 1])
-                if falta <= 0:
-                    c_txt.success(f"✅ **LISTO:** {row['Cantidad']}x {row['Producto']}")
-                    if c_btn.button("📥 A STOCK", key=f"p_{index}"):
-                        df_s = cargar_datos_stock()
-                        idx = df_s.index[df_s["Producto"] == row['Producto']].tolist()
-                        if idx:
-                            df_s.at[idx[0], "Cantidad"] += row['Cantidad']
-                            df_s.to_csv(STOCK_FILE, index=False)
-                            df_prod.at[index, "Estado"] = "Finalizado"
-                            df_prod.to_csv(PRODUCCION_FILE, index=False)
-                            st.rerun()
-                else: c_txt.info(f"⏳ Faltan {falta} días para {row['Producto']}")
+    cal = calendario(df_prod, ahora_arg().date())
+    listos, pendientes = cal[cal["Listo"]], cal[~cal["Listo"]]
+    if not listos.empty:
+        st.success(f"✅ **{len(listos)} lote(s) listo(s)** para pasar a stock")
+        elegidos = st.multiselect(
+            "Lotes a liberar:", list(listos.index), default=list(listos.index),
+            format_func=lambda i: f"{listos.at[i, 'Cantidad']}x {listos.at[i, 'Producto']} ({listos.at[i, 'Fecha_Lista']})",
+        )
+        if st.button("📥 PASAR A STOCK", type="primary", disabled=not elegidos):
+            df_s, indice = cargar_catalogo()
+            movs, finalizados, sin_producto = liberar_lotes(listos.loc[elegidos], df_s, indice)
+            # Todo el ingreso y todos los "Finalizado" en una sola escritura
+            with backend().transaccion():
+                backend().mover_stock(movs)
+                backend().anexar("produccion", finalizados)
+            if not sin_producto.empty:
+                st.session_state.avisos_prod = [f"Sin producto en el stock (no se liberaron): {', '.join(sin_producto['Producto'].astype(str))}"]
+            st.rerun()
+    if not pendientes.empty:
+        st.info(f"⏳ {len(pendientes)} lote(s) curándose")
+        st.dataframe(
+            pendientes[["Producto", "Cantidad", "Fecha_Inicio", "Fecha_Lista", "Faltan"]].rename(columns={"Faltan": "Faltan (días)"}),
+            hide_index=True, use_container_width=True,
+        )
 
 # 4. HISTORIAL
-with tab_hist:
+with tab_hist, seccion("pestaña:Historial"):
     st.subheader("Registro de Ventas y Reimpresión")
-    df_v = cargar_datos_general(VENTAS_FILE, ["Fecha","Cliente","Total","Tipo","Detalle"])
+    migrar_detalles()
+    iv = indice_ventas()
     
-    if not df_v.empty:
-        df_v = df_v.sort_index(ascending=False)
+    if iv.total:
+        f1, f2, f3, f4 = st.columns(4)
+        h_desde = f1.date_input("Desde:", value=None, key="h_desde")
+        h_hasta = f2.date_input("Hasta:", value=None, key="h_hasta")
+        h_cliente = f3.selectbox("Cliente:", ["Todos"] + iv.clientes, key="h_cliente")
+        h_tipo = f4.selectbox("Tipo:", ["Todos", "Entrega Inmediata", "Dejar en Acopio"], key="h_tipo")
+        pos = iv.filtrar(h_desde, h_hasta, None if h_cliente == "Todos" else h_cliente, None if h_tipo == "Todos" else h_tipo)
+
+        p1, p2, p3 = st.columns([1, 1, 2])
+        tam_pagina = p1.selectbox("Por página:", [25, 50, 100], key="h_tam")
+        paginas = max(1, -(-len(pos) // tam_pagina))
+        pagina = p2.number_input("Página:", min_value=1, max_value=paginas, value=1, key="h_pagina")
+        p3.caption(f"{len(pos)} ventas · página {pagina} de {paginas}")
+        df_v = iv.pagina(pos, pagina - 1, tam_pagina)
+
         st.write("🖨️ **Reimprimir Comprobante (Copia)**")
-        opciones_venta = df_v.apply(lambda x: f"{x['Fecha']} | {x['Cliente']} | ${x['Total']:,.0f}", axis=1)
-        venta_seleccionada = st.selectbox("Seleccionar Venta:", opciones_venta)
-        
-        if venta_seleccionada:
-            idx_sel = opciones_venta[opciones_venta == venta_seleccionada].index[0]
-            fila_venta = df_v.loc[idx_sel]
+        if df_v.empty: st.info("No hay ventas con esos filtros.")
+        else:
+            venta_seleccionada = st.selectbox(
+                "Seleccionar Venta:", list(df_v.index),
+                format_func=lambda i: f"{df_v.at[i, 'Fecha']} | {df_v.at[i, 'Cliente']} | ${df_v.at[i, 'Total']:,.0f}",
+            )
+            fila_venta = df_v.loc[venta_seleccionada]
             try:
-                raw_detalle = fila_venta["Detalle"]
-                # 🛠️ LIMPIEZA DE DATOS SUCIOS (Numpy Fix)
-                # Borra "np.float64(" y ")" para que ast.literal_eval no falle
-                raw_detalle = re.sub(r"np\.float64\((.*?)\)", r"\1", raw_detalle)
-                
-                try: parsed_data = ast.literal_eval(raw_detalle)
-                except: parsed_data = [raw_detalle]
-
-                items_normalizados = []
-                if isinstance(parsed_data, list):
-                    for item in parsed_data:
-                        if isinstance(item, dict): items_normalizados.append(item)
-                        else: items_normalizados.append({'Producto': str(item), 'Codigo': '-', 'Cantidad': 0, 'Precio': 0, 'Subtotal': 0})
-                
-                pdf_reimpresion = generar_pdf(fila_venta["Cliente"], items_normalizados, fila_venta["Total"])
+                items_venta = items_de_venta(fila_venta["ID"])
+                pdf_reimpresion = partial(pdf_cacheado, fila_venta["Cliente"], items_venta, fila_venta["Total"])
                 st.download_button(label="📄 Descargar PDF (Para Imprimir)", data=pdf_reimpresion, file_name=f"Copia_{fila_venta['Cliente']}.pdf", mime="application/pdf")
             except Exception as e: st.error(f"Error recuperando venta: {e}")
 
+        with st.expander("📦 Exportación Masiva (Cierre de Mes / Contador)"):
+            st.caption(f"Exporta las {len(pos)} ventas que cumplen los filtros de arriba.")
+            exp_formato = st.radio("Formato:", ["ZIP (un PDF por venta)", "PDF único"], horizontal=True, key="exp_formato")
+            if st.button("⚙️ Generar Exportación", disabled=not len(pos)):
+                barra = st.progress(0.0, text="Generando comprobantes...")
+                formato = "pdf" if exp_formato == "PDF único" else "zip"
+                archivo = exportar_comprobantes(
+                    comprobantes_de_ventas(iv.filas(pos[::-1])), formato=formato,
+                    progreso=lambda hechos, total: barra.progress(hechos / total, text=f"{hechos}/{total} comprobantes"),
+                )
+                st.session_state.exportacion = (archivo, f"Ventas_{ahora_arg().date()}.{formato}", formato)
+            if "exportacion" in st.session_state:
+                archivo, nombre, formato = st.session_state.exportacion
+                archivo.seek(0)
+                st.download_button("⬇️ Descargar Exportación", archivo, nombre,
+                                   "application/pdf" if formato == "pdf" else "application/zip")
+
         st.divider()
-        st.write("📊 **Historial Completo**")
-        st.dataframe(df_v, use_container_width=True)
+        st.write("📊 **Historial**")
+        st.dataframe(df_v, use_container_width=True, hide_index=True)
+        with st.expander("💹 Margen por Venta (esta página)"):
+            st.caption("Costo congelado al vender; las ventas viejas sin costo usan el historial de precios a su fecha.")
+            st.dataframe(margen_por_venta(df_v, renglones_de_ventas(df_v["ID"])), use_container_width=True, hide_index=True)
+        with st.expander("📦 Ventas por Producto"):
+            st.dataframe(resumenes().por_producto(), use_container_width=True, hide_index=True)
     else:
         st.info("No hay ventas registradas aún.")
 
+# 5. TABLERO
+# Lee solo los resúmenes (resumenes.py), nunca los ledgers completos
+with tab_tablero, seccion("pestaña:Tablero"):
+    st.subheader("📈 Tablero de Ventas")
+    migrar_detalles()
+    res = resumenes()
+    t1, t2 = st.columns(2)
+    t_desde = t1.date_input("Desde:", value=ahora_arg().date() - timedelta(days=30), key="t_desde")
+    t_hasta = t2.date_input("Hasta:", value=ahora_arg().date(), key="t_hasta")
+    por_producto = res.tabla("producto", t_desde, t_hasta)
+    por_tipo = res.tabla("tipo", t_desde, t_hasta)
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Facturación", f"${por_tipo['Facturacion'].sum():,.0f}")
+    m2.metric("Ventas", f"{por_tipo['Ventas'].sum():,.0f}")
+    m3.metric("Unidades", f"{por_producto['Unidades'].sum():,.0f}")
+    m4.metric("Margen", f"${por_producto['Margen'].sum():,.0f}", help="Solo renglones con costo registrado al vender.")
+
+    if por_tipo.empty: st.info("No hay ventas en ese período.")
+    else:
+        st.write("**Facturación por día**")
+        st.bar_chart(por_tipo.pivot_table(index="Dia", columns="Tipo", values="Facturacion", aggfunc="sum").fillna(0))
+        c_prod, c_tipo = st.columns([2, 1])
+        c_prod.write("**Productos**")
+        c_prod.dataframe(res.por_producto(t_desde, t_hasta), hide_index=True, use_container_width=True)
+        c_tipo.write("**Acopio vs. Entrega Inmediata**")
+        c_tipo.dataframe(por_tipo.groupby("Tipo", as_index=False)[["Ventas", "Facturacion"]].sum(), hide_index=True, use_container_width=True)
+
+    st.write("**Clientes por mes**")
+    por_cliente = res.tabla("cliente", t_desde, t_hasta)
+    if not por_cliente.empty:
+        st.dataframe(
+            por_cliente.pivot_table(index="Cliente", columns="Mes", values="Facturacion", aggfunc="sum", fill_value=0)
+            .assign(Total=lambda d: d.sum(axis=1)).sort_values("Total", ascending=False),
+            use_container_width=True,
+        )
+
+cerrar_corrida()
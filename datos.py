@@ -0,0 +1,377 @@
+import os
+import io
+import csv
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import pytz
+import pandas as pd
+
+from metricas import seccion, registrar_io
+
+try: import fcntl
+except ImportError: fcntl = None  # Windows: sin lock entre procesos
+
+# RUTAS Y ARCHIVOS
+STOCK_FILE = "stock_del_carmen.csv"
+GASTOS_FILE = "gastos_del_carmen.csv"
+VENTAS_FILE = "ventas_del_carmen.csv"
+VENTAS_ITEMS_FILE = "ventas_items_del_carmen.csv"
+PRODUCCION_FILE = "produccion_del_carmen.csv"
+RECETAS_FILE = "recetas_del_carmen.csv"
+AUDITORIA_FILE = "auditoria_del_carmen.csv"
+PRECIOS_FILE = "precios_del_carmen.csv"
+OPERACIONES_FILE = "operaciones_del_carmen.csv"
+ACOPIOS_FILE = "acopios_del_carmen.csv"
+SINCRO_FILE = "sincro_del_carmen.json"  # id de esta instancia y lo que ya tiene cada par
+LOGO_FILE = "alambrados.jpeg"
+
+COLS_STOCK = ["Codigo", "Producto", "Cantidad", "Reservado", "Unidad", "Precio Costo", "Precio Venta", "Stock Minimo"]
+COLS_VENTAS = ["ID", "Fecha", "Cliente", "Total", "Tipo", "Detalle"]
+COLS_ITEMS = ["ID_Venta", "Codigo", "Producto", "Cantidad", "Precio", "Subtotal", "Costo"]  # Costo: unitario al vender
+COLS_PRODUCCION = ["ID", "Fecha_Inicio", "Producto", "Cantidad", "Fecha_Lista", "Estado", "Codigo"]
+COLS_RECETAS = ["Producto Final", "Insumo", "Cantidad"]
+COLS_GASTOS = ["Fecha", "Insumo", "Cantidad", "Monto", "Codigo"]  # Monto: total de la compra
+COLS_AUDITORIA = ["ID", "Fecha", "Origen", "Codigo", "Producto", "Columna", "Antes", "Despues"]
+COLS_PRECIOS = ["Fecha", "Codigo", "Producto", "Precio Costo", "Precio Venta"]
+FORMATO_FECHA_PRECIOS = "%Y-%m-%d %H:%M:%S"  # ordenable como texto y con segundos
+COLS_OPERACIONES = ["Origen", "Seq", "Fecha", "Tipo", "Datos"]  # Fecha: UTC ISO; Datos: JSON
+COLS_ACOPIOS = ["Fecha", "ID_Venta", "Cliente", "Codigo", "Producto", "Cantidad"]  # Cantidad: + reserva, - entrega
+
+# LISTA COMPLETA
+PRODUCTOS_INICIALES = [
+    {'Codigo': '97', 'Producto': 'ADICIONAL PINCHES 20.000', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '6', 'Producto': 'BOYERITO IMPORTADO X 1000', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '3', 'Producto': 'CONCERTINA DOBLE CRUZADA X 45', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '2', 'Producto': 'CONCERTINA SIMPLE', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '11', 'Producto': 'DECO 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '0', 'Producto': 'DECO 1.80', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '33', 'Producto': 'ESPARRAGOS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '25', 'Producto': 'ESQUINERO OLIMPICO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 18000, 'Precio Venta': 39000, 'Stock Minimo': 0},
+    {'Codigo': '2', 'Producto': 'ESQUINERO RECTO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 32000, 'Stock Minimo': 0},
+    {'Codigo': '15', 'Producto': 'GALVA 14 X KILO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'kg', 'Precio Costo': 0, 'Precio Venta': 6800, 'Stock Minimo': 0},
+    {'Codigo': '5', 'Producto': 'GALVA 18', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'kg', 'Precio Costo': 0, 'Precio Venta': 11900, 'Stock Minimo': 0},
+    {'Codigo': '31', 'Producto': 'GANCHOS ESTIRATEJIDOS 5/16', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 2100, 'Stock Minimo': 0},
+    {'Codigo': '15', 'Producto': 'OVALADO X MAYOR X 1000', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 290000, 'Stock Minimo': 0},
+    {'Codigo': '32', 'Producto': 'PALOMITAS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 2100, 'Stock Minimo': 0},
+    {'Codigo': '24', 'Producto': 'PINCHES X METRO PINCHOSOS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '41', 'Producto': 'PLANCHUELA 1.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 4800, 'Stock Minimo': 0},
+    {'Codigo': '40', 'Producto': 'PLANCHUELA 1.20', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 5100, 'Stock Minimo': 0},
+    {'Codigo': '35', 'Producto': 'PLANCHUELA 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 5800, 'Stock Minimo': 0},
+    {'Codigo': '34', 'Producto': 'PLANCHUELA 2.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 7999, 'Stock Minimo': 0},
+    {'Codigo': '47', 'Producto': 'PORTON 3.00 X 1.80 BLACK', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 360000, 'Stock Minimo': 0},
+    {'Codigo': '9', 'Producto': 'PORTON DE CANO X 4.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 3600000, 'Stock Minimo': 0},
+    {'Codigo': '10', 'Producto': 'PORTON INDUSTRIAL X 4.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 499999, 'Stock Minimo': 0},
+    {'Codigo': '51', 'Producto': 'PORTON LIVIANO 1.80 X 3.00 CANO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 260000, 'Stock Minimo': 0},
+    {'Codigo': '53', 'Producto': 'PORTON LIVIANO 1.80X 3.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '11', 'Producto': 'PORTON SIMPLE X 3.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '54', 'Producto': 'POSTE DE MADERA', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 15000, 'Stock Minimo': 0},
+    {'Codigo': '27', 'Producto': 'POSTE OLIMPICO', 'Cantidad': 10, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 17999, 'Stock Minimo': 0},
+    {'Codigo': '28', 'Producto': 'POSTE RECTO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 16999, 'Stock Minimo': 0},
+    {'Codigo': '57', 'Producto': 'POSTE REDONDE ECO OBRA', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 15000, 'Stock Minimo': 0},
+    {'Codigo': '14', 'Producto': 'PUA X MAYOR X500', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '43', 'Producto': 'PUA X METRO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 550, 'Stock Minimo': 0},
+    {'Codigo': '16', 'Producto': 'PUERTITA CLASICA 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 1589000, 'Stock Minimo': 0},
+    {'Codigo': '12', 'Producto': 'PUERTITA CORAZON 1.5 X 1.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 162800, 'Stock Minimo': 0},
+    {'Codigo': '13', 'Producto': 'PUERTITA CRUZ REFORZADA 2.00 X 1.00', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 199800, 'Stock Minimo': 0},
+    {'Codigo': '7', 'Producto': 'PUERTITA LIVINA 1.00 X 1.80', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 125300, 'Stock Minimo': 0},
+    {'Codigo': '26', 'Producto': 'PUNTAL', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 13900, 'Stock Minimo': 0},
+    {'Codigo': 'R16', 'Producto': 'RECOCIDO 16', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'kg', 'Precio Costo': 0, 'Precio Venta': 4900, 'Stock Minimo': 0},
+    {'Codigo': 'REF', 'Producto': 'REFUERZO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 39000, 'Stock Minimo': 0},
+    {'Codigo': '55', 'Producto': 'TEJIDO 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 59000, 'Stock Minimo': 0},
+    {'Codigo': '19', 'Producto': 'TEJIDO 2.00 X METRO', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 74999, 'Stock Minimo': 0},
+    {'Codigo': '59', 'Producto': 'TEJIDO DE OBRA 1.50', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '63', 'Producto': 'TEJIDO DE OBRA 1.80', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '50', 'Producto': 'TEJIDO DEL 12 - 2 PULGADAS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '18', 'Producto': 'TEJIDO RECU 1.8', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 0, 'Stock Minimo': 0},
+    {'Codigo': '39', 'Producto': 'TEJIDO ROMBITO 2 PULGADAS', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'm', 'Precio Costo': 0, 'Precio Venta': 69999, 'Stock Minimo': 0},
+    {'Codigo': '29', 'Producto': 'Torniquete', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 1999, 'Precio Venta': 3500, 'Stock Minimo': 0},
+    {'Codigo': '1', 'Producto': 'liso', 'Cantidad': 0, 'Reservado': 0, 'Unidad': 'un.', 'Precio Costo': 0, 'Precio Venta': 360, 'Stock Minimo': 0}
+]
+
+# HORA LOCAL
+# Las fechas que se guardan (ventas, auditoría, historial de precios) son hora de
+# Argentina aunque el servidor esté en UTC.
+def ahora_arg():
+    try: return datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
+    except: return datetime.now()
+
+# CACHÉ DE LECTURA
+# Cada archivo se parsea una vez por versión en disco (inode, mtime, tamaño) y se
+# comparte entre reruns y sesiones. Quien escribe llama a `guardar_csv`, que invalida.
+_CACHE = {}
+
+def version_archivo(archivo):
+    """Identidad del archivo en disco (inode, mtime, tamaño). None si no existe."""
+    try:
+        st_ = os.stat(archivo)
+        return (st_.st_ino, st_.st_mtime_ns, st_.st_size)
+    except OSError:
+        return None
+
+def leer_cacheado(archivo, parser):
+    """Devuelve `parser(archivo)` usando la caché; siempre entrega una copia editable."""
+    version = version_archivo(archivo)
+    clave = (archivo, parser.__name__)
+    en_cache = _CACHE.get(clave)
+    if version is not None and en_cache is not None and en_cache[0] == version:
+        return en_cache[1].copy()
+    with seccion("csv:leer"): df = parser(archivo)
+    if version is not None: registrar_io("csv:leer", leidos=version[2])
+    if version is not None and version_archivo(archivo) == version:
+        _CACHE[clave] = (version, df)
+    return df.copy()
+
+def invalidar(archivo=None):
+    for clave in [c for c in _CACHE if archivo is None or c[0] == archivo]:
+        del _CACHE[clave]
+    for clave in [c for c in _LEDGER if archivo is None or c == archivo]:
+        del _LEDGER[clave]
+
+def _escribir_atomico(df, archivo):
+    """Escribe a un temporal y lo renombra: nunca queda un archivo a medio escribir."""
+    tmp = f"{archivo}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with seccion("csv:escribir"):
+        df.to_csv(tmp, index=False)
+        with open(tmp, "rb+") as f: os.fsync(f.fileno())
+        os.replace(tmp, archivo)
+    registrar_io("csv:escribir", escritos=os.path.getsize(archivo))
+
+def guardar_csv(df, archivo):
+    _escribir_atomico(df, archivo)
+    invalidar(archivo)
+
+# TABLAS
+# Nombre lógico → archivo CSV, columnas y clave de registro. Los backends de
+# almacen.py (CSV o SQLite) trabajan con estos nombres.
+TABLAS = {
+    "ventas": {"archivo": VENTAS_FILE, "cols": COLS_VENTAS, "clave": "ID"},
+    "ventas_items": {"archivo": VENTAS_ITEMS_FILE, "cols": COLS_ITEMS, "clave": None},
+    "produccion": {"archivo": PRODUCCION_FILE, "cols": COLS_PRODUCCION, "clave": "ID"},
+    "auditoria": {"archivo": AUDITORIA_FILE, "cols": COLS_AUDITORIA, "clave": None},
+    "precios": {"archivo": PRECIOS_FILE, "cols": COLS_PRECIOS, "clave": None},
+    "gastos": {"archivo": GASTOS_FILE, "cols": COLS_GASTOS, "clave": None},
+    "operaciones": {"archivo": OPERACIONES_FILE, "cols": COLS_OPERACIONES, "clave": None},
+    "acopios": {"archivo": ACOPIOS_FILE, "cols": COLS_ACOPIOS, "clave": None},
+}
+
+# CARGA
+def normalizar_stock(df):
+    """Agrega columnas faltantes y fija los tipos del stock (en el mismo DataFrame)."""
+    faltantes = [col for col in COLS_STOCK if col not in df.columns]
+    for col in faltantes: df[col] = 0.0
+    df.attrs["columnas_agregadas"] = bool(faltantes)
+
+    df["Codigo"] = df["Codigo"].fillna("").astype(str)
+    df["Producto"] = df["Producto"].fillna("").astype(str)
+    df["Unidad"] = df["Unidad"].fillna("un.").astype(str)
+    for col in ["Cantidad", "Reservado", "Precio Costo", "Precio Venta", "Stock Minimo"]:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+    return df
+
+def _parsear_stock(archivo):
+    return normalizar_stock(pd.read_csv(archivo))
+
+def cargar_stock():
+    """Stock normalizado. Crea el archivo con la lista inicial si no existe y agrega columnas faltantes."""
+    if not os.path.exists(STOCK_FILE):
+        guardar_csv(pd.DataFrame(PRODUCTOS_INICIALES), STOCK_FILE)
+
+    df = leer_cacheado(STOCK_FILE, _parsear_stock)
+    if df.attrs.pop("columnas_agregadas", False): guardar_csv(df, STOCK_FILE)
+    return df
+
+def _parsear_general(archivo):
+    return pd.read_csv(archivo)
+
+def cargar_general(archivo, cols):
+    if not os.path.exists(archivo): return pd.DataFrame(columns=cols)
+    return leer_cacheado(archivo, _parsear_general)
+
+def _parsear_recetas(archivo):
+    # Todo como texto: la validación (filas en blanco, cantidades inválidas) es de produccion.py
+    return pd.read_csv(archivo, dtype=str, keep_default_na=False, skip_blank_lines=False)
+
+def cargar_recetas():
+    """Recetas tal como están en el archivo (es configuración: no pasa por el backend)."""
+    if not os.path.exists(RECETAS_FILE): return pd.DataFrame(columns=COLS_RECETAS)
+    return leer_cacheado(RECETAS_FILE, _parsear_recetas)
+
+# LEDGERS (SOLO AGREGAR)
+# Ventas y producción se escriben agregando líneas al final: confirmar una venta
+# cuesta lo mismo con 10 o con 100.000 registros. La lectura es incremental (solo
+# parsea lo agregado desde la última vez) e ignora una última línea cortada por un
+# corte de luz. En producción un cambio de estado es una fila nueva con el mismo ID;
+# la compactación colapsa esas filas y reescribe el archivo de forma atómica. Quien
+# lleva su propio acumulado (los resúmenes) pide con `cargar_ledger_desde` solo lo
+# agregado después de su marca (offset y firma), sin armar el ledger entero.
+COMPACTAR_CADA = 500  # filas reemplazadas que disparan una compactación
+_LEDGER = {}
+_FIRMA = 64  # bytes previos al offset que se comparan para detectar reescrituras externas
+
+# Columnas que pandas no debe adivinar (un ID o código "0123" no es un número)
+TIPOS = {
+    VENTAS_FILE: {"ID": str, "Cliente": str},
+    VENTAS_ITEMS_FILE: {"ID_Venta": str, "Codigo": str, "Producto": str},
+    PRODUCCION_FILE: {"ID": str, "Codigo": str},
+    AUDITORIA_FILE: {c: str for c in COLS_AUDITORIA},
+    PRECIOS_FILE: {"Fecha": str, "Codigo": str, "Producto": str},
+    GASTOS_FILE: {"Fecha": str, "Insumo": str, "Codigo": str},
+    OPERACIONES_FILE: {"Origen": str, "Fecha": str, "Tipo": str, "Datos": str},
+    ACOPIOS_FILE: {"Fecha": str, "ID_Venta": str, "Cliente": str, "Codigo": str, "Producto": str},
+}
+
+def nuevo_id():
+    return uuid.uuid4().hex[:12]
+
+_LOCKS = threading.local()
+
+@contextmanager
+def bloqueo(archivo):
+    """Lock exclusivo entre procesos y sesiones sobre `archivo` (no-op donde no hay fcntl).
+
+    Es reentrante dentro del mismo hilo, así una transacción puede tomar el lock
+    del stock y llamar a funciones que también lo piden.
+    """
+    tomados = _LOCKS.__dict__.setdefault("tomados", {})
+    if fcntl is None or archivo in tomados:
+        yield
+        return
+    with open(archivo + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        tomados[archivo] = f
+        try: yield
+        finally:
+            del tomados[archivo]
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _leer_encabezado(archivo):
+    with open(archivo, "rb") as f: linea = f.readline()
+    if not linea.endswith(b"\n"): return []
+    return next(csv.reader([linea.decode("utf-8").rstrip("\r\n")]), [])
+
+def _parsear_desde(archivo, marca):
+    """Filas completas después de `marca` ({"ino", "offset", "firma", "columnas"}) y la marca
+    nueva. Si la marca ya no vale (otro archivo, se acortó o se reescribió lo ya leído)
+    parsea el ledger entero; el tercer valor dice si la marca seguía valiendo."""
+    st_ = os.stat(archivo)
+    vigente = bool(marca) and marca["ino"] == st_.st_ino and marca["offset"] <= st_.st_size
+    if vigente:
+        with open(archivo, "rb") as f:
+            f.seek(marca["offset"] - len(marca["firma"]))
+            vigente = f.read(len(marca["firma"])) == marca["firma"]
+
+    with open(archivo, "rb") as f:
+        if vigente:
+            columnas, desde = marca["columnas"], marca["offset"]
+            f.seek(desde)
+        else:
+            columnas = _leer_encabezado(archivo)
+            desde = len(f.readline())
+        resto = f.read()
+
+    completo = resto[:resto.rfind(b"\n") + 1]  # sin '\n' final = escritura cortada
+    if completo and columnas:
+        tipos = {c: t for c, t in TIPOS.get(archivo, {}).items() if c in columnas}
+        with seccion("ledger:leer"):
+            nuevo = pd.read_csv(io.BytesIO(completo), header=None, names=columnas, dtype=tipos, on_bad_lines="skip")
+        registrar_io("ledger:leer", leidos=len(completo))
+    else:
+        nuevo = pd.DataFrame(columns=columnas)
+
+    offset = desde + len(completo)
+    with open(archivo, "rb") as f:
+        f.seek(max(offset - _FIRMA, 0))
+        firma = f.read(min(offset, _FIRMA))
+    return nuevo, {"ino": st_.st_ino, "offset": offset, "firma": firma, "columnas": columnas}, vigente
+
+def _leer_crudo(archivo):
+    """Todas las filas completas del ledger, parseando solo los bytes nuevos."""
+    previo = _LEDGER.get(archivo)
+    nuevo, marca, vigente = _parsear_desde(archivo, previo)
+    df = nuevo if not vigente else (pd.concat([previo["df"], nuevo], ignore_index=True) if len(nuevo) else previo["df"])
+    _LEDGER[archivo] = {**marca, "df": df}
+    return df
+
+def _vigentes(df, clave):
+    """Última versión de cada registro, en el orden en que se crearon."""
+    ultimos = df.drop_duplicates(clave, keep="last").set_index(clave)
+    return ultimos.loc[df[clave].drop_duplicates()].reset_index()[list(df.columns)]
+
+def _compactar(archivo, cols, clave=None):
+    _LEDGER.pop(archivo, None)
+    df = _leer_crudo(archivo)
+    df = df.reindex(columns=list(df.columns) + [c for c in cols if c not in df.columns])
+    if clave:
+        df[clave] = df[clave].astype(object)
+        faltan = df[clave].isna()
+        df.loc[faltan, clave] = [nuevo_id() for _ in range(int(faltan.sum()))]
+        df = _vigentes(df, clave)
+    _escribir_atomico(df, archivo)
+    invalidar(archivo)
+
+def compactar(archivo, cols, clave=None):
+    """Reescribe el ledger sin filas reemplazadas ni líneas cortadas (escritura atómica)."""
+    if not os.path.exists(archivo): return
+    with bloqueo(archivo): _compactar(archivo, cols, clave)
+
+def _recortar_cola(archivo):
+    """Si la última línea quedó a medias (crash durante un append) la descarta."""
+    with open(archivo, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        fin = f.tell()
+        if fin == 0: return
+        f.seek(fin - 1)
+        if f.read(1) == b"\n": return
+        desde = max(fin - 65536, 0)
+        f.seek(desde)
+        cola = f.read()
+        f.truncate(desde + cola.rfind(b"\n") + 1)
+
+def anexar_filas(archivo, filas, cols, clave=None):
+    """Agrega `filas` (lista de dicts) al final del ledger en O(filas nuevas)."""
+    if not filas: return
+    with bloqueo(archivo):
+        columnas = _leer_encabezado(archivo) if os.path.exists(archivo) else []
+        if columnas and set(cols) - set(columnas):
+            _compactar(archivo, cols, clave)  # cambió la forma del ledger: migra el encabezado
+            columnas = _leer_encabezado(archivo)
+        with seccion("ledger:anexar"):
+            texto = pd.DataFrame(filas).reindex(columns=columnas or cols).to_csv(header=not columnas, index=False).encode("utf-8")
+            if columnas: _recortar_cola(archivo)
+            fd = os.open(archivo, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            try:
+                if not columnas: os.ftruncate(fd, 0)
+                os.write(fd, texto)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        registrar_io("ledger:anexar", escritos=len(texto))
+    _CACHE.pop((archivo, "_parsear_general"), None)
+
+def cargar_ledger(archivo, cols, clave=None):
+    """Ledger vigente. Con `clave`, devuelve solo la última versión de cada registro."""
+    if not os.path.exists(archivo): return pd.DataFrame(columns=cols)
+    df = _leer_crudo(archivo)
+    if clave and len(df) and (clave not in df.columns or df[clave].isna().any()):
+        compactar(archivo, cols, clave)  # registros viejos sin ID
+        df = _leer_crudo(archivo)
+    if clave and len(df):
+        vigentes = _vigentes(df, clave)
+        if len(df) - len(vigentes) >= COMPACTAR_CADA: compactar(archivo, cols, clave)
+        return vigentes
+    return df.copy()
+
+def cargar_ledger_desde(archivo, cols, marca, clave=None):
+    """Lo agregado al ledger después de `marca` (la que devolvió la llamada anterior; None
+    la primera vez) sin tocar el resto. Devuelve (filas, marca nueva, completo): si la
+    marca ya no vale (compactación, archivo acortado o reescrito) `filas` es el ledger
+    vigente entero, como `cargar_ledger`, y `completo` es True."""
+    if not os.path.exists(archivo): return pd.DataFrame(columns=cols), None, True
+    if marca:
+        nuevo, nueva, vigente = _parsear_desde(archivo, marca)
+        if vigente: return nuevo, nueva, False
+    df = cargar_ledger(archivo, cols, clave)
+    if archivo not in _LEDGER: df = cargar_ledger(archivo, cols, clave)  # se compactó después de leer
+    return df, {k: v for k, v in _LEDGER[archivo].items() if k != "df"}, True
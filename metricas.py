@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# MÉTRICAS POR CORRIDA
+# Cada rerun de Streamlit es una "corrida". Las secciones calientes (lecturas y
+# escrituras de CSV, PDF, Excel, cuerpo de cada pestaña) suman tiempo, llamadas y
+# bytes a la corrida del hilo actual; al cerrarse pasa a una ventana de las últimas
+# VENTANA corridas, compartida por todas las sesiones. Medir cuesta dos
+# perf_counter y una suma en un dict, así que puede quedar prendido siempre
+# (ALAMBRADOS_METRICAS=0 lo apaga). Con ALAMBRADOS_METRICAS_LOG cada corrida
+# también se agrega como una línea JSON a ese archivo.
+ACTIVO = os.environ.get("ALAMBRADOS_METRICAS", "1") != "0"
+LOG_FILE = os.environ.get("ALAMBRADOS_METRICAS_LOG")
+VENTANA = 200
+
+_local = threading.local()
+_HISTORIAL = deque(maxlen=VENTANA)
+_LOCK = threading.Lock()
+
+class Corrida:
+    def __init__(self, etiqueta=""):
+        self.etiqueta = etiqueta
+        self.fecha = datetime.now().isoformat(timespec="seconds")
+        self.inicio = self.ultimo = time.perf_counter()
+        self.segundos = None
+        self.secciones = {}  # nombre → [llamadas, segundos, bytes leídos, bytes escritos]
+
+    def sumar(self, nombre, segundos=0.0, leidos=0, escritos=0, llamadas=1):
+        s = self.secciones.get(nombre)
+        if s is None: s = self.secciones[nombre] = [0, 0.0, 0, 0]
+        s[0] += llamadas
+        s[1] += segundos
+        s[2] += leidos
+        s[3] += escritos
+        self.ultimo = time.perf_counter()
+
+    def como_dict(self):
+        return {"fecha": self.fecha, "etiqueta": self.etiqueta, "segundos": self.segundos,
+                "secciones": {n: dict(zip(["llamadas", "segundos", "leidos", "escritos"], v)) for n, v in self.secciones.items()}}
+
+def actual():
+    return getattr(_local, "corrida", None)
+
+def iniciar_corrida(etiqueta="", previa=None):
+    """Abre la corrida de este hilo. `previa` es la de la corrida anterior de la misma
+    sesión: si quedó abierta (un st.rerun() corta el script) se cierra acá."""
+    if not ACTIVO: return None
+    if previa is not None and previa.segundos is None: cerrar_corrida(previa, previa.ultimo)
+    _local.corrida = Corrida(etiqueta)
+    return _local.corrida
+
+def cerrar_corrida(corrida=None, fin=None):
+    corrida = corrida or actual()
+    if corrida is None or corrida.segundos is not None: return
+    corrida.segundos = (fin or time.perf_counter()) - corrida.inicio
+    with _LOCK: _HISTORIAL.append(corrida)
+    if LOG_FILE:
+        try:
+            with open(LOG_FILE, "a", encoding="utf-8") as f: f.write(json.dumps(corrida.como_dict()) + "\n")
+        except OSError: pass
+    if actual() is corrida: _local.corrida = None
+
+@contextmanager
+def seccion(nombre):
+    """Suma el tiempo del bloque a `nombre` en la corrida actual (sin corrida, no hace nada)."""
+    corrida = actual()
+    if corrida is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try: yield
+    finally: corrida.sumar(nombre, time.perf_counter() - t0)
+
+def registrar_io(nombre, leidos=0, escritos=0):
+    """Bytes leídos/escritos de `nombre`, sin contar una llamada más."""
+    corrida = actual()
+    if corrida is not None: corrida.sumar(nombre, leidos=leidos, escritos=escritos, llamadas=0)
+
+# RESUMEN
+def corridas():
+    with _LOCK: return list(_HISTORIAL)
+
+def resumen():
+    """Por sección: corridas en que aparece, llamadas y bytes promedio, p50/p95 del tiempo por corrida."""
+    filas = [(n, v[0], v[1], v[2], v[3]) for c in corridas() for n, v in c.secciones.items()]
+    if not filas: return pd.DataFrame(columns=["Sección", "Corridas", "Llamadas", "p50 (ms)", "p95 (ms)", "KB leídos", "KB escritos"])
+    df = pd.DataFrame(filas, columns=["Sección", "llamadas", "segundos", "leidos", "escritos"])
+    g = df.groupby("Sección")
+    out = pd.DataFrame({
+        "Corridas": g.size(),
+        "Llamadas": g["llamadas"].mean(),
+        "p50 (ms)": g["segundos"].median() * 1000,
+        "p95 (ms)": g["segundos"].quantile(0.95) * 1000,
+        "KB leídos": g["leidos"].mean() / 1024,
+        "KB escritos": g["escritos"].mean() / 1024,
+    })
+    return out.sort_values("p95 (ms)", ascending=False).reset_index()
+
+def totales():
+    """(p50, p95) en ms de la duración de las corridas, o None si todavía no hay."""
+    tiempos = [c.segundos for c in corridas()]
+    if not tiempos: return None
+    return float(np.percentile(tiempos, 50) * 1000), float(np.percentile(tiempos, 95) * 1000)
+
+def mas_lentas(n=5):
+    """Las `n` corridas más lentas de la ventana, con la sección que más pesó en cada una."""
+    filas = []
+    for c in sorted(corridas(), key=lambda c: c.segundos, reverse=True)[:n]:
+        # Las pestañas contienen a las lecturas: la sección más pesada se elige entre las que no son pestaña
+        hojas = {k: v for k, v in c.secciones.items() if not k.startswith("pestaña:")} or c.secciones
+        peor = max(hojas.items(), key=lambda kv: kv[1][1], default=("-", [0, 0.0]))
+        filas.append({"Fecha": c.fecha, "Total (ms)": c.segundos * 1000, "Más lenta": peor[0], "ms": peor[1][1] * 1000})
+    return pd.DataFrame(filas, columns=["Fecha", "Total (ms)", "Más lenta", "ms"])
+
+def exportar(ruta):
+    """Agrega la ventana actual a `ruta`, una corrida por línea JSON. Devuelve cuántas escribió."""
+    lista = corridas()
+    with open(ruta, "a", encoding="utf-8") as f:
+        for c in lista: f.write(json.dumps(c.como_dict()) + "\n")
+    return len(lista)
@@ -0,0 +1,288 @@
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from almacen import backend, COLUMNAS_PRECIO
+from catalogo import normalizar_texto, normalizar_codigo, indice_catalogo
+from datos import FORMATO_FECHA_PRECIOS
+from ventas import fechas_de_venta
+
+# PRECIOS
+# Aumentos y listas de proveedor sin navegador: la pestaña Stock y la línea de
+# comandos usan estas mismas funciones. Siempre en dos pasos: `plan_*` arma la
+# diferencia (una fila por celda que cambia, con Antes y Despues) sin escribir nada,
+# y `aplicar` la graba con `editar_stock` en una sola escritura, con auditoría y
+# aviso de conflictos si alguien tocó esas celdas mientras tanto.
+#   python precios.py aumento 12.5                           (todo el catálogo)
+#   python precios.py aumento 10 --solo POSTE --categoria TEJIDO=15 --redondeo 100
+#   python precios.py lista proveedor.xlsx --columna "Precio Costo" --aplicar
+#   python precios.py historial 27 --fecha 2026-03-01
+# Sin --aplicar solo muestra la diferencia. La categoría de un producto es la
+# primera palabra de su nombre normalizado (POSTE, PORTON, TEJIDO...).
+
+COLS_PLAN = ["fila", "Codigo", "Producto", "Columna", "Antes", "Despues", "Var %"]
+
+def categorias(stock):
+    """Categoría de cada fila del stock (Series alineada con `stock`)."""
+    return stock["Producto"].map(normalizar_texto).str.split(n=1).str[0].fillna("")
+
+def redondear(valores, multiplo=0):
+    """Redondea al múltiplo más cercano (100 → $ 12.345 pasa a $ 12.300). 0 = sin redondeo."""
+    return np.round(valores / multiplo) * multiplo if multiplo else valores
+
+def _plan(stock, columna, antes, despues):
+    cambia = (despues - antes).abs() > 1e-9
+    antes, despues = antes[cambia], despues[cambia]
+    return pd.DataFrame({
+        "fila": antes.index, "Codigo": stock.loc[cambia, "Codigo"].to_numpy(), "Producto": stock.loc[cambia, "Producto"].to_numpy(),
+        "Columna": columna, "Antes": antes.to_numpy(), "Despues": despues.to_numpy(),
+        "Var %": ((despues / antes.where(antes != 0) - 1) * 100).to_numpy(),
+    }, columns=COLS_PLAN)
+
+def plan_aumento(stock, porcentaje=0.0, por_categoria=None, solo=None, columna="Precio Venta", redondeo=0):
+    """Diferencia de aplicar `porcentaje` a `columna`, con una sola cuenta sobre toda la columna.
+
+    `por_categoria` ({categoría: %}) pisa el porcentaje general en esas categorías y
+    `solo` limita el aumento a una lista de categorías. Los precios en 0 no cambian.
+    """
+    cats = categorias(stock)
+    pct = pd.Series(float(porcentaje), index=stock.index)
+    if por_categoria:
+        pct = cats.map({normalizar_texto(k): float(v) for k, v in por_categoria.items()}).fillna(pct)
+    if solo:
+        pct = pct.where(cats.isin({normalizar_texto(c) for c in solo}), 0.0)
+    antes = stock[columna].astype(float)
+    return _plan(stock, columna, antes, redondear(antes * (1 + pct / 100), redondeo).where(pct != 0, antes))
+
+def _numero(serie):
+    """Precios de una lista: acepta números o texto tipo "$ 1.234,50"."""
+    if pd.api.types.is_numeric_dtype(serie): return serie.astype(float)
+    texto = serie.astype(str).str.replace(r"[$\s]", "", regex=True)
+    con_coma = texto.str.contains(",", regex=False) | texto.str.fullmatch(r"\d{1,3}(\.\d{3})+")  # "1.234" son mil
+    texto = texto.where(~con_coma, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(texto, errors="coerce")
+
+def leer_lista(archivo, nombre=None):
+    """Lista de proveedor (CSV o XLSX; ruta o archivo abierto) con las columnas
+    renombradas a las del stock cuando coinciden sin importar mayúsculas ni acentos."""
+    nombre = nombre or getattr(archivo, "name", str(archivo))
+    if nombre.lower().endswith((".xlsx", ".xls")): lista = pd.read_excel(archivo, dtype=str)
+    else: lista = pd.read_csv(archivo, dtype=str, sep=None, engine="python")  # sep=None: acepta "," o ";"
+    conocidas = {normalizar_texto(c): c for c in ["Codigo", "Producto", "Precio"] + COLUMNAS_PRECIO}
+    conocidas["COD"] = conocidas["CODIGO"]
+    return lista.rename(columns=lambda c: conocidas.get(normalizar_texto(c).rstrip("."), c))
+
+def plan_lista(stock, indice, lista, columna=None, redondeo=0):
+    """Diferencia de cargar una lista de proveedor, cruzada por código.
+
+    Actualiza las columnas de precio que trae la lista; con `columna`, una columna
+    genérica "Precio" va a esa. Si un código aparece varias veces gana la última fila.
+    Devuelve (plan, códigos no encontrados, códigos repetidos en el stock, códigos sin precio válido).
+    """
+    if columna and columna not in lista.columns and "Precio" in lista.columns:
+        lista = lista.rename(columns={"Precio": columna})
+    cols = [columna] if columna else [c for c in COLUMNAS_PRECIO if c in lista.columns]
+    if "Codigo" not in lista.columns or not cols or any(c not in lista.columns for c in cols):
+        raise ValueError(f"La lista necesita las columnas Codigo y {columna or ' o '.join(COLUMNAS_PRECIO)}.")
+
+    lista = lista.assign(Codigo=lista["Codigo"].fillna("").astype(str).map(normalizar_codigo))
+    lista = lista[lista["Codigo"] != ""].drop_duplicates("Codigo", keep="last").set_index("Codigo")
+    precios = pd.DataFrame({c: _numero(lista[c]) for c in cols})
+    sin_precio = precios.index[precios.isna().all(axis=1)].tolist()
+    precios = precios.drop(index=sin_precio)
+
+    unicos, ambiguos = indice.mapa_codigos()
+    filas = precios.index.to_series().map(unicos)
+    es_ambiguo = precios.index.isin(ambiguos)
+    no_encontrados = precios.index[filas.isna().to_numpy() & ~es_ambiguo].tolist()
+    repetidos = precios.index[es_ambiguo].tolist()
+    precios = precios[filas.notna().to_numpy()].set_axis(filas.dropna().to_numpy())
+
+    partes = []
+    for col in cols:
+        nuevos = precios[col].dropna()
+        sub = stock.loc[nuevos.index]
+        partes.append(_plan(sub, col, sub[col].astype(float), redondear(nuevos, redondeo)))
+    plan = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLS_PLAN)
+    return plan, no_encontrados, repetidos, sin_precio
+
+def aplicar(plan, origen, fecha=None):
+    """Graba un plan en una sola escritura (con auditoría). Devuelve los conflictos:
+    celdas que cambiaron desde que se armó el plan y que quedaron con el valor actual."""
+    if plan.empty: return []
+    ediciones = [{"fila": fila, "Codigo": g["Codigo"].iat[0], "Producto": g["Producto"].iat[0],
+                  "antes": dict(zip(g["Columna"], g["Antes"])), "despues": dict(zip(g["Columna"], g["Despues"]))}
+                 for fila, g in plan.groupby("fila", sort=False)]
+    return backend().editar_stock(ediciones, origen=origen, fecha=fecha)
+
+# HISTORIAL DE PRECIOS
+# El ledger "precios" (lo escribe almacen.py) tiene una fila por cambio con los dos
+# precios vigentes del producto. El índice lo ordena por (código, nombre normalizado,
+# fecha) en arreglos de numpy una vez por versión, porque hay códigos repetidos en el
+# catálogo: el precio de un producto a una fecha es una búsqueda binaria dentro de su
+# tramo, y cruzar muchas filas a la vez (los renglones de las ventas) es un solo
+# merge_asof. Como `buscar_item`, si el par no está y el código tiene un solo producto
+# en el historial (se renombró), vale ese. Antes del primer registro no hay precio.
+
+def _claves(codigos, productos):
+    """Clave de tramo: código y nombre normalizados, en un solo texto."""
+    codigos = pd.Series(np.asarray(codigos, dtype=object)).fillna("").astype(str)
+    productos = pd.Series(np.asarray(productos, dtype=object)).fillna("").astype(str)
+    nombres = {p: normalizar_texto(p) for p in productos.unique()}  # hay muchos más renglones que productos
+    return (codigos.str.strip() + "\x1f" + productos.map(nombres).astype(str)).to_numpy(dtype=str)
+
+class HistorialPrecios:
+    def __init__(self, df):
+        fechas = pd.to_datetime(df["Fecha"], format=FORMATO_FECHA_PRECIOS, errors="coerce")
+        ok = fechas.notna().to_numpy()
+        claves = _claves(df["Codigo"], df["Producto"])[ok]
+        tiempos = fechas.to_numpy(dtype="datetime64[ns]")[ok].astype("int64")
+        orden = np.lexsort((tiempos, claves))  # estable: dos cambios en el mismo segundo quedan en orden de carga
+        self.claves, self.tiempos = claves[orden], tiempos[orden]
+        self.productos = df["Producto"].fillna("").astype(str).to_numpy()[ok][orden]
+        self.costo, self.venta = (pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)[ok][orden] for c in COLUMNAS_PRECIO)
+        cortes = np.flatnonzero(self.claves[1:] != self.claves[:-1]) + 1
+        inicios, fines = np.r_[0, cortes], np.r_[cortes, len(self.claves)]
+        self._tramos = dict(zip(self.claves[inicios], zip(inicios, fines))) if len(self.claves) else {}
+        por_codigo = {}
+        for clave in self._tramos: por_codigo.setdefault(clave.split("\x1f", 1)[0], []).append(clave)
+        self._por_codigo = por_codigo
+        self._unicos = {cod: claves[0] for cod, claves in por_codigo.items() if len(claves) == 1}
+
+    def __len__(self):
+        return len(self.claves)
+
+    def _clave(self, codigo, producto):
+        clave = f"{normalizar_codigo(codigo)}\x1f{normalizar_texto(producto)}"
+        return clave if clave in self._tramos else self._unicos.get(normalizar_codigo(codigo))
+
+    def precio(self, codigo, producto, fecha):
+        """(Precio Costo, Precio Venta) del producto vigentes en `fecha`, o None si todavía no tenía."""
+        lo, hi = self._tramos.get(self._clave(codigo, producto), (0, 0))
+        i = lo + np.searchsorted(self.tiempos[lo:hi], pd.Timestamp(fecha).value, "right") - 1
+        return (float(self.costo[i]), float(self.venta[i])) if i >= lo else None
+
+    def serie(self, codigo, producto=None):
+        """Todos los cambios del producto (sin `producto`, de todos los que usan ese código),
+        del más viejo al más nuevo."""
+        claves = [self._clave(codigo, producto)] if producto is not None else self._por_codigo.get(normalizar_codigo(codigo), [])
+        pos = np.concatenate([np.arange(*self._tramos[c]) for c in claves if c is not None] or [np.empty(0, dtype=int)])
+        pos = pos[np.argsort(self.tiempos[pos], kind="stable")]
+        return pd.DataFrame({"Fecha": pd.to_datetime(self.tiempos[pos]), "Producto": self.productos[pos],
+                             "Precio Costo": self.costo[pos], "Precio Venta": self.venta[pos]})
+
+    def al_dia(self, codigos, productos, fechas):
+        """Precios vigentes para cada renglón (código, producto, fecha), en el mismo orden: un solo merge_asof.
+
+        Devuelve un DataFrame con Precio Costo y Precio Venta (NaN donde no había precio todavía).
+        """
+        tiempos = pd.to_datetime(pd.Series(fechas)).to_numpy(dtype="datetime64[ns]").astype("int64")
+        claves = pd.Series(_claves(codigos, productos))
+        sueltas = ~claves.isin(self._tramos.keys())
+        codigos_sueltos = claves[sueltas].str.split("\x1f", n=1).str[0]
+        claves[sueltas] = codigos_sueltos.map(self._unicos).fillna(claves[sueltas])
+        consulta = pd.DataFrame({"clave": claves.to_numpy(), "t": tiempos, "pos": np.arange(len(tiempos))})
+        consulta = consulta[consulta["t"] != np.iinfo("int64").min].sort_values("t", kind="stable")  # sin NaT
+        hist = pd.DataFrame({"clave": self.claves, "t": self.tiempos, "Precio Costo": self.costo, "Precio Venta": self.venta})
+        cruce = pd.merge_asof(consulta, hist.sort_values("t", kind="stable"), on="t", by="clave")
+        return cruce.set_index("pos")[COLUMNAS_PRECIO].reindex(np.arange(len(tiempos))).reset_index(drop=True)
+
+_HISTORIAL = {"version": None, "historial": None}
+
+def historial_precios():
+    """Índice del historial, reconstruido solo cuando cambia el ledger de precios."""
+    version = backend().version("precios")
+    if version is None or _HISTORIAL["version"] != version or _HISTORIAL["historial"] is None:
+        _HISTORIAL["historial"] = HistorialPrecios(backend().cargar("precios"))
+        _HISTORIAL["version"] = version
+    return _HISTORIAL["historial"]
+
+def margen_por_venta(ventas, items, hist=None):
+    """Costo y margen de cada venta de `ventas`, con un solo cruce contra el historial.
+
+    El costo de un renglón es el que se congeló al vender; las ventas viejas que no lo
+    tienen toman el del historial a la fecha de la venta. Los renglones sin ningún costo
+    conocido no suman al margen y se cuentan en "Sin Costo".
+    """
+    if hist is None: hist = historial_precios()
+    cab = pd.DataFrame({"ID_Venta": ventas["ID"].to_numpy(), "Momento": fechas_de_venta(ventas).to_numpy()})
+    r = items.merge(cab, on="ID_Venta", how="inner")
+    costo = r["Costo"].fillna(hist.al_dia(r["Codigo"], r["Producto"], r["Momento"])["Precio Costo"])
+    conocido = costo.notna()
+    r = r.assign(CostoTotal=(r["Cantidad"] * costo).fillna(0.0), Margen=(r["Subtotal"] - r["Cantidad"] * costo).where(conocido, 0.0),
+                 SinCosto=~conocido)
+    por_venta = r.groupby("ID_Venta").agg(Costo=("CostoTotal", "sum"), Margen=("Margen", "sum"), **{"Sin Costo": ("SinCosto", "sum")})
+    return (ventas[["ID", "Fecha", "Cliente", "Total"]].join(por_venta, on="ID")
+            .fillna({"Costo": 0.0, "Margen": 0.0, "Sin Costo": 0}).reset_index(drop=True))
+
+# LÍNEA DE COMANDOS
+def _categoria_pct(texto):
+    nombre, _, pct = texto.rpartition("=")
+    if not nombre: raise argparse.ArgumentTypeError(f"se esperaba CATEGORIA=%, no {texto!r}")
+    return nombre, float(pct.replace(",", "."))
+
+def main(argv=None):
+    comunes = argparse.ArgumentParser(add_help=False)
+    comunes.add_argument("--carpeta", help="carpeta de los datos (por defecto, la actual)")
+    comunes.add_argument("--aplicar", action="store_true", help="grabar los cambios")
+    comunes.add_argument("--redondeo", type=float, default=0, help="redondear al múltiplo (ej. 100)")
+    comunes.add_argument("--salida", help="guardar la diferencia en este CSV")
+    p = argparse.ArgumentParser(description="Aumentos de precios y listas de proveedor (sin --aplicar, solo muestra la diferencia).")
+    sub = p.add_subparsers(dest="comando", required=True)
+    a = sub.add_parser("aumento", parents=[comunes], help="porcentaje sobre el catálogo o por categoría")
+    a.add_argument("porcentaje", type=float, nargs="?", default=0.0)
+    a.add_argument("--columna", choices=COLUMNAS_PRECIO, default="Precio Venta")
+    a.add_argument("--categoria", type=_categoria_pct, action="append", default=[], metavar="CATEGORIA=%")
+    a.add_argument("--solo", action="append", metavar="CATEGORIA", help="aumentar solo estas categorías")
+    l = sub.add_parser("lista", parents=[comunes], help="lista de proveedor (CSV o XLSX) cruzada por código")
+    l.add_argument("archivo")
+    l.add_argument("--columna", choices=COLUMNAS_PRECIO, help="columna que actualiza una columna genérica \"Precio\"")
+    h = sub.add_parser("historial", help="cambios de precio de un código, o su precio a una fecha")
+    h.add_argument("codigo")
+    h.add_argument("--producto", help="nombre, si el código es de más de un producto")
+    h.add_argument("--fecha", help="AAAA-MM-DD [HH:MM]: precio vigente en ese momento")
+    h.add_argument("--carpeta", help="carpeta de los datos (por defecto, la actual)")
+    args = p.parse_args(argv)
+
+    archivo = os.path.abspath(args.archivo) if args.comando == "lista" else None
+    if args.carpeta: os.chdir(args.carpeta)  # las rutas de datos.py son relativas
+    if args.comando == "historial":
+        hist = historial_precios()
+        if args.fecha:
+            precio = hist.precio(args.codigo, args.producto or "", args.fecha)
+            if precio is None:
+                print(f"Sin precio registrado para {args.codigo} al {args.fecha}.")
+                return 1
+            print(f"Costo: {precio[0]:,.2f}  Venta: {precio[1]:,.2f}")
+        else: print(hist.serie(args.codigo, args.producto).to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+        return 0
+
+    stock = backend().cargar_stock()
+    if args.comando == "aumento":
+        plan = plan_aumento(stock, args.porcentaje, dict(args.categoria), args.solo, args.columna, args.redondeo)
+        origen = "aumento"
+    else:
+        indice = indice_catalogo(stock, backend().version("stock"))
+        plan, no_encontrados, repetidos, sin_precio = plan_lista(stock, indice, leer_lista(archivo), args.columna, args.redondeo)
+        origen = f"lista:{os.path.basename(archivo)}"
+        for titulo, codigos in [("no encontrados", no_encontrados), ("repetidos en el stock", repetidos), ("sin precio", sin_precio)]:
+            if codigos: print(f"Códigos {titulo}: {', '.join(codigos)}", file=sys.stderr)
+
+    if args.salida: plan.drop(columns=["fila"]).to_csv(args.salida, index=False)
+    if plan.empty:
+        print("Sin cambios.")
+        return 0
+    print(plan.drop(columns=["fila"]).to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    if not args.aplicar:
+        print(f"\n{len(plan)} cambio(s). Nada grabado: repetir con --aplicar.")
+        return 0
+    conflictos = aplicar(plan, origen)
+    print(f"\n{len(plan) - len(conflictos)} cambio(s) grabados.")
+    for c in conflictos:
+        print(f"Conflicto: [{c['Codigo']}] {c['Producto']} {c['Columna']}: quedó {c['Actual']} (la lista decía {c['Tuyo']})", file=sys.stderr)
+    return 1 if conflictos else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import pandas as pd
+
+from almacen import movimiento
+from catalogo import normalizar_texto
+from datos import RECETAS_FILE, COLS_RECETAS, COLS_PRODUCCION, cargar_recetas, version_archivo
+
+# RECETAS (LISTA DE MATERIALES)
+# recetas_del_carmen.csv dice cuánto insumo lleva cada unidad de producto final
+# (Poste Intermedio → 0.1 de Cemento + 0.5 de Alambre). Se valida y se indexa una
+# vez por versión del archivo; explotar un pedido es un join + multiplicación +
+# groupby sobre toda la tabla, sin recorrer fila por fila. Productos e insumos se
+# cruzan con el stock por nombre normalizado ("Cemento" = "CEMENTO").
+
+class Recetas:
+    def __init__(self, crudo):
+        df = crudo.reindex(columns=COLS_RECETAS).fillna("").astype(str)
+        producto = df["Producto Final"].str.strip()
+        insumo = df["Insumo"].str.strip()
+        texto_cant = df["Cantidad"].str.strip()
+        cantidad = pd.to_numeric(texto_cant.str.replace(",", "."), errors="coerce")
+
+        motivo = pd.Series("", index=df.index)
+        motivo[cantidad.isna() | (cantidad <= 0)] = "cantidad inválida"
+        motivo[insumo == ""] = "sin insumo"
+        motivo[producto == ""] = "sin producto"
+        en_blanco = (producto == "") & (insumo == "") & (texto_cant == "")  # se ignoran sin aviso
+        malas = (motivo != "") & ~en_blanco
+        # Línea del archivo (1 = encabezado), para que se pueda corregir a mano
+        self.invalidas = pd.DataFrame({"Linea": df.index[malas] + 2, "Motivo": motivo[malas].to_numpy()})
+
+        validas = pd.DataFrame({"Producto": producto, "Insumo": insumo, "Cantidad": cantidad})[motivo == ""]
+        validas["clave"] = validas["Producto"].map(normalizar_texto)
+        validas["clave_insumo"] = validas["Insumo"].map(normalizar_texto)
+        # Un insumo repetido en la misma receta se suma
+        self.tabla = (validas.groupby(["clave", "clave_insumo"], as_index=False, sort=False)
+                      .agg(Producto=("Producto", "first"), Insumo=("Insumo", "first"), Cantidad=("Cantidad", "sum"))
+                      .set_index("clave"))
+        self.productos = set(self.tabla.index)
+
+    def tiene(self, producto):
+        return normalizar_texto(producto) in self.productos
+
+    def explotar(self, pedido):
+        """Insumos totales para `pedido` (DataFrame con Producto y Cantidad, o dict producto → cantidad).
+
+        Los productos sin receta no aportan nada. Devuelve Insumo, clave_insumo y Requerido.
+        """
+        if isinstance(pedido, dict):
+            pedido = pd.DataFrame({"Producto": list(pedido), "Cantidad": list(pedido.values())})
+        cantidades = pd.to_numeric(pedido["Cantidad"], errors="coerce").fillna(0.0)
+        por_producto = cantidades.groupby(pedido["Producto"].map(normalizar_texto).to_numpy()).sum()
+        uso = self.tabla.join(por_producto.rename("Pedido"), how="inner")
+        uso["Requerido"] = uso["Cantidad"] * uso["Pedido"]
+        return (uso.groupby("clave_insumo", as_index=False, sort=False)
+                .agg(Insumo=("Insumo", "first"), Requerido=("Requerido", "sum"))
+                .sort_values("Insumo", ignore_index=True))
+
+_RECETAS = {"version": None, "recetas": None}
+
+def recetas():
+    """Recetas validadas, reconstruidas solo cuando cambia el archivo."""
+    version = version_archivo(RECETAS_FILE)
+    if version is None or _RECETAS["version"] != version or _RECETAS["recetas"] is None:
+        _RECETAS["recetas"] = Recetas(cargar_recetas())
+        _RECETAS["version"] = version
+    return _RECETAS["recetas"]
+
+def requerimientos(pedido, stock, indice, rec=None):
+    """Explosión de `pedido` cruzada con el stock: Insumo, Codigo, Producto, Requerido,
+    En Stock y Faltante. Codigo queda vacío si el insumo no está (o está repetido) en el stock."""
+    req = (rec or recetas()).explotar(pedido)
+    unicos, _ = indice.mapa_nombres()
+    filas = req.pop("clave_insumo").map(unicos)
+    hay = filas.notna()
+    en_stock = stock.loc[filas[hay]]
+    req["Codigo"], req["Producto"], req["En Stock"] = "", "", 0.0
+    req.loc[hay, "Codigo"] = en_stock["Codigo"].to_numpy()
+    req.loc[hay, "Producto"] = en_stock["Producto"].to_numpy()
+    req.loc[hay, "En Stock"] = en_stock["Cantidad"].to_numpy()
+    req["Faltante"] = (req["Requerido"] - req["En Stock"]).clip(lower=0.0)
+    return req[["Insumo", "Codigo", "Producto", "Requerido", "En Stock", "Faltante"]]
+
+def consumo_de_lote(producto, cantidad, stock, indice, rec=None):
+    """Movimientos que descuentan los insumos de un lote, y los insumos que no están en el stock."""
+    req = requerimientos({producto: cantidad}, stock, indice, rec)
+    ok = req["Codigo"] != ""
+    movs = [movimiento(cod, prod, delta={"Cantidad": -float(r)})
+            for cod, prod, r in zip(req.loc[ok, "Codigo"], req.loc[ok, "Producto"], req.loc[ok, "Requerido"])]
+    return movs, req.loc[~ok, "Insumo"].tolist()
+
+def pedido_abierto(stock, carrito=()):
+    """Lo comprometido y todavía no entregado: reservas de acopio + el presupuesto en curso."""
+    partes = [stock.loc[stock["Reservado"] > 0, ["Producto", "Reservado"]].rename(columns={"Reservado": "Cantidad"})]
+    if carrito: partes.append(pd.DataFrame(carrito, columns=["Producto", "Cantidad"]))
+    return pd.concat(partes, ignore_index=True)
+
+# CALENDARIO DE CURADO
+# Los lotes abiertos, ordenados por fecha de lista y separados en listos / pendientes
+# con una sola cuenta de fechas sobre toda la columna. Liberar N lotes listos es un
+# movimiento de stock por producto + N filas "Finalizado", en una sola escritura.
+
+def calendario(df_prod, hoy):
+    """Lotes no finalizados con "Vence" (fecha), "Faltan" (días) y "Listo", el más próximo primero.
+
+    Un lote sin fecha legible se considera listo: no hay nada que esperar.
+    """
+    abiertos = df_prod[df_prod["Estado"] != "Finalizado"].reindex(columns=COLS_PRODUCCION)
+    vence = pd.to_datetime(abiertos["Fecha_Lista"], errors="coerce")
+    abiertos = abiertos.assign(Vence=vence, Faltan=(vence - pd.Timestamp(hoy)).dt.days)
+    abiertos["Listo"] = abiertos["Faltan"].isna() | (abiertos["Faltan"] <= 0)
+    return abiertos.sort_values("Vence", kind="stable", na_position="first", ignore_index=True)
+
+def codigos_de_lotes(lotes, stock, indice):
+    """Código de cada lote; los lotes viejos (sin Codigo) se resuelven por nombre si es único."""
+    codigos = lotes["Codigo"].fillna("").astype(str).str.strip()
+    unicos, _ = indice.mapa_nombres()
+    por_nombre = lotes["Producto"].map(normalizar_texto).map(unicos)
+    sin_codigo = (codigos == "") & por_nombre.notna()
+    codigos[sin_codigo] = stock.loc[por_nombre[sin_codigo], "Codigo"].to_numpy()
+    return codigos
+
+def liberar_lotes(lotes, stock, indice):
+    """(movimientos de ingreso, filas "Finalizado", lotes sin producto en el stock) para `lotes`."""
+    codigos = codigos_de_lotes(lotes, stock, indice)
+    # (código, nombre) como los ítems del carrito: un código repetido en el catálogo se desempata por nombre
+    filas = pd.Series([indice.buscar_item(c, p) for c, p in zip(codigos, lotes["Producto"].fillna("").astype(str))],
+                      index=lotes.index, dtype=object)
+    ok = filas.notna()
+    por_fila = pd.to_numeric(lotes.loc[ok, "Cantidad"], errors="coerce").fillna(0.0).groupby(filas[ok].to_numpy()).sum()
+    movs = [movimiento(stock.at[f, "Codigo"], stock.at[f, "Producto"], delta={"Cantidad": float(c)}) for f, c in por_fila.items()]
+    finalizados = lotes.loc[ok, COLS_PRODUCCION].assign(Codigo=codigos[ok], Estado="Finalizado")
+    return movs, finalizados.to_dict("records"), lotes[~ok]
@@ -0,0 +1,246 @@
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+import xlsxwriter
+from fpdf import FPDF
+
+from datos import LOGO_FILE, ahora_arg
+from metricas import seccion, registrar_io
+
+# FUNCIONES
+def generar_excel(df):
+    with tempfile.TemporaryFile() as f:
+        return exportar_excel({"Stock": df}, f).read()
+
+# EXCEL
+# El libro se escribe fila por fila en modo constant_memory de xlsxwriter: cada fila
+# va al archivo apenas se completa, así que un historial grande no se arma entero en
+# memoria. Se genera solo cuando alguien lo pide y se guarda en disco por versión
+# de los datos: volver a descargarlo sin cambios no lo reconstruye.
+FILAS_POR_TANDA = 5000
+
+def exportar_excel(hojas, destino=None):
+    """Escribe `hojas` (dict nombre → DataFrame) en `destino` (por defecto un temporal).
+    Devuelve `destino` posicionado al inicio."""
+    destino = destino if destino is not None else tempfile.TemporaryFile()
+    with seccion("excel"):
+        libro = xlsxwriter.Workbook(destino, {"constant_memory": True, "default_date_format": "dd/mm/yyyy"})
+        negrita = libro.add_format({"bold": True})
+        for nombre, df in hojas.items():
+            hoja = libro.add_worksheet(nombre[:31])  # límite de Excel
+            hoja.write_row(0, 0, [str(c) for c in df.columns], negrita)
+            for desde in range(0, len(df), FILAS_POR_TANDA):
+                tanda = df.iloc[desde:desde + FILAS_POR_TANDA].astype(object)
+                tanda = tanda.where(tanda.notna(), None)  # NaN → celda vacía
+                for n, fila in enumerate(tanda.itertuples(index=False, name=None), desde + 1):
+                    hoja.write_row(n, 0, fila)
+        libro.close()
+    registrar_io("excel", escritos=destino.tell())
+    destino.seek(0)
+    return destino
+
+_EXCEL_CACHE = {}  # nombre → (versión, ruta en disco)
+_EXCEL_LOCK = threading.RLock()
+
+def excel_cacheado(nombre, version, hojas):
+    """Ruta del libro `nombre` en disco. `hojas()` solo se llama si cambió `version`
+    (con None en la versión no se cachea: algún archivo no existe todavía)."""
+    cacheable = version is not None and None not in tuple(version if isinstance(version, tuple) else (version,))
+    with _EXCEL_LOCK:
+        previo = _EXCEL_CACHE.get(nombre)
+        if not (cacheable and previo and previo[0] == version and os.path.exists(previo[1])):
+            fd, ruta = tempfile.mkstemp(prefix=f"{nombre}_", suffix=".xlsx")
+            with os.fdopen(fd, "wb") as f: exportar_excel(hojas(), f)
+            if previo and os.path.exists(previo[1]): os.remove(previo[1])
+            previo = _EXCEL_CACHE[nombre] = (version if cacheable else object(), ruta)
+        return previo[1]
+
+def leer_excel(nombre, version, hojas):
+    """Bytes del libro para st.download_button. Va dentro de la función que se le pasa
+    como `data`: se arma y se lee recién cuando alguien hace clic, no en cada rerun."""
+    with _EXCEL_LOCK:  # que otra sesión no lo regenere (y borre) entre armarlo y leerlo
+        with open(excel_cacheado(nombre, version, hojas), "rb") as f: return f.read()
+
+# PDF GENERATOR 
+PLANTILLA_VERSION = 1  # subir si cambia el diseño: invalida los PDF en caché
+PDF_CACHE_MAX = 64
+_LOGO = {}
+
+def _logo_parseado(pdf):
+    """El JPEG del logo se decodifica una sola vez por proceso y se reutiliza en cada PDF."""
+    if "info" not in _LOGO:
+        _LOGO["info"] = pdf._parsejpg(LOGO_FILE) if os.path.exists(LOGO_FILE) else None
+    return _LOGO["info"]
+
+class PDF(FPDF):
+    def header(self):
+        try:
+            info = _logo_parseado(self)
+            if info is not None:
+                if LOGO_FILE not in self.images:
+                    # Copia: fpdf anota en el dict el número de objeto de cada documento
+                    self.images[LOGO_FILE] = dict(info, i=len(self.images) + 1)
+                self.image(LOGO_FILE, 170, 8, 30)
+        except: pass
+        self.set_font('Arial', 'B', 15)
+        self.set_text_color(183, 28, 28)
+        self.cell(80)
+        self.cell(30, 10, 'PRESUPUESTO', 0, 0, 'C')
+        self.ln(20)
+        self.set_text_color(0, 0, 0)
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, 'Alambrados del Carmen S.A.', 0, 0, 'C')
+
+def _dibujar_comprobante(pdf, cliente, items, total, fecha_hora):
+    """Agrega al documento las páginas de un comprobante."""
+    pdf.add_page()
+    pdf.set_font("Arial", size=11)
+    
+    pdf.cell(200, 10, txt=f"Cliente: {cliente}", ln=True)
+    pdf.cell(200, 10, txt=f"Fecha Emision: {fecha_hora}", ln=True)
+    pdf.ln(10)
+    
+    # Encabezados
+    pdf.set_fill_color(211, 47, 47) 
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", 'B', 9) 
+    pdf.cell(15, 10, "Cod", 1, 0, 'C', True)
+    pdf.cell(100, 10, "Producto", 1, 0, 'C', True)
+    pdf.cell(15, 10, "Cant", 1, 0, 'C', True)
+    pdf.cell(25, 10, "Unit", 1, 0, 'C', True)
+    pdf.cell(25, 10, "Total", 1, 1, 'C', True)
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", size=9)
+    
+    for item in items:
+        # Lógica Robusta de Impresión
+        if isinstance(item, dict):
+            cod = str(item.get('Codigo', '-'))[:6]
+            prod = str(item.get('Producto', ''))
+            # Recorte de texto largo para que no se encime
+            if len(prod) > 55: prod = prod[:52] + "..."
+            
+            cant = item.get('Cantidad', 0)
+            prec = item.get('Precio', 0)
+            sub = item.get('Subtotal', 0)
+        else:
+            # Fallback para ventas muy viejas (string simple)
+            cod = "-"
+            prod = str(item)[:55]
+            cant = 0
+            prec = 0
+            sub = 0
+        
+        try: prod_clean = prod.encode('latin-1', 'replace').decode('latin-1')
+        except: prod_clean = prod
+
+        pdf.cell(15, 8, cod, 1)
+        pdf.cell(100, 8, prod_clean, 1)
+        pdf.cell(15, 8, f"{cant:.1f}", 1)
+        pdf.cell(25, 8, f"${prec:.0f}", 1)
+        pdf.cell(25, 8, f"${sub:.0f}", 1)
+        pdf.ln()
+        
+    pdf.ln(5)
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(155, 10, "TOTAL FINAL", 0)
+    pdf.set_text_color(183, 28, 28)
+    pdf.cell(25, 10, f"${total:,.0f}", 0, 1)
+    
+    pdf.ln(20)
+    pdf.set_font("Arial", 'I', 8)
+    pdf.set_text_color(80, 80, 80)
+    texto_legal = "Presupuesto sujeto a disponibilidad de stock al momento de la compra. Los precios pueden sufrir modificaciones sin previo aviso hasta la confirmación del pago."
+    pdf.multi_cell(0, 5, texto_legal)
+
+def generar_pdf(cliente, items, total, tipo_venta="", fecha_hora=None):
+    with seccion("pdf"):
+        pdf = PDF()
+        fecha_hora = fecha_hora or ahora_arg().strftime("%d/%m/%Y %H:%M")
+        _dibujar_comprobante(pdf, cliente, items, total, fecha_hora)
+        datos_pdf = pdf.output(dest='S').encode('latin-1')
+    registrar_io("pdf", escritos=len(datos_pdf))
+    return datos_pdf
+
+_PDF_CACHE = OrderedDict()
+_PDF_LOCK = threading.Lock()
+
+def clave_pdf(cliente, items, total, tipo_venta, fecha_hora):
+    """Hash de todo lo que se imprime (incluida la fecha de emisión, al minuto)."""
+    contenido = [cliente, [dict(i) if isinstance(i, dict) else str(i) for i in items],
+                 total, tipo_venta, fecha_hora, PLANTILLA_VERSION]
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode()).hexdigest()
+
+def pdf_cacheado(cliente, items, total, tipo_venta=""):
+    """Como generar_pdf, pero memoizado en un LRU acotado por hash de contenido.
+
+    Pensado para `download_button(data=...)` con un callable: el PDF se arma recién
+    cuando alguien lo descarga, y dos descargas iguales no lo vuelven a armar.
+    """
+    fecha_hora = ahora_arg().strftime("%d/%m/%Y %H:%M")
+    clave = clave_pdf(cliente, items, total, tipo_venta, fecha_hora)
+    with _PDF_LOCK:
+        if clave in _PDF_CACHE:
+            _PDF_CACHE.move_to_end(clave)
+            return _PDF_CACHE[clave]
+    datos_pdf = generar_pdf(cliente, items, total, tipo_venta, fecha_hora)
+    with _PDF_LOCK:
+        _PDF_CACHE[clave] = datos_pdf
+        while len(_PDF_CACHE) > PDF_CACHE_MAX: _PDF_CACHE.popitem(last=False)
+    return datos_pdf
+
+# EXPORTACIÓN MASIVA
+# Un comprobante es un dict con ID, Fecha, Cliente, Total, Tipo e Items (lista de
+# renglones, como los devuelve ventas.items_por_venta). El ZIP se renderiza en un
+# pool de procesos; el PDF único es un solo documento FPDF (fpdf no sabe unir
+# PDFs ya generados), así que se arma en secuencia.
+MIN_PARA_POOL = 8  # por debajo de esto levantar procesos cuesta más que renderizar
+
+def _renderizar(comprobante):
+    c = comprobante
+    return generar_pdf(c["Cliente"], c["Items"], c["Total"], c.get("Tipo", ""), c["Fecha"])
+
+def nombre_comprobante(comprobante, n):
+    base = f"{n:05d}_{comprobante['Fecha']}_{comprobante['Cliente']}"
+    return re.sub(r"[^\w\-]+", "_", base).strip("_") + ".pdf"
+
+def _renderizar_todos(comprobantes, procesos=None):
+    """Genera los PDF en orden, usando un pool de procesos si vale la pena."""
+    if len(comprobantes) < MIN_PARA_POOL or procesos == 1:
+        yield from map(_renderizar, comprobantes)
+        return
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        yield from pool.map(_renderizar, comprobantes, chunksize=4)
+
+def exportar_comprobantes(comprobantes, formato="zip", destino=None, progreso=None, procesos=None):
+    """Escribe todos los comprobantes como ZIP de PDFs o como un único PDF.
+
+    Va escribiendo en `destino` (por defecto un archivo temporal) a medida que se
+    renderiza, sin juntar todos los PDF en memoria. `progreso(hechos, total)` se
+    llama después de cada comprobante. Devuelve `destino` posicionado al inicio.
+    """
+    destino = destino if destino is not None else tempfile.TemporaryFile()
+    total = len(comprobantes)
+    if formato == "pdf":
+        pdf = PDF()
+        for n, c in enumerate(comprobantes, 1):
+            _dibujar_comprobante(pdf, c["Cliente"], c["Items"], c["Total"], c["Fecha"])
+            if progreso: progreso(n, total)
+        destino.write(pdf.output(dest='S').encode('latin-1'))
+    else:
+        with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED) as zf:
+            for n, (c, datos_pdf) in enumerate(zip(comprobantes, _renderizar_todos(comprobantes, procesos)), 1):
+                zf.writestr(nombre_comprobante(c, n), datos_pdf)
+                if progreso: progreso(n, total)
+    destino.seek(0)
+    return destino
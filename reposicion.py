@@ -0,0 +1,89 @@
+import threading
+import pandas as pd
+
+from almacen import filas_tocadas
+from resumenes import resumenes
+
+# ALERTAS DE REPOSICIÓN
+# Un producto está bajo mínimo cuando lo disponible (Cantidad - Reservado) llega a su
+# Stock Minimo; con Stock Minimo en 0 no se controla. El conjunto se arma una vez y
+# después cada escritura del stock (venta, acopio, ingreso, liberar lotes, grilla)
+# solo hace reevaluar las filas que tocó (ver almacen.filas_tocadas). La proyección
+# usa la venta diaria de los últimos DIAS_VELOCIDAD días sacada de los resúmenes.
+DIAS_VELOCIDAD = 30
+DIAS_COBERTURA = 30  # lo sugerido para reponer cubre el mínimo más estos días de venta
+HORIZONTE = 14       # "en riesgo": llegaría al mínimo dentro de estos días
+COLS_ALERTA = ["Codigo", "Producto", "Disponible", "Minimo", "Venta Diaria", "Dias al Minimo", "Reponer"]
+
+def bajo_minimo(df):
+    minimo = df["Stock Minimo"]
+    return (minimo > 0) & (df["Cantidad"] - df["Reservado"] <= minimo)
+
+class AlertasStock:
+    def __init__(self):
+        self.version = None
+        self.filas = set()
+        self.recalculos = 0  # cuántas veces hubo que mirar todo el stock
+        self._lock = threading.Lock()  # compartido entre sesiones
+
+    def __len__(self):
+        return len(self.filas)
+
+    def sincronizar(self, stock, version):
+        """Deja el conjunto al día con `stock` (leído en `version`), mirando solo lo que cambió."""
+        with self._lock:
+            if version is not None and version == self.version: return self
+            tocadas = None if self.version is None or version is None else filas_tocadas(self.version, version)
+            if tocadas is None:
+                self.filas = set(stock.index[bajo_minimo(stock)])
+                self.recalculos += 1
+            else:
+                vigentes = stock.index.intersection(list(tocadas))
+                self.filas -= tocadas
+                self.filas |= set(vigentes[bajo_minimo(stock.loc[vigentes])])
+            self.version = version
+        return self
+
+    def tabla(self, stock, velocidad=None):
+        """Los productos bajo mínimo, los que más urgen primero."""
+        with self._lock: filas = [f for f in self.filas if f in stock.index]
+        return proyectar(stock.loc[filas], velocidad).sort_values(["Dias al Minimo", "Reponer"], ascending=[True, False], ignore_index=True)
+
+_ALERTAS = AlertasStock()
+
+def alertas(stock, version):
+    return _ALERTAS.sincronizar(stock, version)
+
+def velocidad_de_venta(indice, hoy, dias=DIAS_VELOCIDAD):
+    """Unidades vendidas por día en los últimos `dias`, por fila del stock (solo lo que se vendió)."""
+    desde = pd.Timestamp(hoy) - pd.Timedelta(days=dias - 1)
+    por_producto = resumenes().tabla("producto", desde, hoy).groupby(["Codigo", "Producto"], sort=False)["Unidades"].sum() / dias
+    # (código, nombre) como los ítems del carrito: los productos con código repetido también tienen velocidad
+    filas = pd.Series([indice.buscar_item(c, p) for c, p in por_producto.index], dtype=object)
+    ok = filas.notna().to_numpy()
+    velocidad = pd.Series(por_producto.to_numpy()[ok], index=filas[ok].to_numpy(), dtype=float)
+    return velocidad.groupby(level=0).sum()  # un producto renombrado puede venir con dos nombres
+
+def proyectar(df, velocidad=None):
+    """Disponible, mínimo, venta diaria, días hasta llegar al mínimo (0 = ya llegó, vacío =
+    no se vende) y cuánto reponer para cubrir el mínimo más DIAS_COBERTURA días de venta."""
+    disponible = df["Cantidad"] - df["Reservado"]
+    vel = (velocidad if velocidad is not None else pd.Series(dtype=float)).reindex(df.index).fillna(0.0)
+    margen = disponible - df["Stock Minimo"]
+    dias = (margen / vel.where(vel > 0)).clip(lower=0).where(margen > 0, 0.0)
+    return pd.DataFrame({
+        "Codigo": df["Codigo"], "Producto": df["Producto"], "Disponible": disponible, "Minimo": df["Stock Minimo"],
+        "Venta Diaria": vel, "Dias al Minimo": dias,
+        "Reponer": (df["Stock Minimo"] + vel * DIAS_COBERTURA - disponible).clip(lower=0),
+    }, columns=COLS_ALERTA).reset_index(drop=True)
+
+def en_riesgo(stock, velocidad, horizonte=HORIZONTE):
+    """Productos todavía sobre el mínimo que, al ritmo de venta actual, llegan en `horizonte` días.
+
+    Solo mira los que se vendieron en el período (el índice de `velocidad`), no todo el catálogo.
+    """
+    filas = velocidad.index.intersection(stock.index)
+    candidatos = stock.loc[filas]
+    candidatos = candidatos[(candidatos["Stock Minimo"] > 0) & ~bajo_minimo(candidatos)]
+    proy = proyectar(candidatos, velocidad)
+    return proy[proy["Dias al Minimo"] <= horizonte].sort_values("Dias al Minimo", ignore_index=True)
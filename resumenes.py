@@ -0,0 +1,136 @@
+import threading
+import numpy as np
+import pandas as pd
+
+from almacen import backend
+from ventas import fechas_de_venta, tipar_items
+
+# RESÚMENES DE VENTAS
+# Agregados chicos que el tablero lee sin tocar los ledgers:
+#   producto: (Dia, Codigo, Producto) → Unidades, Facturacion, Margen
+#   cliente:  (Mes, Cliente)          → Ventas, Facturacion
+#   tipo:     (Dia, Tipo)             → Ventas, Facturacion   (acopio / entrega inmediata)
+# Se mantienen por incremento: cuando cambia la versión de ventas o de renglones se
+# leen del backend solo las filas agregadas después de la última marca (offset del CSV
+# o rowid de SQLite) y solo esas se suman. Si un ledger cambió de forma (se compactó,
+# se acortó, se reescribió lo ya sumado o reaparece una venta ya sumada) se rearma
+# todo desde cero.
+# El margen solo cuenta renglones con costo conocido (las ventas viejas no lo tienen).
+
+CLAVES = {"producto": ["Dia", "Codigo", "Producto"], "cliente": ["Mes", "Cliente"], "tipo": ["Dia", "Tipo"]}
+VALORES = {"producto": ["Unidades", "Facturacion", "Margen"], "cliente": ["Ventas", "Facturacion"], "tipo": ["Ventas", "Facturacion"]}
+
+class Resumenes:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._tablas = {nombre: {} for nombre in CLAVES}  # clave → [valores]: sumar no toca lo que ya estaba
+        self._vistas = {}  # nombre → DataFrame armado la última vez que se pidió
+        self._marcas = {"ventas": None, "ventas_items": None}  # hasta dónde se leyó cada ledger (la da el backend)
+        self._dias = {}  # ID de venta → día (NaT si la fecha no se puede leer)
+        self._pendientes = None  # renglones cuya cabecera todavía no apareció
+
+    def _cambio_forma(self, ventas):
+        """Una venta ya sumada que vuelve a aparecer (se reescribió): no se puede restar."""
+        ids = ventas["ID"].astype(str)
+        return any(i in self._dias for i in ids) or bool(ids.duplicated().any())
+
+    def _sumar(self, nombre, nuevo):
+        nuevo = nuevo.dropna(subset=CLAVES[nombre])
+        if nuevo.empty: return
+        nuevo = nuevo.groupby(CLAVES[nombre], sort=False)[VALORES[nombre]].sum()
+        tabla = self._tablas[nombre]
+        for clave, valores in zip(nuevo.index, nuevo.to_numpy(dtype=float).tolist()):
+            acumulado = tabla.get(clave)
+            if acumulado is None: tabla[clave] = valores
+            else: tabla[clave] = [a + v for a, v in zip(acumulado, valores)]
+        self._vistas.pop(nombre, None)
+
+    def rearmar(self, ventas, items):
+        """Todo desde cero con estos ledgers enteros (sin marcas: `al_dia` vuelve a leer todo)."""
+        with self._lock:
+            self.reiniciar()
+            self._sumar_ventas(ventas)
+            self._sumar_items(tipar_items(items))
+        return self
+
+    def al_dia(self, b):
+        """Lee de `b` solo lo agregado a ventas y renglones desde la última vez y lo suma."""
+        with self._lock:
+            ventas, marca_v, completo_v = b.cargar_desde("ventas", self._marcas["ventas"])
+            items, marca_i, completo_i = b.cargar_desde("ventas_items", self._marcas["ventas_items"])
+            if completo_v or completo_i or self._cambio_forma(ventas):
+                if not completo_v: ventas, marca_v, _ = b.cargar_desde("ventas", None)
+                if not completo_i: items, marca_i, _ = b.cargar_desde("ventas_items", None)
+                self.reiniciar()
+            self._sumar_ventas(ventas)
+            items = tipar_items(items)
+            if self._pendientes is not None: items = pd.concat([self._pendientes, items])
+            self._sumar_items(items)
+            self._marcas = {"ventas": marca_v, "ventas_items": marca_i}
+        return self
+
+    def _sumar_ventas(self, nuevas):
+        if nuevas.empty: return
+        fechas = fechas_de_venta(nuevas)
+        cab = pd.DataFrame({
+            "Dia": fechas.dt.normalize(),
+            "Mes": fechas.dt.strftime("%Y-%m"),
+            "Cliente": nuevas["Cliente"].fillna("").astype(str).str.strip(),
+            "Tipo": nuevas["Tipo"].fillna("").astype(str) if "Tipo" in nuevas.columns else "",
+            "Ventas": 1,
+            "Facturacion": pd.to_numeric(nuevas["Total"], errors="coerce").fillna(0.0),
+        })
+        self._sumar("cliente", cab)
+        self._sumar("tipo", cab)
+        self._dias.update(zip(nuevas["ID"].astype(str), cab["Dia"]))
+
+    def _sumar_items(self, nuevos):
+        if nuevos.empty:
+            self._pendientes = None
+            return
+        ids = nuevos["ID_Venta"].astype(str)
+        conocidos = np.fromiter((i in self._dias for i in ids), dtype=bool, count=len(ids))
+        self._pendientes = nuevos[~conocidos] if not conocidos.all() else None
+        nuevos, ids = nuevos[conocidos], ids[conocidos]
+        costo = nuevos["Cantidad"] * nuevos["Costo"]
+        self._sumar("producto", pd.DataFrame({
+            "Dia": [self._dias[i] for i in ids],
+            "Codigo": nuevos["Codigo"].astype(str).to_numpy(),
+            "Producto": nuevos["Producto"].astype(str).to_numpy(),
+            "Unidades": nuevos["Cantidad"].to_numpy(),
+            "Facturacion": nuevos["Subtotal"].to_numpy(),
+            "Margen": (nuevos["Subtotal"] - costo).where(costo.notna(), 0.0).to_numpy(),
+        }))
+
+    def tabla(self, nombre, desde=None, hasta=None):
+        """Agregado `nombre` como DataFrame plano, opcionalmente entre dos fechas (o meses)."""
+        with self._lock:
+            df = self._vistas.get(nombre)
+            if df is None:
+                filas = [(*clave, *valores) for clave, valores in self._tablas[nombre].items()]
+                df = pd.DataFrame(filas, columns=CLAVES[nombre] + VALORES[nombre]).sort_values(CLAVES[nombre], ignore_index=True)
+                self._vistas[nombre] = df
+        tiempo = CLAVES[nombre][0]
+        convertir = (lambda f: pd.Timestamp(f).strftime("%Y-%m")) if tiempo == "Mes" else pd.Timestamp
+        if desde is not None: df = df[df[tiempo] >= convertir(desde)]
+        if hasta is not None: df = df[df[tiempo] <= convertir(hasta)]
+        return df.reset_index(drop=True)
+
+    def por_producto(self, desde=None, hasta=None):
+        """Unidades, facturación y margen de cada producto en el período (sin fechas, todo)."""
+        return (self.tabla("producto", desde, hasta).groupby(["Codigo", "Producto"], as_index=False)[VALORES["producto"]].sum()
+                .sort_values("Facturacion", ascending=False, ignore_index=True))
+
+_RESUMENES = {"version": None, "resumenes": Resumenes()}
+
+def resumenes():
+    """Resúmenes al día; solo procesa algo si cambiaron las ventas o los renglones."""
+    b = backend()
+    version = (b.version("ventas"), b.version("ventas_items"))
+    if None in version or _RESUMENES["version"] != version:
+        _RESUMENES["resumenes"].al_dia(b)
+        _RESUMENES["version"] = version
+    return _RESUMENES["resumenes"]
@@ -0,0 +1,286 @@
+import argparse
+import gzip
+import io
+import ipaddress
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+from urllib.request import Request, urlopen
+
+from almacen import (
+    REGISTRO, DELTA_EDICION, backend, movimiento, celdas_fijadas, instancia, leer_sincro, guardar_sincro, sin_operaciones,
+)
+from catalogo import indice_catalogo, normalizar_codigo, normalizar_texto
+from datos import SINCRO_FILE, bloqueo
+
+# SINCRONIZACIÓN ENTRE INSTANCIAS
+# La instancia local (sin internet) y la de la nube se ponen al día intercambiando
+# solo las operaciones del registro (almacen.REGISTRO) que la otra no tiene: cada
+# punta dice su vector (origen → último Seq) y recibe, por origen, lo que viene
+# después. El trabajo es proporcional a lo que cambió desde la última vez, no al
+# tamaño de la base. Aplicar es idempotente (lo ya visto se saltea) y:
+#   - las diferencias de stock (Cantidad y Reservado, también las editadas en la
+#     grilla) se suman, así el orden de llegada no importa;
+#   - un valor fijado (precio, nombre, mínimo) lo gana la operación más nueva (Fecha
+#     UTC, después Origen y Seq), igual en las dos puntas;
+#   - ventas, renglones, producción, compras y acopios se agregan a su ledger.
+# Las dos carpetas tienen que partir de los mismos datos, pero cada una con su propio
+# SINCRO_FILE (es su identidad: no copiarlo). Transporte: un paquete .jsonl.gz
+# (exportar / importar, también desde el panel Admin) o HTTP (`servir` en una punta y
+# `sincronizar URL` en la otra).
+FORMATO = "alambrados-sincro/1"
+PUERTO = 8765
+TOKEN = os.environ.get("ALAMBRADOS_SINCRO_TOKEN")  # si está, el servidor lo exige en X-Token
+
+def vector():
+    return dict(REGISTRO.al_dia(backend()).vector)
+
+def pares():
+    """Lo último que se sabe que tiene cada par: id → vector."""
+    return leer_sincro().get("pares", {})
+
+def recordar_par(par, vector_par):
+    with bloqueo(SINCRO_FILE):
+        estado = leer_sincro()
+        previo = estado.setdefault("pares", {}).get(par, {})
+        estado["pares"][par] = {o: max(int(s), int(previo.get(o, 0))) for o, s in {**previo, **vector_par}.items()}
+        guardar_sincro(estado)
+
+# PAQUETES
+def exportar(vector_par=None):
+    """Paquete (bytes) con las operaciones que no tiene un par con `vector_par` (None = todas)."""
+    b = backend()
+    with b.transaccion():  # vector y operaciones de la misma foto
+        reg = REGISTRO.al_dia(b)
+        ops = reg.desde(vector_par or {})
+        cabecera = {"formato": FORMATO, "instancia": instancia(), "vector": dict(reg.vector), "operaciones": len(ops)}
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb") as gz:
+        for linea in [cabecera] + ops: gz.write((json.dumps(linea, ensure_ascii=False) + "\n").encode("utf-8"))
+    return buf.getvalue()
+
+def leer_paquete(datos):
+    try: lineas = gzip.decompress(datos).decode("utf-8").splitlines()
+    except (OSError, UnicodeDecodeError, EOFError) as e: raise ValueError(f"Paquete ilegible: {e}")
+    cabecera = json.loads(lineas[0]) if lineas else {}
+    if cabecera.get("formato") != FORMATO: raise ValueError("No es un paquete de sincronización.")
+    return cabecera, [json.loads(l) for l in lineas[1:] if l.strip()]
+
+def importar(datos):
+    """Aplica un paquete y recuerda el vector de quien lo mandó. Devuelve el resumen de `aplicar`."""
+    cabecera, ops = leer_paquete(datos)
+    if cabecera["instancia"] == instancia():
+        raise ValueError(f"El paquete es de esta misma instancia (¿se copió {SINCRO_FILE} de una carpeta a la otra?).")
+    resumen = aplicar(ops)
+    recordar_par(cabecera["instancia"], cabecera["vector"])
+    return {**resumen, "de": cabecera["instancia"]}
+
+# APLICAR
+def _sin_fijar_viejos(ultimo, movs, marca):
+    """Saca de cada movimiento los valores que una operación más nueva ya fijó."""
+    for m in movs:
+        clave = (normalizar_codigo(m["Codigo"]), normalizar_texto(m["Producto"]))
+        m["fijar"] = {c: v for c, v in m["fijar"].items() if ultimo((*clave, c)) < marca}
+    return [m for m in movs if m["delta"] or m["fijar"]]
+
+def _buscar(stock, indice, codigo, producto):
+    """Fila con ese código y ese nombre (no alcanza con el código: puede ser otro producto)."""
+    f = indice.buscar_item(codigo, producto)
+    return f if f is not None and normalizar_texto(stock.at[f, "Producto"]) == normalizar_texto(producto) else None
+
+def _altas(b, filas):
+    stock = b.cargar_stock()
+    indice = indice_catalogo(stock, b.version("stock"))
+    nuevas = [f for f in filas if _buscar(stock, indice, f["Codigo"], f["Producto"]) is None]
+    if nuevas: b.agregar_productos(nuevas)
+
+def _bajas(b, bajas, origen):
+    stock = b.cargar_stock()
+    indice = indice_catalogo(stock, b.version("stock"))
+    filas = [f for f in (_buscar(stock, indice, x["Codigo"], x["Producto"]) for x in bajas) if f is not None]
+    if filas: b.editar_stock([], [], [{"fila": f, **stock.loc[f].to_dict()} for f in filas], origen=f"sincro:{origen}")
+
+def _movimientos_edicion(cambios):
+    movs = []
+    for c in cambios:
+        if c["Columna"] in DELTA_EDICION:
+            movs.append(movimiento(c["Codigo"], c["Producto"], delta={c["Columna"]: float(c["Despues"]) - float(c["Antes"])}))
+        else: movs.append(movimiento(c["Codigo"], c["Producto"], fijar={c["Columna"]: c["Despues"]}))
+    return movs
+
+def _aplicar_op(b, op, datos, ultimo):
+    """Repite una operación ajena salvo sus movimientos de stock, que devuelve para aplicar después."""
+    movs = []
+    if op["Tipo"] == "anexar": b.anexar(datos["tabla"], datos["filas"])
+    elif op["Tipo"] == "alta": _altas(b, datos)
+    elif op["Tipo"] == "stock": movs = [movimiento(m["Codigo"], m["Producto"], m.get("delta"), m.get("fijar")) for m in datos]
+    elif op["Tipo"] == "edicion":
+        movs = _movimientos_edicion(datos["cambios"])
+        if datos["altas"]: _altas(b, datos["altas"])
+        if datos["bajas"]: _bajas(b, datos["bajas"], op["Origen"])
+    else: raise ValueError(f"Operación desconocida: {op['Tipo']}")
+    return _sin_fijar_viejos(ultimo, movs, (op["Fecha"], op["Origen"], int(op["Seq"])))
+
+def aplicar(ops):
+    """Aplica en orden las operaciones que todavía no están, en una transacción.
+
+    Los movimientos de stock seguidos se juntan en una sola escritura (las diferencias
+    conmutan y lo fijado ya viene filtrado por marca). Las demás operaciones escriben por
+    su cuenta, así que se anotan en el registro apenas terminan: en CSV no hay rollback
+    y un corte a mitad del paquete no debe dejar filas sin su operación (reimportar las
+    duplicaría). Devuelve {"aplicadas", "repetidas", "sin_producto", "huecos"};
+    un hueco (falta una operación anterior de ese origen) corta ese origen: hay que
+    pedir el paquete completo.
+    """
+    b = backend()
+    resumen = {"aplicadas": 0, "repetidas": 0, "sin_producto": [], "huecos": []}
+    with b.transaccion(), sin_operaciones():
+        reg = REGISTRO.al_dia(b)
+        vistos, marcas = dict(reg.vector), {}  # lo de este paquete todavía no está en el registro
+        ultimo = lambda celda: max(reg.ultimo.get(celda, ("",)), marcas.get(celda, ("",)))
+        movs, hechas = [], []
+
+        def grabar():
+            faltantes = b.mover_stock(movs) if movs else []
+            resumen["sin_producto"] += [f"[{m['Codigo']}] {m['Producto']}" for m in faltantes]
+            reg.anexar(b, hechas)
+            movs.clear()
+            hechas.clear()
+
+        for op in ops:
+            origen, seq = str(op["Origen"]), int(op["Seq"])
+            if seq <= vistos.get(origen, 0):
+                resumen["repetidas"] += 1
+                continue
+            if seq != vistos.get(origen, 0) + 1:
+                if origen not in resumen["huecos"]: resumen["huecos"].append(origen)
+                continue
+            datos = json.loads(op["Datos"])
+            suelta = op["Tipo"] != "stock"
+            if suelta: grabar()
+            movs += _aplicar_op(b, op, datos, ultimo)
+            marca = (op["Fecha"], origen, seq)
+            for celda in celdas_fijadas(op["Tipo"], datos): marcas[celda] = max(marcas.get(celda, ("",)), marca)
+            vistos[origen] = seq
+            hechas.append(op)
+            resumen["aplicadas"] += 1
+            if suelta: grabar()
+        grabar()
+    return resumen
+
+# HTTP
+class _Manejador(BaseHTTPRequestHandler):
+    """GET /vector, GET /operaciones?vector=JSON (paquete) y POST /operaciones (importar)."""
+    def _responder(self, codigo, cuerpo, tipo="application/json"):
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _autorizado(self):
+        if TOKEN and self.headers.get("X-Token") != TOKEN:
+            self._responder(403, b'{"error": "token"}')
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._autorizado(): return
+        url = urlparse(self.path)
+        if url.path == "/vector":
+            self._responder(200, json.dumps({"instancia": instancia(), "vector": vector()}).encode("utf-8"))
+        elif url.path == "/operaciones":
+            self._responder(200, exportar(json.loads(parse_qs(url.query).get("vector", ["{}"])[0])), "application/gzip")
+        else: self._responder(404, b"{}")
+
+    def do_POST(self):
+        if not self._autorizado(): return
+        if urlparse(self.path).path != "/operaciones": return self._responder(404, b"{}")
+        try: resumen = importar(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError as e: return self._responder(400, json.dumps({"error": str(e)}).encode("utf-8"))
+        self._responder(200, json.dumps(resumen).encode("utf-8"))
+
+def _local(host):
+    try: return ipaddress.ip_address(host).is_loopback
+    except ValueError: return host == "localhost"
+
+def servidor(host="127.0.0.1", puerto=PUERTO):
+    """Fuera de esta PC solo con token: sin él cualquiera de la red podría importar operaciones."""
+    if not TOKEN and not _local(host):
+        raise ValueError(f"Para atender en {host} hace falta la variable ALAMBRADOS_SINCRO_TOKEN.")
+    return HTTPServer((host, puerto), _Manejador)
+
+def servir(host="127.0.0.1", puerto=PUERTO):
+    servidor(host, puerto).serve_forever()
+
+def _pedir(url, datos=None):
+    pedido = Request(url, data=datos, headers={"X-Token": TOKEN} if TOKEN else {}, method="GET" if datos is None else "POST")
+    with urlopen(pedido, timeout=60) as r: return r.read()
+
+def sincronizar(url):
+    """Manda lo que le falta al servidor y trae lo que le falta a esta instancia.
+    Devuelve (resumen del servidor, resumen local)."""
+    url = url.rstrip("/")
+    remoto = json.loads(_pedir(f"{url}/vector"))
+    enviado = json.loads(_pedir(f"{url}/operaciones", exportar(remoto["vector"])))
+    recibido = importar(_pedir(f"{url}/operaciones?vector={quote(json.dumps(vector()))}"))
+    return enviado, recibido
+
+# LÍNEA DE COMANDOS
+def _mostrar(resumen, titulo):
+    print(f"{titulo}: {resumen['aplicadas']} operación(es) aplicadas, {resumen['repetidas']} ya estaban.")
+    for p in resumen["sin_producto"]: print(f"Sin producto en el stock: {p}", file=sys.stderr)
+    for o in resumen["huecos"]: print(f"Faltan operaciones de {o}: pedir un paquete completo (exportar sin --para).", file=sys.stderr)
+    return 1 if resumen["sin_producto"] or resumen["huecos"] else 0
+
+def main(argv=None):
+    comunes = argparse.ArgumentParser(add_help=False)
+    comunes.add_argument("--carpeta", help="carpeta de los datos (por defecto, la actual)")
+    p = argparse.ArgumentParser(description="Sincronización por operaciones entre dos instancias (local y nube).")
+    sub = p.add_subparsers(dest="comando", required=True)
+    sub.add_parser("estado", parents=[comunes], help="id de esta instancia, su vector y lo pendiente para cada par")
+    e = sub.add_parser("exportar", parents=[comunes], help="paquete con lo que le falta a un par")
+    e.add_argument("salida")
+    e.add_argument("--para", help="id del par (sin esto, todas las operaciones)")
+    i = sub.add_parser("importar", parents=[comunes], help="aplicar uno o más paquetes")
+    i.add_argument("paquetes", nargs="+")
+    s = sub.add_parser("servir", parents=[comunes], help="atender sincronizaciones por HTTP")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--puerto", type=int, default=PUERTO)
+    y = sub.add_parser("sincronizar", parents=[comunes], help="mandar y traer operaciones de `python sincro.py servir`")
+    y.add_argument("url")
+    args = p.parse_args(argv)
+
+    rutas = [os.path.abspath(r) for r in ([args.salida] if args.comando == "exportar" else getattr(args, "paquetes", []))]
+    if args.carpeta: os.chdir(args.carpeta)  # las rutas de datos.py son relativas
+    if args.comando == "estado":
+        print(f"Instancia: {instancia()}")
+        for origen, seq in vector().items(): print(f"  {origen}: {seq} operación(es)")
+        for par, v in pares().items(): print(f"Par {par}: {len(REGISTRO.desde(v))} operación(es) pendientes de mandar")
+        return 0
+    if args.comando == "exportar":
+        if args.para and args.para not in pares(): print(f"Par desconocido {args.para}: se exporta todo.", file=sys.stderr)
+        datos = exportar(pares().get(args.para) if args.para else None)
+        with open(rutas[0], "wb") as f: f.write(datos)
+        print(f"{leer_paquete(datos)[0]['operaciones']} operación(es) en {rutas[0]}")
+        return 0
+    if args.comando == "importar":
+        codigo = 0
+        for ruta in rutas:
+            with open(ruta, "rb") as f: codigo |= _mostrar(importar(f.read()), os.path.basename(ruta))
+        return codigo
+    if args.comando == "servir":
+        try: http = servidor(args.host, args.puerto)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        print(f"Sincronización en http://{args.host}:{args.puerto} (instancia {instancia()})")
+        http.serve_forever()
+        return 0
+    enviado, recibido = sincronizar(args.url)
+    return _mostrar(enviado, "Enviadas") | _mostrar(recibido, "Recibidas")
+
+if __name__ == "__main__":
+    sys.exit(main())
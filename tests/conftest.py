@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import almacen
+import datos
+
+def _reiniciar():
+    datos._CACHE.clear()
+    datos._LEDGER.clear()
+    almacen._BACKEND.clear()
+    almacen._INSTANCIA.update(version=None, id=None)
+    almacen.REGISTRO.reiniciar()
+    for modulo, nombre in [("catalogo", "_INDICE_CACHE"), ("precios", "_HISTORIAL"), ("compras", "_COSTOS"),
+                           ("acopios", "_ACOPIOS"), ("ventas", "_MIGRACION"), ("ventas", "_INDICE_VENTAS"), ("ventas", "_RENGLONES"), ("resumenes", "_RESUMENES")]:
+        getattr(__import__(modulo), nombre)["version"] = None
+    __import__("acopios")._ACOPIOS["acopios"].reiniciar()
+    __import__("compras")._COSTOS["costos"].reiniciar()
+    __import__("resumenes")._RESUMENES["resumenes"].reiniciar()
+    __import__("ventas")._RENGLONES["renglones"].reiniciar()
+
+@pytest.fixture
+def mudarse(monkeypatch):
+    """Pasa a otra carpeta de datos (otra instancia) con las cachés de módulo en cero."""
+    def mudarse(ruta):
+        monkeypatch.chdir(ruta)
+        _reiniciar()
+    return mudarse
+
+@pytest.fixture
+def carpeta(tmp_path, mudarse):
+    """Carpeta de datos vacía (las rutas de datos.py son relativas) y cachés de módulo en cero."""
+    mudarse(tmp_path)
+    return tmp_path
+
+def producto(codigo, nombre, **valores):
+    return {"Codigo": codigo, "Producto": nombre, "Cantidad": 0.0, "Reservado": 0.0, "Unidad": "un.",
+            "Precio Costo": 0.0, "Precio Venta": 0.0, "Stock Minimo": 0.0, **valores}
+
+@pytest.fixture
+def stock(carpeta):
+    """Stock con un código repetido ('2') como en el catálogo real."""
+    datos.guardar_csv(datos.pd.DataFrame([
+        producto("2", "CONCERTINA SIMPLE", Cantidad=5.0, **{"Precio Costo": 100.0, "Precio Venta": 200.0}),
+        producto("2", "ESQUINERO RECTO", Cantidad=1.0, **{"Precio Costo": 1000.0, "Precio Venta": 3000.0}),
+        producto("27", "POSTE OLIMPICO", Cantidad=10.0, **{"Precio Costo": 50.0, "Precio Venta": 90.0}),
+    ], columns=datos.COLS_STOCK), datos.STOCK_FILE)
+    b = almacen.backend()
+    return b.cargar_stock()
@@ -0,0 +1,55 @@
+import pytest
+
+from acopios import acopios, conciliar_reservado, diferencias_reservado, entregar, entregar_todo
+from almacen import backend, movimiento
+from catalogo import indice_catalogo
+from datos import ahora_arg
+from ventas import confirmar_venta
+
+def _acopiar(id_venta, cliente, items):
+    venta = {"ID": id_venta, "Fecha": ahora_arg().strftime("%d/%m/%Y %H:%M"), "Cliente": cliente, "Total": 0.0,
+             "Tipo": "Dejar en Acopio", "Detalle": ""}
+    confirmar_venta(venta, [{"Codigo": c, "Producto": p, "Cantidad": n, "Precio": 1.0, "Subtotal": n} for c, p, n in items])
+
+def _stock():
+    return backend().cargar_stock().set_index("Producto")[["Cantidad", "Reservado"]]
+
+def test_retiro_parcial_y_total(stock):
+    _acopiar("v1", "Perez", [("2", "ESQUINERO RECTO", 1), ("2", "CONCERTINA SIMPLE", 4)])
+    _acopiar("v2", "Gomez", [("2", "CONCERTINA SIMPLE", 1)])
+    st = _stock()
+    assert st.at["CONCERTINA SIMPLE", "Reservado"] == 5 and st.at["CONCERTINA SIMPLE", "Cantidad"] == 5
+    assert acopios().clientes() == ["Gomez", "Perez"]
+
+    # Parcial, con un retiro de más que se recorta a lo pendiente y otro sin nada pendiente.
+    rechazadas, faltantes = entregar([{"ID_Venta": "v1", "Codigo": "2", "Producto": "CONCERTINA SIMPLE", "Cantidad": 3},
+                                      {"ID_Venta": "v1", "Codigo": "2", "Producto": "CONCERTINA SIMPLE", "Cantidad": 5},
+                                      {"ID_Venta": "v1", "Codigo": "2", "Producto": "CONCERTINA SIMPLE", "Cantidad": 1}])
+    assert len(rechazadas) == 1 and faltantes == []
+    st = _stock()
+    assert st.at["CONCERTINA SIMPLE", "Reservado"] == 1 and st.at["CONCERTINA SIMPLE", "Cantidad"] == 1
+    assert st.at["ESQUINERO RECTO", "Reservado"] == 1  # mismo código, otro producto: no se toca
+    assert acopios().pendientes(id_venta="v1")["Producto"].tolist() == ["ESQUINERO RECTO"]
+
+    # Total de una venta: solo lo de esa venta.
+    entregados, faltantes = entregar_todo(id_venta="v1")
+    assert [e["Producto"] for e in entregados] == ["ESQUINERO RECTO"] and faltantes == []
+    st = _stock()
+    assert st.at["ESQUINERO RECTO", "Reservado"] == 0 and st.at["ESQUINERO RECTO", "Cantidad"] == 0
+    assert st.at["CONCERTINA SIMPLE", "Reservado"] == 1
+    assert acopios().clientes() == ["Gomez"]
+    assert entregar_todo(id_venta="v1") == ([], [])
+
+    entregar_todo(cliente="GOMEZ")
+    assert acopios().pendientes().empty
+    assert _stock()["Reservado"].tolist() == [0, 0, 0]
+
+def test_conciliar_reservado(stock):
+    _acopiar("v1", "Perez", [("2", "ESQUINERO RECTO", 1)])
+    b = backend()
+    b.mover_stock([movimiento("2", "CONCERTINA SIMPLE", fijar={"Reservado": 2.0})])
+    st = b.cargar_stock()
+    dif = diferencias_reservado(st, indice_catalogo(st, b.version("stock")))
+    assert dif["Producto"].tolist() == ["CONCERTINA SIMPLE"] and dif["Diferencia"].tolist() == [pytest.approx(2.0)]
+    assert conciliar_reservado() == 1
+    assert _stock()["Reservado"].to_dict() == {"CONCERTINA SIMPLE": 0, "ESQUINERO RECTO": 1, "POSTE OLIMPICO": 0}
@@ -0,0 +1,31 @@
+from datetime import datetime
+import pytest
+
+import almacen
+from almacen import backend, movimiento
+
+def _poste(b):
+    s = b.cargar_stock()
+    return float(s.loc[s["Producto"] == "POSTE OLIMPICO", "Cantidad"].iat[0])
+
+def test_sqlite_rollback_no_deja_filas_en_cache(stock, monkeypatch):
+    monkeypatch.setattr(almacen, "BACKEND", "sqlite")
+    almacen._BACKEND.clear()
+    b = backend()
+    assert b.nombre == "sqlite" and _poste(b) == 10.0
+    with pytest.raises(RuntimeError):
+        with b.transaccion():
+            b.mover_stock([movimiento("27", "POSTE OLIMPICO", delta={"Cantidad": 5})])
+            assert _poste(b) == 15.0  # la transacción ve lo suyo
+            raise RuntimeError("corte")
+    b.mover_stock([movimiento("27", "POSTE OLIMPICO", delta={"Cantidad": 1})])  # llega a la versión revertida
+    assert _poste(b) == 11.0
+
+def test_auditoria_con_hora_argentina(stock, monkeypatch):
+    monkeypatch.setattr(almacen, "ahora_arg", lambda: datetime(2026, 3, 1, 9, 30))
+    b = backend()
+    f = stock.index[stock["Producto"] == "POSTE OLIMPICO"][0]
+    assert b.editar_stock([{"fila": f, "Codigo": "27", "Producto": "POSTE OLIMPICO",
+                            "antes": {"Precio Venta": 90.0}, "despues": {"Precio Venta": 95.0}}], origen="cli") == []
+    aud = b.cargar("auditoria")
+    assert aud[["Fecha", "Origen", "Columna"]].values.tolist() == [["01/03/2026 09:30", "cli", "Precio Venta"]]
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from catalogo import IndiceBusqueda, IndiceCatalogo, indice_catalogo
+
+def _catalogo():
+    return pd.DataFrame({"Codigo": ["10", "101", "7", "8"],
+                         "Producto": ["PORTÓN 3.00", "PORTÓN 4.00", "ALAMBRE PÚA", "TEJIDO ROMBOIDAL"]},
+                        index=[4, 9, 12, 15])
+
+def test_buscar_sin_acentos_por_prefijo_y_codigo():
+    indice = IndiceBusqueda().sincronizar(_catalogo())
+    assert indice.buscar("porton 3") == [4]
+    assert indice.buscar("PUA") == [12]
+    assert indice.buscar("10") == [4, 9]  # código exacto antes que prefijo
+    assert indice.buscar("porton", limite=1) == [4]
+    assert indice.buscar("porton piedra") == []
+
+def test_buscar_con_errores_por_trigramas():
+    indice = IndiceBusqueda().sincronizar(_catalogo())
+    assert indice.buscar("romboidl") == [15]
+
+def test_sincronizar_sigue_los_cambios():
+    df = _catalogo()
+    indice = IndiceBusqueda().sincronizar(df)
+    df.loc[12, "Producto"] = "ALAMBRE LISO"
+    indice.sincronizar(df.drop(index=4))
+    assert indice.buscar("pua") == [] and indice.buscar("liso") == [12]
+    assert indice.buscar("porton") == [9]
+
+def test_indice_catalogo_con_codigo_repetido(stock):
+    indice = IndiceCatalogo(stock)
+    assert indice.buscar_codigo(" 2 ") == [0, 1] and indice.buscar_codigo("99") == []
+    assert indice.buscar_nombre("Poste  Olímpico") == [2]
+    assert indice.buscar_item("2", "esquinero recto") == 1
+    assert indice.buscar_item("2", "OTRO") is None  # código repetido: no se adivina
+    assert indice.buscar_item("27", "OTRO") == 2
+    codigos, repetidos = indice.mapa_codigos()
+    assert codigos.to_dict() == {"27": 2} and repetidos == {"2"}
+    assert indice.codigos_duplicados() == {"2": [0, 1]}
+
+def test_indice_catalogo_por_version(stock):
+    primero = indice_catalogo(stock, "v1")
+    assert indice_catalogo(stock.iloc[:1], "v1") is primero
+    assert indice_catalogo(stock.iloc[:1], "v2").buscar_codigo("27") == []
@@ -0,0 +1,24 @@
+import pytest
+
+import almacen
+from catalogo import indice_catalogo
+from compras import cargar_gastos, costos_compra, promedio_de_compras, registrar_compras
+
+def test_costo_del_stock_y_promedio_de_compras(stock):
+    registrar_compras([{"Codigo": "2", "Producto": "ESQUINERO RECTO", "Cantidad": 1, "Monto": 2000}], fecha="2026-01-01 10:00:00")
+    faltantes, costos = registrar_compras([{"Codigo": "2", "Producto": "ESQUINERO RECTO", "Cantidad": 2, "Monto": 3000},
+                                           {"Codigo": "2", "Producto": "NO EXISTE", "Cantidad": 1, "Monto": 10}], fecha="2026-02-01 10:00:00")
+    assert [f["Producto"] for f in faltantes] == ["NO EXISTE"]
+    b = almacen.backend()
+    st = b.cargar_stock().set_index("Producto")
+    # Costo del stock: promedio ponderado con lo que había en existencia.
+    assert st.at["ESQUINERO RECTO", "Cantidad"] == 4
+    assert st.at["ESQUINERO RECTO", "Precio Costo"] == pytest.approx((2 * 1500 + 3000) / 4)
+    assert st.at["CONCERTINA SIMPLE", "Precio Costo"] == 100  # mismo código, no se toca
+    # Promedio Compras: solo lo comprado.
+    assert promedio_de_compras(cargar_gastos())["Promedio Compras"].tolist() == pytest.approx([2000, 5000 / 3])
+    stock_ = b.cargar_stock()
+    fila = costos_compra().por_fila(indice_catalogo(stock_, b.version("stock")))
+    f = stock_.index[stock_["Producto"] == "ESQUINERO RECTO"][0]
+    assert fila.at[f, "Promedio Compras"] == pytest.approx(5000 / 3)
+    assert fila.at[f, "Ultimo Costo"] == pytest.approx(1500)
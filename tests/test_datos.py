@@ -0,0 +1,38 @@
+import pandas as pd
+
+from datos import COLS_PRODUCCION, PRODUCCION_FILE, anexar_filas, cargar_ledger, compactar, guardar_csv, leer_cacheado
+
+def _lote(id_, estado):
+    return {"ID": id_, "Fecha_Inicio": "2026-01-01", "Producto": "POSTE OLIMPICO", "Cantidad": 3,
+            "Fecha_Lista": "2026-01-29", "Estado": estado, "Codigo": "27"}
+
+def test_linea_cortada_se_ignora_y_se_recorta(carpeta):
+    anexar_filas(PRODUCCION_FILE, [_lote("p1", "En Proceso")], COLS_PRODUCCION, clave="ID")
+    with open(PRODUCCION_FILE, "ab") as f: f.write(b"p2,2026-01-01,POSTE")  # corte a mitad de un append
+    assert cargar_ledger(PRODUCCION_FILE, COLS_PRODUCCION, "ID")["ID"].tolist() == ["p1"]
+    anexar_filas(PRODUCCION_FILE, [_lote("p3", "En Proceso")], COLS_PRODUCCION, clave="ID")
+    assert cargar_ledger(PRODUCCION_FILE, COLS_PRODUCCION, "ID")["ID"].tolist() == ["p1", "p3"]
+    with open(PRODUCCION_FILE, "rb") as f: assert b"POSTE\np3" not in f.read()
+
+def test_compactar_deja_la_ultima_version(carpeta):
+    anexar_filas(PRODUCCION_FILE, [_lote("p1", "En Proceso"), _lote("p2", "En Proceso")], COLS_PRODUCCION, clave="ID")
+    anexar_filas(PRODUCCION_FILE, [_lote("p1", "Finalizado")], COLS_PRODUCCION, clave="ID")
+    antes = cargar_ledger(PRODUCCION_FILE, COLS_PRODUCCION, "ID")
+    assert antes[["ID", "Estado"]].values.tolist() == [["p1", "Finalizado"], ["p2", "En Proceso"]]
+    compactar(PRODUCCION_FILE, COLS_PRODUCCION, "ID")
+    with open(PRODUCCION_FILE, encoding="utf-8") as f: assert len(f.read().splitlines()) == 3
+    assert cargar_ledger(PRODUCCION_FILE, COLS_PRODUCCION, "ID").equals(antes)
+
+def test_leer_cacheado_parsea_una_vez_por_version(carpeta):
+    leidas = []
+    def _parsear_prueba(archivo):
+        leidas.append(archivo)
+        return pd.read_csv(archivo)
+    guardar_csv(pd.DataFrame({"A": [1, 2]}), "prueba.csv")
+    primera = leer_cacheado("prueba.csv", _parsear_prueba)
+    primera.loc[0, "A"] = 99  # es una copia: no ensucia la caché
+    assert leer_cacheado("prueba.csv", _parsear_prueba)["A"].tolist() == [1, 2] and len(leidas) == 1
+    with open("prueba.csv", "a") as f: f.write("3\n")  # otro proceso escribió
+    assert leer_cacheado("prueba.csv", _parsear_prueba)["A"].tolist() == [1, 2, 3] and len(leidas) == 2
+    guardar_csv(pd.DataFrame({"A": [4]}), "prueba.csv")
+    assert leer_cacheado("prueba.csv", _parsear_prueba)["A"].tolist() == [4] and len(leidas) == 3
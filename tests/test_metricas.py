@@ -0,0 +1,29 @@
+import json
+from collections import deque
+
+import pandas as pd
+
+import metricas
+from datos import cargar_general, guardar_csv
+
+def test_corrida_suma_secciones_e_io(carpeta, monkeypatch):
+    monkeypatch.setattr(metricas, "ACTIVO", True)
+    monkeypatch.setattr(metricas, "_HISTORIAL", deque(maxlen=metricas.VENTANA))
+    with metricas.seccion("afuera"): pass  # sin corrida no se anota nada
+
+    primera = metricas.iniciar_corrida("prueba")
+    guardar_csv(pd.DataFrame({"A": range(100)}), "prueba.csv")
+    cargar_general("prueba.csv", ["A"])
+    cargar_general("prueba.csv", ["A"])  # de la caché: no lee de nuevo
+    segunda = metricas.iniciar_corrida("prueba", previa=primera)  # un st.rerun() dejó la anterior abierta
+    metricas.cerrar_corrida()
+
+    assert primera.segundos is not None and segunda.segundos is not None
+    assert [c.etiqueta for c in metricas.corridas()] == ["prueba", "prueba"]
+    llamadas, _, leidos, _ = primera.secciones["csv:leer"]
+    assert llamadas == 1 and leidos > 0 and primera.secciones["csv:escribir"][3] > 0
+    assert "afuera" not in primera.secciones
+    assert set(metricas.resumen()["Sección"]) == {"csv:leer", "csv:escribir"}
+    assert metricas.mas_lentas(1)["Total (ms)"].iloc[0] == max(primera.segundos, segunda.segundos) * 1000
+    assert metricas.exportar("metricas.jsonl") == 2
+    with open("metricas.jsonl", encoding="utf-8") as f: assert json.loads(f.readline())["etiqueta"] == "prueba"
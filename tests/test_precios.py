@@ -0,0 +1,62 @@
+import pandas as pd
+
+import precios
+from almacen import backend
+from catalogo import indice_catalogo
+from precios import HistorialPrecios, leer_lista, margen_por_venta, plan_aumento, plan_lista
+
+def _historial(filas):
+    return HistorialPrecios(pd.DataFrame(filas, columns=["Fecha", "Codigo", "Producto", "Precio Costo", "Precio Venta"]))
+
+HISTORIAL = [
+    ("2026-01-01 10:00:00", "2", "CONCERTINA SIMPLE", 100.0, 200.0),
+    ("2026-01-01 10:00:00", "2", "ESQUINERO RECTO", 1000.0, 3000.0),
+    ("2026-02-01 10:00:00", "2", "ESQUINERO RECTO", 1200.0, 3500.0),
+    ("2026-03-01 10:00:00", "2", "CONCERTINA SIMPLE", 150.0, 250.0),
+    ("2026-01-01 10:00:00", "27", "POSTE OLIMPICO", 50.0, 90.0),
+]
+
+def test_precio_con_codigo_repetido():
+    hist = _historial(HISTORIAL)
+    assert hist.precio("2", "Concertina  simple", "2026-02-15") == (100.0, 200.0)
+    assert hist.precio("2", "ESQUINERO RECTO", "2026-02-15") == (1200.0, 3500.0)
+    assert hist.precio("2", "ESQUINERO RECTO", "2025-12-31") is None
+    assert hist.precio("27", "POSTE RENOMBRADO", "2026-02-15") == (50.0, 90.0)  # código único: vale aunque cambie el nombre
+    assert hist.precio("2", "OTRO", "2026-02-15") is None  # código repetido y nombre desconocido: no adivina
+    assert hist.serie("2", "ESQUINERO RECTO")["Precio Costo"].tolist() == [1000.0, 1200.0]
+    assert len(hist.serie("2")) == 4
+
+def test_al_dia_con_codigo_repetido():
+    hist = _historial(HISTORIAL)
+    precios = hist.al_dia(["2", "2", "2", "27", "2"], ["CONCERTINA SIMPLE", "ESQUINERO RECTO", "CONCERTINA SIMPLE", "POSTE OLIMPICO", "OTRO"],
+                          pd.to_datetime(["2026-02-15", "2026-02-15", "2026-03-15", "2026-02-15", "2026-02-15"]))
+    assert precios["Precio Costo"].tolist()[:4] == [100.0, 1200.0, 150.0, 50.0]
+    assert pd.isna(precios["Precio Costo"].iat[4])
+
+def test_margen_con_historial_vacio_no_lo_recarga(monkeypatch):
+    import precios
+    monkeypatch.setattr(precios, "historial_precios", lambda: (_ for _ in ()).throw(AssertionError("recargó el historial")))
+    ventas = pd.DataFrame({"ID": ["v1"], "Fecha": ["15/02/2026 10:00"], "Cliente": ["A"], "Total": [300.0]})
+    items = pd.DataFrame({"ID_Venta": ["v1"], "Codigo": ["2"], "Producto": ["ESQUINERO RECTO"], "Cantidad": [1.0],
+                          "Precio": [300.0], "Subtotal": [300.0], "Costo": [float("nan")]})
+    r = margen_por_venta(ventas, items, _historial([]))
+    assert r.loc[0, "Sin Costo"] == 1 and r.loc[0, "Margen"] == 0.0
+
+def test_plan_aumento_por_categoria(stock):
+    plan = plan_aumento(stock, 10, por_categoria={"Poste": 50}, solo=["poste", "ESQUINERO"], redondeo=100)
+    assert plan[["Producto", "Antes", "Despues"]].values.tolist() == [["ESQUINERO RECTO", 3000.0, 3300.0], ["POSTE OLIMPICO", 90.0, 100.0]]
+    assert plan_aumento(stock, 0).empty
+
+def test_lista_de_proveedor_por_codigo(stock, tmp_path):
+    ruta = tmp_path / "proveedor.csv"
+    ruta.write_text("Cód.;Precio\n27;$ 1.234,50\n2;99\n5;10\n8;\n", encoding="utf-8")
+    plan, no_encontrados, repetidos, sin_precio = plan_lista(stock, indice_catalogo(stock, None), leer_lista(str(ruta)), "Precio Costo")
+    assert plan[["Codigo", "Columna", "Despues"]].values.tolist() == [["27", "Precio Costo", 1234.5]]
+    assert (no_encontrados, repetidos, sin_precio) == (["5"], ["2"], ["8"])
+
+def test_linea_de_comandos_graba_solo_con_aplicar(stock, capsys):
+    assert precios.main(["aumento", "10", "--solo", "POSTE"]) == 0
+    assert backend().cargar_stock().set_index("Producto").at["POSTE OLIMPICO", "Precio Venta"] == 90.0
+    assert precios.main(["aumento", "10", "--solo", "POSTE", "--aplicar"]) == 0
+    assert backend().cargar_stock().set_index("Producto").at["POSTE OLIMPICO", "Precio Venta"] == 99.0
+    assert "1 cambio(s) grabados" in capsys.readouterr().out
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from almacen import backend
+from catalogo import indice_catalogo
+from datos import COLS_PRODUCCION, COLS_RECETAS
+from produccion import Recetas, consumo_de_lote, liberar_lotes, requerimientos
+
+def _lotes(*filas):
+    return pd.DataFrame([{"ID": f"p{i}", "Fecha_Inicio": "2026-01-01", "Producto": prod, "Cantidad": cant,
+                          "Fecha_Lista": "2026-01-29", "Estado": "En Proceso", "Codigo": cod}
+                         for i, (cod, prod, cant) in enumerate(filas)], columns=COLS_PRODUCCION)
+
+def test_liberar_lotes_con_codigo_repetido(stock):
+    indice = indice_catalogo(stock, backend().version("stock"))
+    lotes = _lotes(("2", "ESQUINERO RECTO", 4), ("2", "CONCERTINA SIMPLE", 1), ("27", "POSTE OLIMPICO", 3))
+    movs, finalizados, sin_producto = liberar_lotes(lotes, stock, indice)
+    assert sin_producto.empty
+    assert {(m["Producto"], m["delta"]["Cantidad"]) for m in movs} == {("ESQUINERO RECTO", 4.0), ("CONCERTINA SIMPLE", 1.0), ("POSTE OLIMPICO", 3.0)}
+    assert [f["Estado"] for f in finalizados] == ["Finalizado"] * 3
+
+def test_liberar_lotes_sin_codigo_y_sin_producto(stock):
+    indice = indice_catalogo(stock, backend().version("stock"))
+    lotes = _lotes(("", "Poste Olímpico", 2), ("9", "NO EXISTE", 1))
+    movs, finalizados, sin_producto = liberar_lotes(lotes, stock, indice)
+    assert [(m["Codigo"], m["delta"]["Cantidad"]) for m in movs] == [("27", 2.0)]
+    assert finalizados[0]["Codigo"] == "27"
+    assert sin_producto["Producto"].tolist() == ["NO EXISTE"]
+
+def _recetas(*filas):
+    return Recetas(pd.DataFrame(filas, columns=COLS_RECETAS))
+
+def test_recetas_validan_y_suman_insumos():
+    rec = _recetas(("Poste Olímpico", "Esquinero recto", "0,5"), ("POSTE OLIMPICO", "Concertina simple", "2"),
+                   ("", "", ""), ("Poste Olímpico", "", "1"), ("Otro", "Cemento", "cero"),
+                   ("poste olimpico", "ESQUINERO RECTO", "0.5"))
+    assert rec.invalidas.values.tolist() == [[5, "sin insumo"], [6, "cantidad inválida"]]  # la fila en blanco no cuenta
+    assert rec.tiene("poste olimpico") and not rec.tiene("Otro")
+    req = rec.explotar({"Poste Olimpico": 3, "Sin Receta": 10})
+    assert req[["Insumo", "Requerido"]].values.tolist() == [["Concertina simple", 6.0], ["Esquinero recto", 3.0]]
+
+def test_consumo_de_lote_contra_el_stock(stock):
+    indice = indice_catalogo(stock, backend().version("stock"))
+    rec = _recetas(("Poste Olímpico", "Esquinero Recto", "2"), ("Poste Olímpico", "Cemento", "0.1"))
+    req = requerimientos({"POSTE OLIMPICO": 1}, stock, indice, rec).set_index("Insumo")
+    assert req.loc["Esquinero Recto", ["Codigo", "En Stock", "Faltante"]].tolist() == ["2", 1.0, 1.0]
+    movs, sin_stock = consumo_de_lote("POSTE OLIMPICO", 1, stock, indice, rec)
+    assert [(m["Producto"], m["delta"]["Cantidad"]) for m in movs] == [("ESQUINERO RECTO", -2.0)]
+    assert sin_stock == ["Cemento"]
@@ -0,0 +1,49 @@
+import os
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+
+import reportes
+
+def test_excel_se_arma_una_vez_por_version(carpeta):
+    llamadas = []
+    def hojas():
+        llamadas.append(1)
+        return {"Stock": pd.DataFrame({"Codigo": ["2", "27"], "Cantidad": [5.0, None]})}
+    ruta = reportes.excel_cacheado("prueba", 1, hojas)
+    assert reportes.excel_cacheado("prueba", 1, hojas) == ruta and len(llamadas) == 1
+    assert reportes.leer_excel("prueba", 1, hojas)[:2] == b"PK" and len(llamadas) == 1
+    nueva = reportes.excel_cacheado("prueba", 2, hojas)
+    assert nueva != ruta and not os.path.exists(ruta) and len(llamadas) == 2
+    reportes.excel_cacheado("prueba", (2, None), hojas)  # falta un archivo: no se cachea
+    reportes.excel_cacheado("prueba", (2, None), hojas)
+    assert len(llamadas) == 4
+    os.remove(reportes._EXCEL_CACHE.pop("prueba")[1])
+
+def test_pdf_en_lru_por_contenido(monkeypatch):
+    generados = []
+    monkeypatch.setattr(reportes, "generar_pdf", lambda *args: generados.append(args) or repr(args).encode())
+    monkeypatch.setattr(reportes, "_PDF_CACHE", reportes.OrderedDict())
+    monkeypatch.setattr(reportes, "PDF_CACHE_MAX", 2)
+    monkeypatch.setattr(reportes, "ahora_arg", lambda: datetime(2026, 1, 1, 10, 30))  # la clave lleva el minuto
+    items = [{"Codigo": "27", "Producto": "POSTE OLIMPICO", "Cantidad": 2, "Precio": 90, "Subtotal": 180}]
+    primero = reportes.pdf_cacheado("A", items, 180)
+    assert reportes.pdf_cacheado("A", [dict(i) for i in items], 180) == primero and len(generados) == 1
+    reportes.pdf_cacheado("B", items, 180)
+    reportes.pdf_cacheado("C", items, 180)  # desaloja el más viejo
+    assert len(reportes._PDF_CACHE) == 2
+    reportes.pdf_cacheado("A", items, 180)
+    assert len(generados) == 4
+
+def test_exportar_comprobantes_zip_y_pdf():
+    items = [{"Codigo": "27", "Producto": "POSTE OLIMPICO", "Cantidad": 2, "Precio": 90, "Subtotal": 180}]
+    comprobantes = [{"ID": f"v{n}", "Fecha": "01/01/2026 10:30", "Cliente": f"Cliente {n}", "Total": 180, "Tipo": "", "Items": items}
+                    for n in range(3)]
+    avances = []
+    with zipfile.ZipFile(reportes.exportar_comprobantes(comprobantes, progreso=lambda n, t: avances.append((n, t)), procesos=1)) as zf:
+        assert zf.namelist() == [reportes.nombre_comprobante(c, n) for n, c in enumerate(comprobantes, 1)]
+        assert all(zf.read(nombre).startswith(b"%PDF") for nombre in zf.namelist())
+    assert avances == [(1, 3), (2, 3), (3, 3)]
+    assert reportes.nombre_comprobante(comprobantes[0], 1) == "00001_01_01_2026_10_30_Cliente_0.pdf"
+    assert reportes.exportar_comprobantes(comprobantes, formato="pdf").read(4) == b"%PDF"
@@ -0,0 +1,21 @@
+from almacen import backend
+from catalogo import indice_catalogo
+from datos import ahora_arg
+from reposicion import velocidad_de_venta
+from ventas import confirmar_venta
+
+def _vender(id_venta, codigo, producto, cantidad):
+    venta = {"ID": id_venta, "Fecha": ahora_arg().strftime("%d/%m/%Y %H:%M"), "Cliente": "A", "Total": 0.0,
+             "Tipo": "Entrega Inmediata", "Detalle": ""}
+    confirmar_venta(venta, [{"Codigo": codigo, "Producto": producto, "Cantidad": cantidad, "Precio": 1.0, "Subtotal": cantidad}])
+
+def test_velocidad_con_codigo_repetido(stock):
+    _vender("v1", "2", "ESQUINERO RECTO", 30)
+    _vender("v2", "2", "CONCERTINA SIMPLE", 60)
+    _vender("v3", "27", "POSTE OLIMPICO", 3)
+    b = backend()
+    stock = b.cargar_stock()
+    indice = indice_catalogo(stock, b.version("stock"))
+    vel = velocidad_de_venta(indice, ahora_arg().date(), dias=30)
+    por_nombre = {stock.at[f, "Producto"]: v for f, v in vel.items()}
+    assert por_nombre == {"ESQUINERO RECTO": 1.0, "CONCERTINA SIMPLE": 2.0, "POSTE OLIMPICO": 0.1}
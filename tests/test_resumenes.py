@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+import almacen
+import datos
+from resumenes import CLAVES, Resumenes, resumenes
+from ventas import confirmar_venta
+
+def _vender(id_venta, fecha, cliente, tipo, items):
+    total = float(sum(n * p for _, _, n, p in items))
+    venta = {"ID": id_venta, "Fecha": fecha, "Cliente": cliente, "Total": total, "Tipo": tipo, "Detalle": ""}
+    confirmar_venta(venta, [{"Codigo": c, "Producto": pr, "Cantidad": n, "Precio": p, "Subtotal": n * p} for c, pr, n, p in items])
+
+def _igual(a, b):
+    for nombre, claves in CLAVES.items():
+        x = a.tabla(nombre).sort_values(claves, ignore_index=True)
+        y = b.tabla(nombre).sort_values(claves, ignore_index=True)
+        pd.testing.assert_frame_equal(x, y, check_dtype=False)
+
+@pytest.mark.parametrize("motor", ["csv", "sqlite"])
+def test_incremental_igual_a_rearmar(stock, monkeypatch, motor):
+    monkeypatch.setattr(almacen, "BACKEND", motor)
+    almacen._BACKEND.clear()
+    b = almacen.backend()
+    lecturas = []
+    original = b.cargar_desde
+    def cargar_desde(tabla, marca):
+        filas, nueva, completo = original(tabla, marca)
+        lecturas.append((tabla, len(filas), completo))
+        return filas, nueva, completo
+    monkeypatch.setattr(b, "cargar_desde", cargar_desde)
+
+    _vender("v1", "01/03/2026 10:00", "Perez", "Entrega Inmediata", [("2", "ESQUINERO RECTO", 1, 3000.0), ("27", "POSTE OLIMPICO", 2, 90.0)])
+    _vender("v2", "02/03/2026 11:00", "Gomez", "Dejar en Acopio", [("2", "CONCERTINA SIMPLE", 3, 200.0)])
+    r = resumenes()
+    _igual(r, Resumenes().rearmar(b.cargar("ventas"), b.cargar("ventas_items")))
+
+    lecturas.clear()
+    _vender("v3", "02/03/2026 12:00", "Perez", "Entrega Inmediata", [("27", "POSTE OLIMPICO", 1, 90.0)])
+    r = resumenes()
+    assert lecturas == [("ventas", 1, False), ("ventas_items", 1, False)]  # solo lo nuevo
+    _igual(r, Resumenes().rearmar(b.cargar("ventas"), b.cargar("ventas_items")))
+    producto = r.tabla("producto").groupby("Producto")["Unidades"].sum().to_dict()
+    assert producto == {"CONCERTINA SIMPLE": 3, "ESQUINERO RECTO": 1, "POSTE OLIMPICO": 3}
+
+    if motor == "csv":  # una compactación reescribe el archivo: se rearma desde cero
+        datos.compactar(datos.VENTAS_FILE, datos.COLS_VENTAS, "ID")
+        _vender("v4", "03/03/2026 09:00", "Gomez", "Entrega Inmediata", [("2", "ESQUINERO RECTO", 1, 3000.0)])
+        lecturas.clear()
+        r = resumenes()
+        assert ("ventas", 4, True) in lecturas
+        _igual(r, Resumenes().rearmar(b.cargar("ventas"), b.cargar("ventas_items")))
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pytest
+
+import sincro
+from almacen import backend
+from compras import registrar_compras
+from datos import SINCRO_FILE, ahora_arg
+from ventas import confirmar_venta
+
+def _foto():
+    b = backend()
+    stock = b.cargar_stock().set_index(["Codigo", "Producto"])[["Cantidad", "Reservado", "Precio Costo"]]
+    return stock, len(b.cargar("ventas")), len(b.cargar("ventas_items")), len(b.cargar("gastos"))
+
+def test_importar_dos_veces_no_repite(stock, tmp_path_factory, mudarse):
+    otra = tmp_path_factory.mktemp("nube")
+    shutil.copytree(os.getcwd(), otra, dirs_exist_ok=True)
+    if os.path.exists(otra / SINCRO_FILE): os.remove(otra / SINCRO_FILE)  # cada punta con su identidad
+
+    venta = {"ID": "v1", "Fecha": ahora_arg().strftime("%d/%m/%Y %H:%M"), "Cliente": "A", "Total": 0.0,
+             "Tipo": "Entrega Inmediata", "Detalle": ""}
+    confirmar_venta(venta, [{"Codigo": "2", "Producto": "ESQUINERO RECTO", "Cantidad": 1, "Precio": 1.0, "Subtotal": 1.0}])
+    registrar_compras([{"Codigo": "2", "Producto": "CONCERTINA SIMPLE", "Cantidad": 5, "Monto": 1000}])
+    paquete = sincro.exportar()
+    local = _foto()
+    with pytest.raises(ValueError): sincro.importar(paquete)  # el propio paquete no se aplica
+
+    mudarse(otra)
+    primero = sincro.importar(paquete)
+    assert primero["aplicadas"] > 0 and primero["repetidas"] == 0 and not primero["huecos"]
+    despues = _foto()
+    segundo = sincro.importar(paquete)
+    assert segundo["aplicadas"] == 0 and segundo["repetidas"] == primero["aplicadas"]
+    final = _foto()
+    assert final[0].equals(despues[0]) and final[1:] == despues[1:]
+    assert final[0].equals(local[0]) and final[1:] == local[1:]
+
+def test_corte_a_mitad_no_duplica(stock, tmp_path_factory, mudarse, monkeypatch):
+    otra = tmp_path_factory.mktemp("nube")
+    shutil.copytree(os.getcwd(), otra, dirs_exist_ok=True)
+    if os.path.exists(otra / SINCRO_FILE): os.remove(otra / SINCRO_FILE)
+
+    venta = {"ID": "v1", "Fecha": ahora_arg().strftime("%d/%m/%Y %H:%M"), "Cliente": "A", "Total": 0.0,
+             "Tipo": "Entrega Inmediata", "Detalle": ""}
+    confirmar_venta(venta, [{"Codigo": "2", "Producto": "ESQUINERO RECTO", "Cantidad": 1, "Precio": 1.0, "Subtotal": 1.0}])
+    registrar_compras([{"Codigo": "2", "Producto": "CONCERTINA SIMPLE", "Cantidad": 5, "Monto": 1000}])
+    paquete = sincro.exportar()
+    local = _foto()
+    _, ops = sincro.leer_paquete(paquete)
+
+    mudarse(otra)
+    aplicar_op, llamadas = sincro._aplicar_op, []
+    def cortar(b, op, datos, ultimo):
+        llamadas.append(op)
+        if len(llamadas) == len(ops): raise OSError("corte")
+        return aplicar_op(b, op, datos, ultimo)
+    monkeypatch.setattr(sincro, "_aplicar_op", cortar)
+    with pytest.raises(OSError): sincro.aplicar(ops)
+    monkeypatch.setattr(sincro, "_aplicar_op", aplicar_op)
+
+    sincro.importar(paquete)
+    final = _foto()
+    assert final[0].equals(local[0]) and final[1:] == local[1:]
+
+def test_servir_fuera_de_la_pc_pide_token(monkeypatch):
+    monkeypatch.setattr(sincro, "TOKEN", None)
+    with pytest.raises(ValueError): sincro.servidor("0.0.0.0", 0)
+    sincro.servidor("127.0.0.1", 0).server_close()
+    monkeypatch.setattr(sincro, "TOKEN", "clave")
+    sincro.servidor("0.0.0.0", 0).server_close()
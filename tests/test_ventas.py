@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+import almacen
+import datos
+from almacen import backend
+from datos import ahora_arg
+from resumenes import resumenes
+from ventas import (cargar_items, confirmar_venta, items_de_venta, items_por_venta, migrar_detalles,
+                    parsear_detalle_legacy, renglones_de_ventas)
+
+def _venta(id_venta, tipo="Entrega Inmediata"):
+    return {"ID": id_venta, "Fecha": ahora_arg().strftime("%d/%m/%Y %H:%M"), "Cliente": "A", "Total": 0.0, "Tipo": tipo, "Detalle": ""}
+
+def _renglon(codigo, producto, cantidad):
+    return {"Codigo": codigo, "Producto": producto, "Cantidad": cantidad, "Precio": 1.0, "Subtotal": cantidad}
+
+def test_confirmar_venta_devuelve_lo_que_no_esta(stock):
+    faltantes = confirmar_venta(_venta("v1", "Dejar en Acopio"), [_renglon("2", "ESQUINERO RECTO", 1), _renglon("2", "BORRADO", 3)])
+    assert [(m["Codigo"], m["Producto"]) for m in faltantes] == [("2", "BORRADO")]
+    st = backend().cargar_stock().set_index("Producto")
+    assert st["Reservado"].to_dict() == {"CONCERTINA SIMPLE": 0, "ESQUINERO RECTO": 1, "POSTE OLIMPICO": 0}
+    assert [r["Producto"] for r in items_de_venta("v1")] == ["ESQUINERO RECTO", "BORRADO"]  # la venta queda entera
+    assert confirmar_venta(_venta("v2"), [_renglon("27", "POSTE OLIMPICO", 2)]) == []
+
+@pytest.mark.parametrize("motor", ["csv", "sqlite"])
+def test_renglones_de_una_pagina(stock, monkeypatch, motor):
+    monkeypatch.setattr(almacen, "BACKEND", motor)
+    almacen._BACKEND.clear()
+    confirmar_venta(_venta("v1"), [_renglon("2", "ESQUINERO RECTO", 1), _renglon("27", "POSTE OLIMPICO", 2)])
+    confirmar_venta(_venta("v2"), [_renglon("2", "CONCERTINA SIMPLE", 3)])
+    assert renglones_de_ventas(["v2"])["Producto"].tolist() == ["CONCERTINA SIMPLE"]
+    confirmar_venta(_venta("v3"), [_renglon("27", "POSTE OLIMPICO", 4)])  # se suma lo nuevo
+    pagina = renglones_de_ventas(["v3", "v1"])
+    todos = cargar_items()
+    esperado = todos[todos["ID_Venta"].isin(["v1", "v3"])]
+    pd.testing.assert_frame_equal(pagina.sort_values(["ID_Venta", "Producto"], ignore_index=True),
+                                  esperado.sort_values(["ID_Venta", "Producto"], ignore_index=True))
+    assert items_por_venta(["v1"]) == {"v1": [r for r in items_de_venta("v1")]}
+    assert renglones_de_ventas(["nada"]).empty
+
+    if motor == "csv":
+        datos.compactar(datos.VENTAS_ITEMS_FILE, datos.COLS_ITEMS)  # reescrito: se rearma
+        assert renglones_de_ventas(["v3"])["Cantidad"].tolist() == [4.0]
+    else:
+        backend().importar_csv()  # los CSV no tienen estas ventas
+        assert renglones_de_ventas(["v3"]).empty
+
+def test_ventas_por_producto_desde_resumenes(stock):
+    confirmar_venta(_venta("v1"), [_renglon("2", "ESQUINERO RECTO", 1), _renglon("27", "POSTE OLIMPICO", 2)])
+    confirmar_venta(_venta("v2"), [_renglon("27", "POSTE OLIMPICO", 3)])
+    por_producto = resumenes().por_producto()
+    assert por_producto[["Producto", "Unidades", "Facturacion"]].values.tolist() == [["POSTE OLIMPICO", 5.0, 5.0], ["ESQUINERO RECTO", 1.0, 1.0]]
+
+def test_parsear_detalle_legacy():
+    raw = "[{'Codigo': '27', 'Producto': 'POSTE OLIMPICO', 'Cantidad': np.float64(2.0), 'Precio': 90, 'Subtotal': np.float64(180.0)}]"
+    assert parsear_detalle_legacy(raw) == [{"Codigo": "27", "Producto": "POSTE OLIMPICO", "Cantidad": 2.0, "Precio": 90, "Subtotal": 180.0}]
+    assert parsear_detalle_legacy("3 postes")[0]["Producto"] == "3 postes"  # texto libre: un renglón sin números
+    assert parsear_detalle_legacy("") == [] and parsear_detalle_legacy(float("nan")) == []
+
+def test_migrar_detalles_una_sola_vez(stock):
+    legado = "[{'Codigo': '2', 'Producto': 'ESQUINERO RECTO', 'Cantidad': np.float64(1.0), 'Precio': 3000, 'Subtotal': 3000}]"
+    backend().anexar("ventas", [{**_venta("v1"), "Detalle": legado}, {**_venta("v2"), "Detalle": ""}])
+    confirmar_venta(_venta("v3"), [_renglon("27", "POSTE OLIMPICO", 2)])
+    assert migrar_detalles() == 1
+    items = cargar_items()
+    assert items[["ID_Venta", "Producto", "Cantidad"]].values.tolist() == [["v3", "POSTE OLIMPICO", 2.0], ["v1", "ESQUINERO RECTO", 1.0]]
+    assert items.loc[items["ID_Venta"] == "v1", "Costo"].isna().all()  # costo desconocido
+    assert migrar_detalles() == 0
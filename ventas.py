@@ -0,0 +1,298 @@
+import ast
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+from almacen import backend, movimiento, sin_operaciones
+from catalogo import normalizar_texto, indice_catalogo
+from datos import COLS_ITEMS, COLS_ACOPIOS, FORMATO_FECHA_PRECIOS, ahora_arg
+
+RENGLON = COLS_ITEMS[1:6]  # lo que se imprime en el comprobante
+
+# DETALLE DE VENTAS
+# Cada renglón vendido es una fila tipada de ventas_items_del_carmen.csv, ligada a
+# la venta por ID_Venta. Las ventas viejas guardaban str(carrito) en "Detalle";
+# `migrar_detalles` las pasa una sola vez a la tabla de renglones.
+
+def items_de_carrito(id_venta, carrito):
+    """Renglones listos para guardar, con tipos nativos (sin np.float64).
+
+    "Costo" queda vacío si no se conoce (ventas migradas del formato viejo).
+    """
+    return [{
+        "ID_Venta": id_venta,
+        "Codigo": str(item.get("Codigo", "-")),
+        "Producto": str(item.get("Producto", "")),
+        "Cantidad": float(item.get("Cantidad", 0)),
+        "Precio": float(item.get("Precio", 0)),
+        "Subtotal": float(item.get("Subtotal", 0)),
+        "Costo": None if item.get("Costo") is None else float(item["Costo"]),
+    } for item in carrito]
+
+def agregar_lote(carrito, entrada, stock, indice):
+    """Pasa al carrito una grilla de (Codigo, Cantidad) en un solo paso.
+
+    Los códigos repetidos en la grilla se suman, se cruzan todos contra el catálogo
+    de una vez y los que ya estaban en el carrito suman cantidad en su renglón.
+    Devuelve (carrito nuevo, códigos no encontrados, códigos ambiguos, renglones agregados).
+    """
+    entrada = pd.DataFrame({
+        "Codigo": entrada["Codigo"].fillna("").astype(str).str.strip(),
+        "Cantidad": pd.to_numeric(entrada["Cantidad"], errors="coerce").fillna(0.0),
+    })
+    entrada = entrada[(entrada["Codigo"] != "") & (entrada["Cantidad"] > 0)]
+    pedido = entrada.groupby("Codigo", sort=False, as_index=False)["Cantidad"].sum()
+
+    unicos, ambiguos = indice.mapa_codigos()
+    filas = pedido["Codigo"].map(unicos)
+    es_ambiguo = pedido["Codigo"].isin(ambiguos)
+    no_encontrados = pedido.loc[filas.isna() & ~es_ambiguo, "Codigo"].tolist()
+    repetidos = pedido.loc[es_ambiguo, "Codigo"].tolist()
+    pedido, filas = pedido[filas.notna()], filas.dropna()
+
+    nuevos = stock.loc[filas, ["Codigo", "Producto", "Precio Venta"]].reset_index(drop=True)
+    nuevos = nuevos.rename(columns={"Precio Venta": "Precio"})
+    nuevos["Cantidad"] = pedido["Cantidad"].to_numpy()
+
+    lineas = pd.concat([pd.DataFrame(carrito, columns=["Codigo", "Producto", "Cantidad", "Precio"]), nuevos], ignore_index=True)
+    lineas = lineas.groupby(["Codigo", "Producto"], sort=False, as_index=False).agg(Cantidad=("Cantidad", "sum"), Precio=("Precio", "first"))
+    lineas["Subtotal"] = lineas["Cantidad"] * lineas["Precio"]
+    return lineas.to_dict("records"), no_encontrados, repetidos, len(nuevos)
+
+def movimientos_de_venta(carrito, tipo):
+    """Acopio reserva la mercadería; entrega inmediata la descuenta del físico.
+
+    Un movimiento por producto aunque aparezca en varios renglones del carrito.
+    """
+    col, signo = ("Reservado", 1) if "Acopio" in tipo else ("Cantidad", -1)
+    lineas = pd.DataFrame(carrito, columns=["Codigo", "Producto", "Cantidad"])
+    lineas["Cantidad"] = lineas["Cantidad"].astype(float)
+    por_producto = lineas.groupby(["Codigo", "Producto"], sort=False)["Cantidad"].sum()
+    return [movimiento(cod, prod, delta={col: signo * cant}) for (cod, prod), cant in por_producto.items()]
+
+def reservas_de_carrito(venta, carrito, fecha):
+    """Renglones del ledger de acopios para una venta en acopio: uno por producto."""
+    lineas = pd.DataFrame(carrito, columns=["Codigo", "Producto", "Cantidad"])
+    lineas["Cantidad"] = lineas["Cantidad"].astype(float)
+    por_producto = lineas.groupby(["Codigo", "Producto"], sort=False)["Cantidad"].sum()
+    return [{"Fecha": fecha, "ID_Venta": str(venta["ID"]), "Cliente": str(venta["Cliente"]),
+             "Codigo": str(cod), "Producto": str(prod), "Cantidad": float(cant)}
+            for (cod, prod), cant in por_producto.items() if cant > 0]
+
+def confirmar_venta(venta, carrito):
+    """Movimiento de stock + reservas de acopio + renglones + cabecera en una sola transacción.
+
+    Los renglones van antes que la cabecera: en el backend CSV (sin rollback) un
+    corte a mitad de camino deja un renglón huérfano, nunca una venta sin detalle.
+    Lo que no está en el stock no se reserva. Devuelve los ítems que no se encontraron.
+    """
+    b = backend()
+    with b.transaccion():
+        # El costo se congela al vender: el margen no cambia si después sube el costo
+        stock = b.cargar_stock()
+        indice = indice_catalogo(stock, b.version("stock"))
+        filas = [indice.buscar_item(item["Codigo"], item["Producto"]) for item in carrito]
+        carrito = [{**item, "Costo": None if f is None else stock.at[f, "Precio Costo"]} for item, f in zip(carrito, filas)]
+        faltantes = b.mover_stock(movimientos_de_venta(carrito, venta["Tipo"]))
+        if "Acopio" in venta["Tipo"]:
+            sin_stock = {(m["Codigo"], m["Producto"]) for m in faltantes}
+            reservas = reservas_de_carrito(venta, carrito, ahora_arg().strftime(FORMATO_FECHA_PRECIOS))
+            b.anexar("acopios", [r for r in reservas if (r["Codigo"], r["Producto"]) not in sin_stock])
+        b.anexar("ventas_items", items_de_carrito(venta["ID"], carrito))
+        b.anexar("ventas", [venta])
+    return faltantes
+
+def parsear_detalle_legacy(raw):
+    """Convierte el texto viejo de "Detalle" en una lista de dicts de renglón."""
+    if not isinstance(raw, str) or not raw.strip(): return []
+    # Borra "np.float64(" y ")" para que ast.literal_eval no falle
+    limpio = re.sub(r"np\.float64\((.*?)\)", r"\1", raw)
+    try: parsed = ast.literal_eval(limpio)
+    except (ValueError, SyntaxError): parsed = [raw]
+    if not isinstance(parsed, list): parsed = [parsed]
+
+    items = []
+    for item in parsed:
+        if isinstance(item, dict): items.append(item)
+        else: items.append({"Producto": str(item), "Codigo": "-", "Cantidad": 0, "Precio": 0, "Subtotal": 0})
+    return items
+
+def cargar_items():
+    return tipar_items(backend().cargar("ventas_items"))
+
+def tipar_items(items):
+    """Renglones con las columnas de COLS_ITEMS y los números como números."""
+    items = items.reindex(columns=COLS_ITEMS)
+    for col in ["Cantidad", "Precio", "Subtotal"]:
+        items[col] = pd.to_numeric(items[col], errors="coerce").fillna(0.0)
+    items["Costo"] = pd.to_numeric(items["Costo"], errors="coerce")  # NaN = desconocido
+    items["Codigo"] = items["Codigo"].fillna("-")
+    items["Producto"] = items["Producto"].fillna("")
+    return items
+
+_MIGRACION = {"version": None}
+
+def migrar_detalles():
+    """Pasa a la tabla de renglones las ventas con "Detalle" que todavía no tienen renglones.
+
+    Solo parsea las ventas pendientes y solo mira de nuevo cuando cambian las ventas,
+    así que después de la primera vez no hace nada. Devuelve la cantidad migrada.
+    """
+    version = backend().version("ventas")
+    if version is not None and _MIGRACION["version"] == version: return 0
+    _MIGRACION["version"] = version
+    ventas = backend().cargar("ventas")
+    if ventas.empty or "Detalle" not in ventas.columns: return 0
+    migradas = set(backend().cargar("ventas_items")["ID_Venta"])
+    detalle = ventas["Detalle"].fillna("").astype(str)
+    pendientes = ventas[~ventas["ID"].isin(migradas) & (detalle.str.strip() != "")]
+
+    filas = []
+    for id_venta, raw in zip(pendientes["ID"], pendientes["Detalle"]):
+        filas.extend(items_de_carrito(id_venta, parsear_detalle_legacy(raw)))
+    if filas:
+        with sin_operaciones(): backend().anexar("ventas_items", filas)  # cada instancia migra lo suyo
+    return len(pendientes)
+
+def migrar_acopios():
+    """Pasa al ledger de acopios las ventas en acopio que todavía no están (las de antes
+    del registro): una reserva por producto, con la fecha de la venta.
+
+    No toca el stock, cuyo Reservado ya las incluye. Lo que se retiró antes no quedó
+    anotado en ningún lado: se descuenta con una entrega. Se sincroniza como cualquier
+    fila, así que alcanza con migrar en una sola instancia. Devuelve la cantidad migrada.
+    """
+    migrar_detalles()
+    b = backend()
+    with b.transaccion():
+        ventas = b.cargar("ventas")
+        if ventas.empty or "Tipo" not in ventas.columns: return 0
+        ya = set(b.cargar("acopios")["ID_Venta"].astype(str))
+        en_acopio = ventas["Tipo"].fillna("").astype(str).str.contains("Acopio")
+        pendientes = ventas[en_acopio & ~ventas["ID"].astype(str).isin(ya)]
+        cabecera = pd.DataFrame({"Fecha": fechas_de_venta(pendientes).dt.strftime(FORMATO_FECHA_PRECIOS).fillna(""),
+                                 "Cliente": pendientes["Cliente"].fillna("").astype(str)}).set_axis(pendientes["ID"].astype(str))
+        items = cargar_items()
+        items = items[items["ID_Venta"].astype(str).isin(cabecera.index)].astype({"ID_Venta": str, "Codigo": str, "Producto": str})
+        reservas = items.groupby(["ID_Venta", "Codigo", "Producto"], sort=False, as_index=False)["Cantidad"].sum()
+        reservas = reservas[reservas["Cantidad"] > 0].join(cabecera, on="ID_Venta")
+        if not reservas.empty: b.anexar("acopios", reservas[COLS_ACOPIOS].to_dict("records"))
+    return len(pendientes)
+
+def items_de_venta(id_venta, items=None):
+    """Renglones de una venta como lista de dicts (lo que espera generar_pdf)."""
+    items = renglones_de_ventas([id_venta]) if items is None else items
+    return items.loc[items["ID_Venta"] == id_venta, RENGLON].to_dict("records")
+
+def items_por_venta(ids, items=None):
+    """{ID_Venta: renglones} para varias ventas con un solo groupby."""
+    items = renglones_de_ventas(ids) if items is None else items
+    sel = items[items["ID_Venta"].isin(set(ids))]
+    return {id_venta: grupo[RENGLON].to_dict("records") for id_venta, grupo in sel.groupby("ID_Venta", sort=False)}
+
+def fechas_de_venta(ventas):
+    """La columna Fecha ("%d/%m/%Y %H:%M") como datetime; NaT si no se puede leer."""
+    return pd.to_datetime(ventas["Fecha"], format="%d/%m/%Y %H:%M", errors="coerce")
+
+def comprobantes_de_ventas(ventas, items=None):
+    """Arma los comprobantes (cabecera + renglones) que consume reportes.exportar_comprobantes."""
+    por_venta = items_por_venta(ventas["ID"], items)
+    return [{"ID": v["ID"], "Fecha": v["Fecha"], "Cliente": v["Cliente"], "Total": v["Total"],
+             "Tipo": v.get("Tipo", ""), "Items": por_venta.get(v["ID"], [])}
+            for v in ventas.to_dict("records")]
+
+# ÍNDICE DEL HISTORIAL
+# Las ventas ordenadas por fecha real (la columna es texto "%d/%m/%Y %H:%M", que no
+# ordena bien) y un índice por cliente. Se arma una vez por versión del ledger; los
+# filtros son búsquedas binarias / intersecciones y solo se materializa la página.
+class IndiceVentas:
+    def __init__(self, ventas):
+        fechas = fechas_de_venta(ventas).to_numpy(dtype="datetime64[ns]").astype("int64")  # NaT = mínimo
+        orden = np.argsort(fechas, kind="stable")
+        self.df = ventas.iloc[orden].reset_index(drop=True)
+        self.fechas = fechas[orden]
+        self.tipos = self.df["Tipo"].astype(str).to_numpy() if "Tipo" in self.df.columns else np.array([""] * len(self.df))
+        clientes = self.df["Cliente"].fillna("").astype(str)
+        normalizados = clientes.map(normalizar_texto)
+        self._por_cliente = {k: np.asarray(v) for k, v in normalizados.groupby(normalizados).indices.items()}
+        self.clientes = sorted(clientes.groupby(normalizados).first().tolist(), key=normalizar_texto)
+
+    @property
+    def total(self):
+        return len(self.df)
+
+    def filtrar(self, desde=None, hasta=None, cliente=None, tipo=None):
+        """Posiciones de las ventas que cumplen los filtros, la más nueva primero."""
+        lo = 0 if desde is None else np.searchsorted(self.fechas, pd.Timestamp(desde).value, "left")
+        hi = len(self.fechas) if hasta is None else np.searchsorted(self.fechas, (pd.Timestamp(hasta) + pd.Timedelta(days=1)).value, "left")
+        pos = np.arange(lo, hi)
+        if cliente:
+            pos = np.intersect1d(pos, self._por_cliente.get(normalizar_texto(cliente), np.empty(0, dtype=int)))
+        if tipo:
+            pos = pos[self.tipos[pos] == tipo]
+        return pos[::-1]
+
+    def pagina(self, pos, numero, tam):
+        """Filas de la página `numero` (desde 0) de `pos`."""
+        return self.df.iloc[pos[numero * tam:(numero + 1) * tam]]
+
+    def filas(self, pos):
+        return self.df.iloc[pos]
+
+_INDICE_VENTAS = {"version": None, "indice": None}
+
+def indice_ventas():
+    """Índice del historial, reconstruido solo cuando cambia el ledger de ventas."""
+    version = backend().version("ventas")
+    if version is None or _INDICE_VENTAS["version"] != version or _INDICE_VENTAS["indice"] is None:
+        _INDICE_VENTAS["indice"] = IndiceVentas(backend().cargar("ventas"))
+        _INDICE_VENTAS["version"] = version
+    return _INDICE_VENTAS["indice"]
+
+# RENGLONES POR VENTA
+# Los renglones tipados en tandas (la primera lectura y después lo agregado), con un
+# índice ID_Venta → posiciones. Se pone al día leyendo del backend solo lo que está
+# después de su marca, como los resúmenes; pedir los renglones de una página cuesta
+# lo que esa página, no lo que el ledger.
+class RenglonesPorVenta:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._tandas = []     # DataFrames tipados
+        self._por_venta = {}  # ID_Venta → [(tanda, posiciones)]
+        self._marca = None
+
+    def al_dia(self, b):
+        with self._lock:
+            nuevos, marca, completo = b.cargar_desde("ventas_items", self._marca)
+            if completo: self.reiniciar()
+            if len(nuevos):
+                tanda = tipar_items(nuevos).reset_index(drop=True)
+                self._tandas.append(tanda)
+                for id_venta, pos in tanda.groupby("ID_Venta", sort=False).indices.items():
+                    self._por_venta.setdefault(id_venta, []).append((len(self._tandas) - 1, pos))
+            self._marca = marca
+        return self
+
+    def de_ventas(self, ids):
+        """Renglones (tipados, como `cargar_items`) de esas ventas."""
+        with self._lock:
+            partes = {}
+            for id_venta in dict.fromkeys(ids):
+                for t, pos in self._por_venta.get(id_venta, []): partes.setdefault(t, []).append(pos)
+            tablas = [self._tandas[t].iloc[np.concatenate(pos)] for t, pos in sorted(partes.items())]
+        return pd.concat(tablas, ignore_index=True) if tablas else tipar_items(pd.DataFrame(columns=COLS_ITEMS))
+
+_RENGLONES = {"version": None, "renglones": RenglonesPorVenta()}
+
+def renglones_de_ventas(ids):
+    """Renglones de esas ventas sin cargar el ledger entero; solo lee lo nuevo si cambió."""
+    b = backend()
+    version = b.version("ventas_items")
+    if version is None or _RENGLONES["version"] != version:
+        _RENGLONES["renglones"].al_dia(b)
+        _RENGLONES["version"] = version
+    return _RENGLONES["renglones"].de_ventas(ids)